@@ -35,13 +35,35 @@ Classes
 * FastBinaryTree -- unbalanced binary tree
 * FastAVLTree -- balanced AVLTree
 * FastRBTree -- balanced Red-Black-Tree
+* FastInt64RBTree -- balanced Red-Black-Tree, keys stored as C int64 values
+* FastFloat64RBTree -- balanced Red-Black-Tree, keys stored as C double values
+* FastBytesRBTree -- balanced Red-Black-Tree, bytes keys compared by memcmp()
+* FastStrRBTree -- balanced Red-Black-Tree, str keys compared by code points
+* FastTupleRBTree -- balanced Red-Black-Tree, composite tuple keys compared field by field
+
+The typed trees accept only keys convertible to their key type: FastInt64RBTree
+accepts integers in the int64 range (not floats), FastFloat64RBTree accepts
+floats and integers with an exact float value but not NaN, the keys are
+returned as int or float: FastFloat64RBTree returns float keys for int keys.
+Lookups, range bounds and bisect accept any number, a number without an
+equal key is not found and range bounds outside of the key range include
+or exclude all keys, like in the trees of Python keys.
+FastBytesRBTree, FastStrRBTree and FastTupleRBTree accept only bytes, str or tuple
+keys, the fields of tuple keys are compared one by one in C.
 
 Overview of API for all Classes
 ===============================
 
-* TreeClass ([compare]) -> new empty tree.
-* TreeClass(mapping, [compare]) -> new tree initialized from a mapping
-* TreeClass(seq, [compare]) -> new tree initialized from seq [(k1, v1), (k2, v2), ... (kn, vn)]
+* TreeClass ([key=f]) -> new empty tree.
+* TreeClass(mapping, [key=f]) -> new tree initialized from a mapping
+* TreeClass(seq, [key=f]) -> new tree initialized from seq [(k1, v1), (k2, v2), ... (kn, vn)]
+
+The optional key function f defines the tree order like the key argument of
+sorted(): the tree is ordered by f(k), keys with equal f(k) are the same entry.
+f(k) is computed once per inserted key and once per searched key, the nodes
+store f(k) besides the original key k. The typed Fast<Type>RBTree classes don't
+support key functions, except FastBytesRBTree(key=encode_key), which stores only
+the encoded keys, compares them by memcmp() and decodes them on output.
 
 Methods
 -------
@@ -59,19 +81,26 @@ Methods
 * __xor__(other) <==> T ^ other, symmetric_difference
 * __repr__() <==> repr(T)
 * __setitem__(k, v) <==> T[k] = v, O(log(n))
+* __sizeof__() -> size of T in memory in bytes, including the nodes, excluding keys and values, trees split from T count a share of the shared nodes
 * clear() -> None, Remove all items from T, , O(n)
+* reserve(n) -> None, preallocate the nodes for n items (Cython trees), released by clear()
 * copy() -> a shallow copy of T, O(n*log(n))
 * discard(k) -> None, remove k from T, if k is present, O(log(n))
 * get(k[,d]) -> T[k] if k in T, else d, O(log(n))
+* get_many(keys[,d]) -> list of T.get(k, d) for k in keys, contains_many(keys) -> list of k in T, NumPy arrays of keys return object or bool arrays, FastXTree resumes the search of sorted keys on the previous search path, O(m*log(n))
 * is_empty() -> True if len(T) == 0, O(1)
-* items([reverse]) -> list of T's (k, v) pairs, as 2-tuple, O(n)
-* keys([reverse]) -> list of T's keys, O(n)
-* values([reverse]) -> list of T's values, O(n)
+* items([reverse]) -> TreeItemsView, live view of T's (k, v) pairs, as 2-tuple, iteration O(n)
+* keys([reverse]) -> TreeKeysView, live view of T's keys, len O(1), k in view O(log(n)), set operations &, |, -, ^ by merging, O(n+m)
+* values([reverse]) -> TreeValuesView, live view of T's values, iteration O(n)
+* keys_list([reverse]), values_list([reverse]), items_list([reverse]) -> list of keys, values or items, O(n)
 * pop(k[,d]) -> v, remove specified key and return the corresponding value, O(log(n))
 * pop_item() -> (k, v), remove and return some (key, value) pair as a 2-tuple, O(log(n))
 * set_default(k[,d]) -> T.get(k, d), also set T[k]=d if k not in T, O(log(n))
+* update_value(k, f[,d]) -> value, set T[k]=v=f(T.get(k, d)), O(log(n))
 * update(E) -> None.  Update T from dict/iterable E, O(E*log(n))
-* iter_items(s, e, reverse) -> generator for (k, v) items of T for s <= key < e, O(n)
+* split(k) -> (left, right), move items with keys < k into new tree left and keys >= k into new tree right, T is empty afterwards, O(log(n))
+* join(t) -> None, move all items of tree t into T, keys of t have to be greater than the keys of T, t is empty afterwards, O(log(n))
+* iter_items(s, e, reverse) -> generator for (k, v) items of T for s <= key < e, O(log(n)+k)
 
 walk forward/backward, O(log(n))
 
@@ -82,11 +111,18 @@ walk forward/backward, O(log(n))
 
 slicing by keys
 
-* item_slice(s, e, reverse) -> generator for (k, v) items of T for s <= key < e, O(n), synonym for iter_items(...)
-* key_slice(s, e, reverse) -> generator for keys of T for s <= key < e, O(n)
-* value_slice(s, e, reverse) -> generator for values of T for s <= key < e, O(n)
+* item_slice(s, e, reverse) -> generator for (k, v) items of T for s <= key < e, O(log(n)+k), synonym for iter_items(...)
+* key_slice(s, e, reverse) -> generator for keys of T for s <= key < e, O(log(n)+k)
+* value_slice(s, e, reverse) -> generator for values of T for s <= key < e, O(log(n)+k)
+* iter_chunks(n[, s, e, reverse, columns]) -> generator for lists of up to n (k, v) items of T for s <= key < e, or (keys, values) lists if columns is True, O(log(n)+k)
 * T[s:e] -> TreeSlice object, with keys in range s <= key < e, O(n)
-* del T[s:e] -> remove items by key slicing, for s <= key < e, O(n)
+* del T[s:e] -> remove items by key slicing, for s <= key < e, O(log(n)+k)
+* T[s:e] = E -> replace items for s <= key < e by E: mapping/iterable of (k, v) pairs in strictly ascending key order, O(log(n)+k+m)
+* replace_range(s, e, E) <==> T[s:e] = E
+* prefix_items(p[, reverse]) -> generator for items of T with keys starting with p, keys are str, bytes or tuples, O(log(n)+k)
+* prefix_keys(p[, reverse]) -> generator for keys of T starting with p, O(log(n)+k)
+* prefix_count(p) -> count of keys starting with p, O(log(n))
+* iter_items((p, s), (p, e)) -> generator for items of T with tuple keys (p, k, ...) for s <= k < e, O(log(n)+k)
 
 if 's' is None or T[:e] TreeSlice/iterator starts with value of min_key()
 if 'e' is None or T[s:] TreeSlice/iterator ends with value of max_key()
@@ -94,6 +130,9 @@ T[:] is a TreeSlice which represents the whole tree.
 
 The step argument of the regular slicing syntax T[s:e:step] will silently ignored.
 
+k is the count of items in range s <= key < e, iterators seek the start of the
+range and do not visit items outside the range.
+
 TreeSlice is a tree wrapper with range check, and contains no references
 to objects, deleting objects in the associated tree also deletes the object
 in the TreeSlice.
@@ -106,12 +145,48 @@ in the TreeSlice.
 
 TreeSlice methods:
 
-* items() -> generator for (k, v) items of T, O(n)
-* keys() -> generator for keys of T, O(n)
-* values() -> generator for values of  T, O(n)
-* __iter__ <==> keys()
+* items([reverse]) -> generator for (k, v) items of T in range, O(log(n)+k)
+* keys([reverse]) -> generator for keys of T in range, O(log(n)+k)
+* values([reverse]) -> generator for values of T in range, O(log(n)+k)
+* __iter__ <==> keys(), __reversed__ <==> keys(reverse=True)
 * __repr__ <==> repr(T)
 * __contains__(key)-> True if TreeSlice has a key k, else False, O(log(n))
+* __len__() -> count of keys in range, O(log(n))
+* TreeSlice[k] = v, del TreeSlice[k], get(k[,d]) -> raise KeyError or return d for keys out of range, O(log(n))
+* min_item(), max_item(), min_key(), max_key() -> smallest or greatest item/key in range, raises ValueError if empty, O(log(n))
+* pop(k[,d]), pop_min(), pop_max() -> remove and return an item in range from T, O(log(n))
+* clear() -> remove all items in range from T, del T[s:e], O(log(n)+k)
+
+cursor operations
+
+* cursor([k]) -> TreeCursor positioned on the smallest key >= k or on min_key() if k is None, O(log(n))
+
+TreeCursor is a stateful position in the tree for walking forward/backward
+without searching the tree from the root for every step. Modifying the tree
+is allowed, the cursor re-seeks its current key on the next access.
+
+TreeCursor methods:
+
+* next() -> move to next item, False if there is no next item, amortized O(1)
+* prev() -> move to previous item, False if there is no previous item, amortized O(1)
+* seek(k) -> move to the smallest key >= k, False if there is no such key, O(log(n))
+* seek_floor(k) -> move to the greatest key <= k, False if there is no such key, O(log(n))
+* first() -> move to min_key(), False if tree is empty, O(log(n))
+* last() -> move to max_key(), False if tree is empty, O(log(n))
+* set_value(v) -> replace value of current item, O(1)
+* key, value, item -> properties of current item, raises KeyError if not valid
+* valid -> property, True if the cursor is positioned on an item
+
+order statistic operations
+
+* rank(k) -> index of key k in ascending key order, raises KeyError if k not exists, O(log(n))
+* bisect_left(k) -> count of keys less than k, O(log(n))
+* bisect_right(k) -> count of keys less than or equal to k, O(log(n))
+* select(i) -> (k, v), get item at index i in ascending key order, negative i counts from the end, O(log(n))
+* count_range(s, e) -> count of keys for s <= key < e, O(log(n))
+* key_islice(i, j[, reverse]) -> generator for keys of T at indices i <= index < j, O(log(n)+k)
+* value_islice(i, j[, reverse]) -> generator for values of T at indices i <= index < j, O(log(n)+k)
+* item_islice(i, j[, reverse]) -> generator for items of T at indices i <= index < j, O(log(n)+k)
 
 Heap methods
 
@@ -124,29 +199,34 @@ Heap methods
 * nlargest(i[,pop]) -> get list of i largest items (k, v), O(i*log(n))
 * nsmallest(i[,pop]) -> get list of i smallest items (k, v), O(i*log(n))
 
-Set methods (using frozenset)
+Set methods (merging sorted keys or finger search of the keys of a small tree, no hashing)
 
-* intersection(t1, t2, ...) -> Tree with keys *common* to all trees
-* union(t1, t2, ...) -> Tree with keys from *either* trees
-* difference(t1, t2, ...) -> Tree with keys in T but not any of t1, t2, ...
-* symmetric_difference(t1) -> Tree with keys in either T and t1  but not both
+* intersection(t1, t2, ...) -> Tree with keys *common* to all trees, O(n+m) or O(m*log(n/m+1)) for a small tree
+* union(t1, t2, ...) -> Tree with keys from *either* trees, O(n+m)
+* difference(t1, t2, ...) -> Tree with keys in T but not any of t1, t2, ..., O(n+m) or O(m*log(n/m+1)) for a small T
+* symmetric_difference(t1) -> Tree with keys in either T and t1  but not both, O(n+m)
 * is_subset(S) -> True if every element in T is in S
 * is_superset(S) -> True if every element in S is in T
 * is_disjoint(S) ->  True if T has a null intersection with S
 
 Classmethods
 
-* from_keys(S[,v]) -> New tree with keys from S and values equal to v.
+* from_keys(S[,v][,key=f]) -> New tree with keys from S and values equal to v.
+* from_sorted_items(E[,key=f]) -> New balanced tree from mapping/iterable E of (k, v) pairs in strictly ascending key order, O(n)
+* from_sorted_keys(S[,v][,key=f]) -> New balanced tree with keys from S in strictly ascending order and values equal to v, O(n)
 
 Helper functions
 
 * bintrees.has_fast_tree_support() -> True if Cython extension is working else False (False = using pure Python implementation)
+* bintrees.encode_key(k) -> bytes, order-preserving encoding of None, int, float, str, bytes, date, datetime and tuples of these: encoded keys compare with memcmp() like the keys
+* bintrees.decode_key(b) -> key encoded by encode_key(), integral numbers are decoded as int
 
 """
 
 from .bintree import BinaryTree
 from .avltree import AVLTree
 from .rbtree import RBTree
+from .keycodec import encode_key, decode_key
 
 
 def has_fast_tree_support():
@@ -167,3 +247,28 @@ try:
     from .cython_trees import FastRBTree
 except ImportError:  # fall back to pure Python version
     FastRBTree = RBTree
+
+try:
+    from .cython_int64_trees import FastInt64RBTree
+except ImportError:  # fall back to pure Python version
+    FastInt64RBTree = RBTree
+
+try:
+    from .cython_float64_trees import FastFloat64RBTree
+except ImportError:  # fall back to pure Python version
+    FastFloat64RBTree = RBTree
+
+try:
+    from .cython_bytes_trees import FastBytesRBTree
+except ImportError:  # fall back to pure Python version
+    FastBytesRBTree = RBTree
+
+try:
+    from .cython_str_trees import FastStrRBTree
+except ImportError:  # fall back to pure Python version
+    FastStrRBTree = RBTree
+
+try:
+    from .cython_tuple_trees import FastTupleRBTree
+except ImportError:  # fall back to pure Python version
+    FastTupleRBTree = RBTree
@@ -8,12 +8,16 @@
 from __future__ import absolute_import
 import sys
 from .treeslice import TreeSlice
-from operator import attrgetter
+from .treecursor import TreeCursor
+from .treeview import TreeKeysView, TreeValuesView, TreeItemsView
 from copy import deepcopy
+from itertools import islice
 from abc import abstractmethod, abstractproperty
 
 PYPY = hasattr(sys, 'pypy_version_info')
 
+_MISSING = object()  # sentinel for missing keys, None is a valid value
+
 
 class _ABCTree(object):
     """
@@ -27,6 +31,8 @@ class _ABCTree(object):
 
     count -- get node count
 
+    key -- key function of the tree order or None
+
     T has to implement following methods
     ------------------------------------
 
@@ -69,6 +75,27 @@ class _ABCTree(object):
     ceiling_item(...)
         ceiling_item(key) -> get (k, v) pair, where k is the smallest key greater than or equal to key
 
+    cursor(...)
+        cursor([key]) -> TreeCursor positioned on the smallest key greater than or equal to key
+
+    split(...)
+        split(key) -> (left, right), move items with keys < key into the new tree left and items with keys >= key into the new tree right
+
+    _join(...)
+        _join(other) -> move all items of the non empty tree other of the same type into T, all keys of other are greater than the keys of T
+
+    rank(...)
+        rank(key) -> index of key in ascending key order
+
+    bisect_left(...)
+        bisect_left(key) -> count of keys less than key
+
+    bisect_right(...)
+        bisect_right(key) -> count of keys less than or equal to key
+
+    select(...)
+        select(index) -> get (k, v) pair at index in ascending key order
+
     Methods defined here
     --------------------
 
@@ -85,27 +112,41 @@ class _ABCTree(object):
     * __xor__(other) <==> T ^ other, symmetric_difference
     * __repr__() <==> repr(T)
     * __setitem__(k, v) <==> T[k] = v, O(log(n))
+    * __sizeof__() -> size of T in memory in bytes, including the nodes, excluding keys and values, trees split from T count a share of the shared nodes
     * __copy__() -> shallow copy support, copy.copy(T)
     * __deepcopy__() -> deep copy support, copy.deepcopy(T)
     * clear() -> None, remove all items from T, , O(n)
+    * reserve(n) -> None, preallocate the nodes for n items (Cython trees), released by clear()
     * remove_items(keys) -> None, remove items by keys
     * copy() -> a shallow copy of T, O(n*log(n))
     * discard(k) -> None, remove k from T, if k is present, O(log(n))
     * get(k[,d]) -> T[k] if k in T, else d, O(log(n))
+    * get_many(keys[,d]) -> list of T.get(k, d) for k in keys, contains_many(keys) -> list of k in T, NumPy arrays of keys return object or bool arrays, FastXTree resumes the search of sorted keys on the previous search path, O(m*log(n))
     * is_empty() -> True if len(T) == 0, O(1)
-    * keys([reverse]) -> generator for keys of T, O(n)
-    * values([reverse]) -> generator for values of  T, O(n)
+    * keys([reverse]) -> TreeKeysView, live view of the keys of T, len O(1), k in view O(log(n)), set operations &, |, -, ^ by merging, O(n+m)
+    * values([reverse]) -> TreeValuesView, live view of the values of T, iteration O(n)
+    * keys_list([reverse]), values_list([reverse]), items_list([reverse]) -> list of keys, values or items, O(n)
     * pop(k[,d]) -> v, remove specified key and return the corresponding value, O(log(n))
     * set_default(k[,d]) -> value, T.get(k, d), also set T[k]=d if k not in T, O(log(n))
+    * update_value(k, f[,d]) -> value, set T[k]=v=f(T.get(k, d)), O(log(n))
     * update(E) -> None.  Update T from dict/iterable E, O(E*log(n))
+    * split(k) -> (left, right), move items with keys < k into new tree left and keys >= k into new tree right, T is empty afterwards, O(log(n))
+    * join(t) -> None, move all items of tree t into T, keys of t have to be greater than the keys of T, t is empty afterwards, O(log(n))
 
     slicing by keys
 
-    * key_slice(s, e[, reverse]) -> generator for keys of T for s <= key < e, O(n)
-    * value_slice(s, e[, reverse]) -> generator for values of T for s <= key < e, O(n)
-    * item_slice(s, e[, reverse]) -> generator for items of T for s <= key < e, O(n)
+    * key_slice(s, e[, reverse]) -> generator for keys of T for s <= key < e, O(log(n)+k)
+    * value_slice(s, e[, reverse]) -> generator for values of T for s <= key < e, O(log(n)+k)
+    * item_slice(s, e[, reverse]) -> generator for items of T for s <= key < e, O(log(n)+k)
+    * iter_chunks(n[, s, e, reverse, columns]) -> generator for lists of up to n (k, v) items of T for s <= key < e, or (keys, values) lists if columns is True, O(log(n)+k)
     * T[s:e] -> TreeSlice object, with keys in range s <= key < e, O(n)
-    * del T[s:e] -> remove items by key slicing, for s <= key < e, O(n)
+    * del T[s:e] -> remove items by key slicing, for s <= key < e, O(log(n)+k)
+    * T[s:e] = E -> replace items for s <= key < e by E: mapping/iterable of (k, v) pairs in strictly ascending key order, O(log(n)+k+m)
+    * replace_range(s, e, E) <==> T[s:e] = E
+    * prefix_items(p[, reverse]) -> generator for items of T with keys starting with p, keys are str, bytes or tuples, O(log(n)+k)
+    * prefix_keys(p[, reverse]) -> generator for keys of T starting with p, O(log(n)+k)
+    * prefix_count(p) -> count of keys starting with p, O(log(n))
+    * iter_items((p, s), (p, e)) -> generator for items of T with tuple keys (p, k, ...) for s <= k < e, O(log(n)+k)
 
     if 's' is None or T[:e] TreeSlice/iterator starts with value of min_key()
     if 'e' is None or T[s:] TreeSlice/iterator ends with value of max_key()
@@ -137,6 +178,37 @@ class _ABCTree(object):
     * floor_key(key) -> k, get the greatest key less than or equal to key, O(log(n))
     * ceiling_key(key) -> k, get the smallest key greater than or equal to key, O(log(n))
 
+    cursor operations
+
+    * cursor([k]) -> TreeCursor positioned on the smallest key >= k or on min_key() if k is None, O(log(n))
+
+    TreeCursor is a stateful position in the tree for walking forward/backward
+    without searching the tree from the root for every step. Modifying the tree
+    is allowed, the cursor re-seeks its current key on the next access.
+
+    TreeCursor methods:
+
+    * next() -> move to next item, False if there is no next item, amortized O(1)
+    * prev() -> move to previous item, False if there is no previous item, amortized O(1)
+    * seek(k) -> move to the smallest key >= k, False if there is no such key, O(log(n))
+    * seek_floor(k) -> move to the greatest key <= k, False if there is no such key, O(log(n))
+    * first() -> move to min_key(), False if tree is empty, O(log(n))
+    * last() -> move to max_key(), False if tree is empty, O(log(n))
+    * set_value(v) -> replace value of current item, O(1)
+    * key, value, item -> properties of current item, raises KeyError if not valid
+    * valid -> property, True if the cursor is positioned on an item
+
+    order statistic operations
+
+    * rank(k) -> index of key k in ascending key order, raises KeyError if k not exists, O(log(n))
+    * bisect_left(k) -> count of keys less than k, O(log(n))
+    * bisect_right(k) -> count of keys less than or equal to k, O(log(n))
+    * select(i) -> (k, v), get item at index i in ascending key order, negative i counts from the end, O(log(n))
+    * count_range(s, e) -> count of keys for s <= key < e, O(log(n))
+    * key_islice(i, j[, reverse]) -> generator for keys of T at indices i <= index < j, O(log(n)+k)
+    * value_islice(i, j[, reverse]) -> generator for values of T at indices i <= index < j, O(log(n)+k)
+    * item_islice(i, j[, reverse]) -> generator for items of T at indices i <= index < j, O(log(n)+k)
+
     Heap methods
 
     * max_key() -> get largest key of T, O(log(n))
@@ -146,19 +218,21 @@ class _ABCTree(object):
     * nlargest(i[,pop]) -> get list of i largest items (k, v), O(i*log(n))
     * nsmallest(i[,pop]) -> get list of i smallest items (k, v), O(i*log(n))
 
-    Set methods (using frozenset)
+    Set methods (merging sorted keys or finger search of the keys of a small tree, no hashing)
 
-    * intersection(t1, t2, ...) -> Tree with keys *common* to all trees
-    * union(t1, t2, ...) -> Tree with keys from *either* trees
-    * difference(t1, t2, ...) -> Tree with keys in T but not any of t1, t2, ...
-    * symmetric_difference(t1) -> Tree with keys in either T and t1  but not both
+    * intersection(t1, t2, ...) -> Tree with keys *common* to all trees, O(n+m) or O(m*log(n/m+1)) for a small tree
+    * union(t1, t2, ...) -> Tree with keys from *either* trees, O(n+m)
+    * difference(t1, t2, ...) -> Tree with keys in T but not any of t1, t2, ..., O(n+m) or O(m*log(n/m+1)) for a small T
+    * symmetric_difference(t1) -> Tree with keys in either T and t1  but not both, O(n+m)
     * is_subset(S) -> True if every element in T is in S
     * is_superset(S) -> True if every element in S is in T
     * is_disjoint(S) ->  True if T has a null intersection with S
 
     Classmethods
 
-    * from_keys(S[,v]) -> New tree with keys from S and values equal to v.
+    * from_keys(S[,v][,key=f]) -> New tree with keys from S and values equal to v.
+    * from_sorted_items(E[,key=f]) -> New balanced tree from mapping/iterable E of (k, v) pairs in strictly ascending key order, O(n)
+    * from_sorted_keys(S[,v][,key=f]) -> New balanced tree with keys from S in strictly ascending order and values equal to v, O(n)
 
     """
 
@@ -217,7 +291,7 @@ class _ABCTree(object):
 
     def copy(self):
         """T.copy() -> get a shallow copy of T."""
-        tree = self.__class__()
+        tree = self.__class__(key=self.key)
         self.foreach(tree.insert, order=-1)
         return tree
 
@@ -230,7 +304,7 @@ class _ABCTree(object):
             value_copy = deepcopy(value, memo)
             tree.insert(key, value_copy)
 
-        tree = type(self)()
+        tree = type(self)(key=self.key)
         memo[id(self)] = tree
         self.foreach(_deepcopy, order=-1)
         return tree
@@ -283,29 +357,69 @@ class _ABCTree(object):
         return self.count == 0
 
     def keys(self, reverse=False):
-        """T.keys([reverse]) -> an iterator over the keys of T, in ascending
-        order if reverse is True, iterate in descending order, reverse defaults
-        to False
+        """T.keys([reverse]) -> a live view of the keys of T, in ascending
+        order if reverse is True, in descending order, reverse defaults to
+        False
         """
-        return (item[0] for item in self.iter_items(reverse=reverse))
+        return TreeKeysView(self, reverse)
 
-    __iter__ = keys
+    def __iter__(self):
+        """T.__iter__() <==> iter(x), iterate over the keys in ascending order"""
+        return iter(self.key_slice(None, None))
 
     def __reversed__(self):
-        return self.keys(reverse=True)
+        return iter(self.key_slice(None, None, reverse=True))
 
     def values(self, reverse=False):
-        """T.values([reverse]) -> an iterator over the values of T, in ascending order
-        if reverse is True, iterate in descending order, reverse defaults to False
+        """T.values([reverse]) -> a live view of the values of T, in ascending
+        key order if reverse is True, in descending key order, reverse defaults
+        to False
         """
-        return (item[1] for item in self.iter_items(reverse=reverse))
+        return TreeValuesView(self, reverse)
 
     def items(self, reverse=False):
-        """T.items([reverse]) -> an iterator over the (key, value) items of T,
-        in ascending order if reverse is True, iterate in descending order,
-        reverse defaults to False
+        """T.items([reverse]) -> a live view of the (key, value) items of T,
+        in ascending order if reverse is True, in descending order, reverse
+        defaults to False
+        """
+        return TreeItemsView(self, reverse)
+
+    def keys_list(self, reverse=False):
+        """T.keys_list([reverse]) -> list of the keys of T, in ascending order,
+        in descending order if reverse is True.
+        """
+        return list(self.keys(reverse=reverse))
+
+    def values_list(self, reverse=False):
+        """T.values_list([reverse]) -> list of the values of T, in ascending key
+        order, in descending key order if reverse is True.
+        """
+        return list(self.values(reverse=reverse))
+
+    def items_list(self, reverse=False):
+        """T.items_list([reverse]) -> list of the (key, value) items of T, in
+        ascending key order, in descending key order if reverse is True.
         """
-        return self.iter_items(reverse=reverse)
+        return list(self.items(reverse=reverse))
+
+    def iter_chunks(self, size, start_key=None, end_key=None, reverse=False, columns=False):
+        """T.iter_chunks(size[, start_key, end_key, reverse, columns]) ->
+        iterator over lists of up to size (key, value) items:
+        start_key <= key < end_key.
+
+        Yields a pair of lists (keys, values) per chunk if columns is True.
+        """
+        if size < 1:
+            raise ValueError("chunk size has to be >= 1")
+        items = iter(self.iter_items(start_key, end_key, reverse))
+        while True:
+            chunk = list(islice(items, size))
+            if not chunk:
+                return
+            if columns:
+                yield [key for key, value in chunk], [value for key, value in chunk]
+            else:
+                yield chunk
 
     def __getitem__(self, key):
         """T.__getitem__(y) <==> x[y]"""
@@ -317,16 +431,60 @@ class _ABCTree(object):
     def __setitem__(self, key, value):
         """T.__setitem__(i, y) <==> x[i]=y"""
         if isinstance(key, slice):
-            raise ValueError('setslice is not supported')
-        self.insert(key, value)
+            self.replace_range(key.start, key.stop, value)
+        else:
+            self.insert(key, value)
 
     def __delitem__(self, key):
         """T.__delitem__(y) <==> del x[y]"""
         if isinstance(key, slice):
-            self.remove_items(self.key_slice(key.start, key.stop))
+            self._replace_range(key.start, key.stop).clear()
         else:
             self.remove(key)
 
+    def replace_range(self, start_key, end_key, items):
+        """T.replace_range(s, e, E) <==> T[s:e] = E, replace all items with keys
+        s <= key < e by E: a mapping or iterable of (k, v) pairs in strictly
+        ascending key order with keys in range s <= key < e.
+
+        Raises ValueError if the keys of E are not sorted or out of range, T
+        is not modified in this case.
+        """
+        tree = self.from_sorted_items(items, key=self.key)
+        if tree.count:
+            sort_key = self._sort_key
+            if (start_key is not None and sort_key(tree.min_key()) < sort_key(start_key)) or \
+                    (end_key is not None and not sort_key(tree.max_key()) < sort_key(end_key)):
+                raise ValueError("keys out of range")
+        self._replace_range(start_key, end_key, tree).clear()
+
+    def _split(self, key):
+        # split() of trees, which are joined again
+        return self.split(key)
+
+    def _replace_range(self, start_key, end_key, tree=None):
+        """Detach all items with keys s <= key < e from T and return them as
+        new tree, the items of tree take their place, O(log(n)).
+        """
+        right = None
+        if self.count:
+            left, middle = self._split(self.min_key() if start_key is None else start_key)
+            if end_key is not None:
+                try:
+                    middle, right = middle._split(end_key)
+                except Exception:  # a failed split leaves middle unchanged
+                    self.join(left)
+                    self.join(middle)
+                    raise
+            self.join(left)  # T is empty after split()
+        else:
+            middle = self.__class__(key=self.key)
+        if tree is not None:
+            self.join(tree)
+        if right is not None:
+            self.join(right)
+        return middle
+
     def remove_items(self, keys):
         """T.remove_items(keys) -> None, remove items by keys"""
         # convert generator to a tuple, because the content of the
@@ -358,26 +516,92 @@ class _ABCTree(object):
         """
         return self.iter_items(start_key, end_key, reverse)
 
+    def count_range(self, start_key, end_key):
+        """T.count_range(start_key, end_key) -> count of keys:
+        start_key <= key < end_key.
+
+        Start or end key None means no lower or upper bound.
+        """
+        start = 0 if start_key is None else self.bisect_left(start_key)
+        end = self.count if end_key is None else self.bisect_left(end_key)
+        return max(end - start, 0)
+
+    def prefix_items(self, prefix, reverse=False):
+        """T.prefix_items(prefix) -> item iterator for keys starting with
+        prefix, prefix and keys are str, bytes or tuples, a tuple prefix
+        matches the leading fields of tuple keys.
+
+        Yields items in ascending key order if reverse is False else in descending key order.
+        """
+        return self.iter_items(prefix, _prefix_end(prefix), reverse)
+
+    def prefix_keys(self, prefix, reverse=False):
+        """T.prefix_keys(prefix) -> key iterator for keys starting with prefix."""
+        return (k for k, v in self.prefix_items(prefix, reverse))
+
+    def prefix_count(self, prefix):
+        """T.prefix_count(prefix) -> count of keys starting with prefix."""
+        return self.count_range(prefix, _prefix_end(prefix))
+
+    def item_islice(self, start, stop, reverse=False):
+        """T.item_islice(start, stop) -> item iterator:
+        start <= index < stop, index in ascending key order.
+
+        Start and stop are clamped like list slice indices, negative indices
+        count from the end, None means no bound. Yields items in ascending key
+        order if reverse is False else in descending key order.
+        """
+        start, stop, _ = slice(start, stop).indices(self.count)
+        if start >= stop:
+            return iter(())
+        start_key = self.select(start)[0]
+        end_key = self.select(stop)[0] if stop < self.count else None
+        return self.iter_items(start_key, end_key, reverse)
+
+    def key_islice(self, start, stop, reverse=False):
+        """T.key_islice(start, stop) -> key iterator:
+        start <= index < stop, index in ascending key order.
+        """
+        return (k for k, v in self.item_islice(start, stop, reverse))
+
+    def value_islice(self, start, stop, reverse=False):
+        """T.value_islice(start, stop) -> value iterator:
+        start <= index < stop, index in ascending key order.
+        """
+        return (v for k, v in self.item_islice(start, stop, reverse))
+
     def __getstate__(self):
-        return dict(self.items())
+        if self.key is None:
+            return dict(self.items())
+        return dict(self.items()), self.key
 
     def __setstate__(self, state):
         # note for myself: this is called like __init__, so don't use clear()
         # to remove existing data!
         self._root = None
         self._count = 0
+        self._version = 0
+        self._key = None
+        if isinstance(state, tuple):  # tree with key function
+            state, self._key = state
         self.update(state)
 
     def set_default(self, key, default=None):
         """T.set_default(k[,d]) -> T.get(k,d), also set T[k]=d if k not in T"""
-        try:
-            return self.get_value(key)
-        except KeyError:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
             self.insert(key, default)
             return default
+        return value
 
     setdefault = set_default  # for compatibility to dict()
 
+    def update_value(self, key, func, default=None):
+        """T.update_value(k, f[,d]) -> v, set T[k] = v = f(T.get(k, d))"""
+        value = func(self.get(key, default))
+        self.insert(key, value)
+        return value
+
     def update(self, *args):
         """T.update(E) -> None. Update T from E : for (k, v) in E: T[k] = v"""
         for items in args:
@@ -389,16 +613,65 @@ class _ABCTree(object):
             for key, value in generator:
                 self.insert(key, value)
 
+    def join(self, other):
+        """T.join(other) -> None, move all items of tree other into T, all keys
+        of other have to be greater than the keys of T, other is empty
+        afterwards, O(log(n)) for trees of the same type.
+        """
+        if other is self:
+            raise ValueError("can not join a tree with itself")
+        if not other.count:
+            return
+        if self.count and not self._sort_key(self.max_key()) < self._sort_key(other.min_key()):
+            raise ValueError("all keys of the joined tree have to be greater than the keys of T")
+        if type(other) is type(self) and other.key == self.key:
+            self._join(other)
+        else:  # incompatible nodes
+            for key, value in other.items():
+                self.insert(key, value)
+            other.clear()
+
+    def _sort_key(self, key):
+        # key of the tree order
+        return key if self.key is None else self.key(key)
+
     @classmethod
-    def from_keys(cls, iterable, value=None):
+    def from_keys(cls, iterable, value=None, key=None):
         """T.from_keys(S[,v]) -> New tree with keys from S and values equal to v."""
-        tree = cls()
-        for key in iterable:
-            tree.insert(key, value)
+        tree = cls(key=key)
+        for k in iterable:
+            tree.insert(k, value)
         return tree
 
     fromkeys = from_keys  # for compatibility to dict()
 
+    @classmethod
+    def from_sorted_items(cls, items, key=None):
+        """T.from_sorted_items(E) -> New balanced tree from E: a mapping or
+        iterable of (k, v) pairs in strictly ascending key order, O(n). The
+        new tree is ordered by key(k) if a key function is given.
+
+        Raises ValueError if the keys are not in strictly ascending order.
+        """
+        try:
+            generator = items.items()
+        except AttributeError:
+            generator = iter(items)
+        tree = cls(key=key)
+        tree._build_sorted(_sorted_item_list(generator, key))
+        return tree
+
+    @classmethod
+    def from_sorted_keys(cls, iterable, value=None, key=None):
+        """T.from_sorted_keys(S[,v]) -> New balanced tree with keys from S in
+        strictly ascending order and values equal to v, O(n).
+
+        Raises ValueError if the keys are not in strictly ascending order.
+        """
+        tree = cls(key=key)
+        tree._build_sorted(_sorted_item_list(((k, value) for k in iterable), key))
+        return tree
+
     def get(self, key, default=None):
         """T.get(k[,d]) -> T[k] if k in T, else d.  d defaults to None."""
         try:
@@ -406,21 +679,32 @@ class _ABCTree(object):
         except KeyError:
             return default
 
+    def get_many(self, keys, default=None):
+        """T.get_many(keys[, d]) -> list of T.get(k, d) for k in keys, an object
+        array for a NumPy array of keys.
+        """
+        get = self.get
+        return _lookup_many(lambda probes: [get(key, default) for key in probes], keys, object)
+
+    def contains_many(self, keys):
+        """T.contains_many(keys) -> list of k in T for k in keys, a bool array
+        for a NumPy array of keys.
+        """
+        return _lookup_many(lambda probes: [key in self for key in probes], keys, bool)
+
     def pop(self, key, *args):
         """T.pop(k[,d]) -> v, remove specified key and return the corresponding value.
         If key is not found, d is returned if given, otherwise KeyError is raised
         """
         if len(args) > 1:
             raise TypeError("pop expected at most 2 arguments, got %d" % (1 + len(args)))
-        try:
-            value = self.get_value(key)
-            self.remove(key)
-            return value
-        except KeyError:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
             if len(args) == 0:
-                raise
-            else:
-                return args[0]
+                raise KeyError(str(key))
+            return args[0]
+        self.remove(key)
+        return value
 
     def prev_key(self, key):
         """Get predecessor to key, raises KeyError if key is min key
@@ -477,8 +761,7 @@ class _ABCTree(object):
         if pop:
             return [self.pop_min() for _ in range(min(len(self), n))]
         else:
-            items = self.items()
-            return [next(items) for _ in range(min(len(self), n))]
+            return list(islice(self.iter_items(), n))
 
     def nlargest(self, n, pop=False):
         """T.nlargest(n) -> get list of n largest items (k, v).
@@ -487,76 +770,255 @@ class _ABCTree(object):
         if pop:
             return [self.pop_max() for _ in range(min(len(self), n))]
         else:
-            items = self.items(reverse=True)
-            return [next(items) for _ in range(min(len(self), n))]
+            return list(islice(self.iter_items(reverse=True), n))
 
     def intersection(self, *trees):
         """T.intersection(t1, t2, ...) -> Tree, with keys *common* to all trees
+
+        Merges the sorted items in O(n+m), probes the keys of a small tree in
+        ascending order by contains_many() in O(m*log(n/m+1)).
         """
-        thiskeys = frozenset(self.keys())
-        sets = _build_sets(trees)
-        rkeys = thiskeys.intersection(*sets)
-        return self.__class__(((key, self.get(key)) for key in rkeys))
+        trees = [_as_tree(self, tree) for tree in trees]
+        all_trees = [self] + trees
+        smallest = min(all_trees, key=len)
+        if _probing_is_cheaper(smallest, max(all_trees, key=len)):
+            # look up the few keys of the smallest tree in all other trees
+            keys = smallest.keys_list()
+            for tree in all_trees:
+                if tree is not smallest:
+                    keys = _compress(keys, tree.contains_many(keys))
+            if smallest is self or self.key is None:
+                items = zip(keys, self.get_many(keys))
+            else:  # the items keep the original keys of T
+                items = (self.floor_item(key) for key in keys)
+        else:
+            items = self.items()
+            for tree in trees:
+                items = _merge_items(items, tree.items(), False, True, False, self.key)
+        return self._new_sorted_tree(items)
 
     def union(self, *trees):
         """T.union(t1, t2, ...) -> Tree with keys from *either* trees
+
+        Merges the sorted items in O(n+m), the size of the new tree.
         """
-        thiskeys = frozenset(self.keys())
-        rkeys = thiskeys.union(*_build_sets(trees))
-        all_trees = [self]
-        all_trees.extend(trees)
-        return self.__class__(((key, _multi_tree_get(all_trees, key)) for key in rkeys))
+        items = self.items()
+        for tree in trees:
+            items = _merge_items(items, _as_tree(self, tree).items(), True, True, True, self.key)
+        return self._new_sorted_tree(items)
 
     def difference(self, *trees):
         """T.difference(t1, t2, ...) -> Tree with keys in T but not any of t1,
         t2, ...
+
+        Merges the sorted items in O(n+m), probes the keys of a small T in
+        ascending order by contains_many() in O(m*log(n/m+1)).
         """
-        thiskeys = frozenset(self.keys())
-        rkeys = thiskeys.difference(*_build_sets(trees))
-        return self.__class__(((key, self.get(key)) for key in rkeys))
+        trees = [_as_tree(self, tree) for tree in trees]
+        if trees and _probing_is_cheaper(self, max(trees, key=len)):
+            items = self.items_list()
+            for tree in trees:
+                found = tree.contains_many([key for key, value in items])
+                items = [item for item, is_in in zip(items, found) if not is_in]
+            return self._new_sorted_tree(items)
+        items = self.items()
+        for tree in trees:
+            items = _merge_items(items, tree.items(), True, False, False, self.key)
+        return self._new_sorted_tree(items)
 
     def symmetric_difference(self, tree):
         """T.symmetric_difference(t1) -> Tree with keys in either T and t1 but
         not both
+
+        Merges the sorted items in O(n+m).
         """
-        thiskeys = frozenset(self.keys())
-        rkeys = thiskeys.symmetric_difference(frozenset(tree.keys()))
-        all_trees = [self, tree]
-        return self.__class__(((key, _multi_tree_get(all_trees, key)) for key in rkeys))
+        items = _merge_items(self.items(), _as_tree(self, tree).items(), True, False, True, self.key)
+        return self._new_sorted_tree(items)
+
+    def _new_sorted_tree(self, items):
+        # items are guaranteed to be in strictly ascending key order
+        key = self.key
+        tree = self.__class__(key=key)
+        if key is None:
+            tree._build_sorted(list(items))
+        else:
+            tree._build_sorted([(key(k), v, k) for k, v in items])
+        return tree
 
     def is_subset(self, tree):
         """T.issubset(tree) -> True if every element in x is in tree """
-        thiskeys = frozenset(self.keys())
-        return thiskeys.issubset(frozenset(tree.keys()))
+        tree = _as_tree(self, tree)
+        if len(self) > len(tree):
+            return False
+        if _probing_is_cheaper(self, tree):
+            # chunks of keys stop the lookups at the first missing key
+            return all(all(tree.contains_many(keys)) for keys, _ in self.iter_chunks(PROBE_CHUNK, columns=True))
+        # keys only in self break the loop
+        for _ in _merge_items(self.items(), tree.items(), True, False, False, self.key):
+            return False
+        return True
 
     issubset = is_subset  # for compatibility to set()
 
     def is_superset(self, tree):
         """T.issubset(tree) -> True if every element in tree is in x """
-        thiskeys = frozenset(self.keys())
-        return thiskeys.issuperset(frozenset(tree.keys()))
+        tree = _as_tree(self, tree)
+        return tree.is_subset(self)
 
     issuperset = is_superset  # for compatibility to set()
 
     def is_disjoint(self, tree):
         """T.isdisjoint(S) ->  True if x has a null intersection with tree """
-        thiskeys = frozenset(self.keys())
-        return thiskeys.isdisjoint(frozenset(tree.keys()))
+        tree = _as_tree(self, tree)
+        smaller, larger = (self, tree) if len(self) <= len(tree) else (tree, self)
+        if _probing_is_cheaper(smaller, larger):
+            return not any(any(larger.contains_many(keys)) for keys, _ in smaller.iter_chunks(PROBE_CHUNK, columns=True))
+        # common keys break the loop
+        for _ in _merge_items(self.items(), tree.items(), False, True, False, self.key):
+            return False
+        return True
 
     isdisjoint = is_disjoint  # for compatibility to set()
 
 
-def _build_sets(trees):
-    return [frozenset(tree.keys()) for tree in trees]
+def _sorted_item_list(items, key_func=None):
+    # list of (key, value) tuples in strictly ascending key order, with a key
+    # function a list of (key_func(k), value, k) tuples in ascending order of
+    # key_func(k)
+    result = []
+    append = result.append
+    prev_key = prev_sort_key = None
+    for key, value in items:
+        sort_key = key if key_func is None else key_func(key)
+        if result and not prev_sort_key < sort_key:
+            raise ValueError("keys are not in strictly ascending order: %r, %r" % (prev_key, key))
+        append((key, value) if key_func is None else (sort_key, value, key))
+        prev_key = key
+        prev_sort_key = sort_key
+    return result
 
 
-def _multi_tree_get(trees, key):
-    for tree in trees:
-        try:
-            return tree[key]
-        except KeyError:
-            pass
-    raise KeyError(key)
+class _Top(object):
+    # compares greater than any other object, last field of the upper bound
+    # of a tuple prefix range
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return self is other
+
+    def __gt__(self, other):
+        return self is not other
+
+    def __ge__(self, other):
+        return True
+
+    def __repr__(self):
+        return 'TOP'
+
+_TOP = _Top()
+
+
+def _prefix_end(prefix):
+    # smallest key greater than all keys starting with prefix, None if there
+    # is no such key: prefix is empty or consists only of the largest char,
+    # keys with the tuple prefix (a, b) are less than (a, b, TOP)
+    if isinstance(prefix, tuple):
+        if prefix:
+            return prefix + (_TOP,)
+    elif isinstance(prefix, str):
+        stem = prefix.rstrip('\U0010ffff')
+        if stem:
+            return stem[:-1] + chr(ord(stem[-1]) + 1)
+    elif isinstance(prefix, bytes):
+        stem = prefix.rstrip(b'\xff')
+        if stem:
+            return stem[:-1] + bytes((stem[-1] + 1,))
+    else:
+        raise TypeError("prefix has to be str, bytes or tuple, not %s" % type(prefix).__name__)
+    return None
+
+
+def _lookup_many(lookup, keys, dtype):
+    # lookup(keys) -> list of results, NumPy is an optional dependency: the
+    # results of a NumPy array of keys are returned as array of dtype in the
+    # shape of keys
+    if type(keys).__module__ != 'numpy' or not hasattr(keys, 'shape'):
+        return lookup(keys)
+    import numpy
+    result = lookup(keys.ravel().tolist())
+    if dtype is bool:
+        array = numpy.array(result, dtype=bool)
+    else:  # values may be sequences, which numpy.array() would unpack
+        array = numpy.empty(len(result), dtype=dtype)
+        for index, value in enumerate(result):
+            array[index] = value
+    return array.reshape(keys.shape)
+
+
+def _as_tree(tree, other):
+    # other operands of set operations, which are not trees or trees in a
+    # different key order, are converted into a tree of the same type
+    if isinstance(other, _ABCTree) and other.key == tree.key:
+        return other
+    return tree.__class__(other, key=tree.key)
+
+
+PROBE_CHUNK = 256  # keys per contains_many() call of is_subset() and is_disjoint()
+
+
+def _probing_is_cheaper(small, large):
+    # m lookups of sorted keys by finger search in O(m*log(n/m+1)) against a
+    # merge in O(m+n)
+    m = len(small)
+    return m * (len(large) // max(m, 1) + 1).bit_length() < m + len(large)
+
+
+def _compress(keys, selectors):
+    return [key for key, selected in zip(keys, selectors) if selected]
+
+
+def _merge_items(items1, items2, left, both, right, key_func=None):
+    """Merge two item iterators in ascending key order, yields items with
+    keys only in items1 if left is True, with keys in both iterators if
+    both is True (value of items1) and with keys only in items2 if right is
+    True. Keys are compared by key_func(k) if key_func is not None.
+    """
+    if key_func is not None:
+        # compare (key_func(k), (k, v)) tuples, key_func is called once per item
+        decorated1 = ((key_func(item[0]), item) for item in items1)
+        decorated2 = ((key_func(item[0]), item) for item in items2)
+        for _, item in _merge_items(decorated1, decorated2, left, both, right):
+            yield item
+        return
+    items1 = iter(items1)
+    items2 = iter(items2)
+    item1 = next(items1, None)
+    item2 = next(items2, None)
+    while item1 is not None and item2 is not None:
+        key1 = item1[0]
+        key2 = item2[0]
+        if key1 < key2:
+            if left:
+                yield item1
+            item1 = next(items1, None)
+        elif key2 < key1:
+            if right:
+                yield item2
+            item2 = next(items2, None)
+        else:
+            if both:
+                yield item1
+            item1 = next(items1, None)
+            item2 = next(items2, None)
+    if left and item1 is not None:
+        yield item1
+        yield from items1
+    if right and item2 is not None:
+        yield item2
+        yield from items2
 
 
 class CPYTHON_ABCTree(_ABCTree):
@@ -565,21 +1027,31 @@ class CPYTHON_ABCTree(_ABCTree):
     T has to implement following methods
     ------------------------------------
 
-    insert(...)
-        insert(key, value) <==> T[key] = value, insert key into T
+    _insert_node(...)
+        _insert_node(key, value, replace) -> (node, is_new), insert key into T
 
-    remove(...)
-        remove(key) <==> del T[key], remove key from T
+    _remove_node(...)
+        _remove_node(key) -> (k, v), remove key from T
+
+    The key arguments of these methods are keys of the tree order, the
+    nodes store the key of the tree order as node.key and the key given by
+    the user as node.orig_key, both are the same object if T has no key
+    function.
 
     Properties defined here
     --------------------
 
     * count -> get item count of tree
+    * key -> key function of tree or None
 
     Methods defined here
     --------------------
-    * __init__() Tree initializer
+    * __init__([items, key]) Tree initializer
+    * insert(key, value) <==> T[key] = value, insert key into T
+    * remove(key) <==> del T[key], remove key from T
     * get_value(key) -> returns value for key
+    * get(key[,d]) -> value for key if key in T, else d, without raising KeyError
+    * __contains__(key) -> True if T has key, without raising KeyError
     * clear() -> None.  Remove all items from tree.
     * iter_items(start_key, end_key, [reverse]) -> iterate over all items, yielding (k, v) tuple
     * foreach(f, [order]) -> visit all nodes of tree and call f(k, v) for each node, O(n)
@@ -590,44 +1062,376 @@ class CPYTHON_ABCTree(_ABCTree):
     * succ_item(key) -> get (k,v) pair as a 2-tuple, where k is successor to key, O(log(n))
     * floor_item(key) -> get (k, v) pair, where k is the greatest key less than or equal to key, O(log(n))
     * ceiling_item(key) -> get (k, v) pair, where k is the smallest key greater than or equal to key, O(log(n))
+    * cursor([key]) -> TreeCursor positioned on the smallest key greater than or equal to key, O(log(n))
+    * split(key) -> (left, right), move items with keys < key into left and keys >= key into right, O(log(n))
+    * rank(key) -> index of key in ascending key order, O(log(n))
+    * bisect_left(key) -> count of keys less than key, O(log(n))
+    * bisect_right(key) -> count of keys less than or equal to key, O(log(n))
+    * select(index) -> get (k, v) pair at index in ascending key order, O(log(n))
     """
 
-    def __init__(self, items=None):
+    def __init__(self, items=None, key=None):
         """T.__init__(...) initializes T; see T.__class__.__doc__ for signature"""
         self._root = None
         self._count = 0
+        self._version = 0  # incremented by every modification of the tree structure
+        self._key = key
         if items is not None:
             self.update(items)
 
+    @property
+    def key(self):
+        """Key function of T, the tree is ordered by key(k), None for the
+        order of the keys itself.
+        """
+        return self._key
+
     def clear(self):
         """T.clear() -> None.  Remove all items from T."""
 
-        def _clear(node):
-            if node is not None:
-                _clear(node.left)
-                _clear(node.right)
-                node.free()
-
-        _clear(self._root)
+        # non recursive, the height of an unbalanced tree is unbounded
+        stack = [] if self._root is None else [self._root]
+        while stack:
+            node = stack.pop()
+            if node.left is not None:
+                stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+            node.free()
         self._count = 0
+        self._version += 1
         self._root = None
 
+    def reserve(self, count):
+        """T.reserve(n) -> None, the Python trees allocate the nodes on
+        demand.
+        """
+
+    def __sizeof__(self):
+        """T.__sizeof__() -> size of T in memory in bytes, including the
+        nodes, excluding keys and values.
+        """
+        node_size = 0 if self._root is None else sys.getsizeof(self._root)
+        return object.__sizeof__(self) + self.count * node_size
+
     @property
     def count(self):
         """Get items count."""
         return self._count
 
+    def insert(self, key, value):
+        """T.insert(key, value) <==> T[key] = value, insert key, value into tree."""
+        self._insert_item(key, value, True)
+
+    def remove(self, key):
+        """T.remove(key) <==> del T[key], remove item <key> from tree."""
+        self._remove_node(key if self._key is None else self._key(key))
+
+    def _insert_item(self, key, value, replace):
+        """Insert key, value into tree, the key function is called once,
+        returns (node of key, True for a new node).
+        """
+        if self._key is None:
+            return self._insert_node(key, value, replace)
+        node, is_new = self._insert_node(self._key(key), value, replace)
+        if is_new:
+            node.orig_key = key
+        return node, is_new
+
+    def _find_node(self, key):
+        """Get node with key, returns None if key does not exist."""
+        if self._key is not None:
+            key = self._key(key)
+        node = self._root
+        while node is not None:
+            if key == node.key:
+                return node
+            elif key < node.key:
+                node = node.left
+            else:
+                node = node.right
+        return None
+
     def get_value(self, key):
+        node = self._find_node(key)
+        if node is None:
+            raise KeyError(str(key))
+        return node.value
+
+    def get(self, key, default=None):
+        """T.get(k[,d]) -> T[k] if k in T, else d.  d defaults to None."""
+        node = self._find_node(key)
+        return default if node is None else node.value
+
+    def __contains__(self, key):
+        """k in T -> True if T has a key k, else False"""
+        return self._find_node(key) is not None
+
+    def get_many(self, keys, default=None):
+        """T.get_many(keys[, d]) -> list of T.get(k, d) for k in keys, an object
+        array for a NumPy array of keys. The search of a key greater than or
+        equal to the previous key resumes on the previous search path.
+        """
+        return _lookup_many(lambda probes: [default if node is None else node.value
+                                            for node in self._find_many(probes)], keys, object)
+
+    def contains_many(self, keys):
+        """T.contains_many(keys) -> list of k in T for k in keys, a bool array
+        for a NumPy array of keys. The search of a key greater than or equal to
+        the previous key resumes on the previous search path.
+        """
+        return _lookup_many(lambda probes: [node is not None for node in self._find_many(probes)], keys, bool)
+
+    def _find_many(self, keys):
+        # nodes of keys or None by finger search: path keeps the nodes of the
+        # last search path, at which the search went left, a greater key
+        # resumes below the deepest of these nodes with a greater key
+        result = []
+        path = []
+        prev_key = None
+        version = self._version
+        for key in keys:
+            if self._key is not None:
+                key = self._key(key)
+            if version != self._version:  # modified by the key function
+                del path[:]
+                version = self._version
+            if path and not key < prev_key:
+                while path and not key < path[-1].key:
+                    path.pop()
+                node = path[-1].left if path else self._root
+            else:
+                del path[:]
+                node = self._root
+            while node is not None:
+                if key == node.key:
+                    break
+                elif key < node.key:
+                    path.append(node)
+                    node = node.left
+                else:
+                    node = node.right
+            result.append(node)
+            prev_key = key
+        return result
+
+    def set_default(self, key, default=None):
+        """T.set_default(k[,d]) -> T.get(k,d), also set T[k]=d if k not in T"""
+        return self._insert_item(key, default, False)[0].value
+
+    setdefault = set_default  # for compatibility to dict()
+
+    def update_value(self, key, func, default=None):
+        """T.update_value(k, f[,d]) -> v, set T[k] = v = f(T.get(k, d)) with one
+        search of k.
+        """
+        node, is_new = self._insert_item(key, default, False)
+        version = self._version
+        try:
+            value = func(node.value)
+        except:
+            if is_new and version == self._version:
+                self.remove(key)
+            raise
+        if version == self._version:  # node is still valid
+            node.value = value
+        else:
+            self.insert(key, value)
+        return value
+
+    def pop(self, key, *args):
+        """T.pop(k[,d]) -> v, remove specified key and return the corresponding value.
+        If key is not found, d is returned if given, otherwise KeyError is raised
+        """
+        if len(args) > 1:
+            raise TypeError("pop expected at most 2 arguments, got %d" % (1 + len(args)))
+        try:
+            return self._remove_node(key if self._key is None else self._key(key))[1]
+        except KeyError:
+            if len(args) == 0:
+                raise
+            return args[0]
+
+    def pop_min(self):
+        """T.pop_min() -> (k, v), remove item with minimum key, raise ValueError
+        if T is empty.
+        """
+        return self._remove_node(self._edge_node(0).key)
+
+    def pop_max(self):
+        """T.pop_max() -> (k, v), remove item with maximum key, raise ValueError
+        if T is empty.
+        """
+        return self._remove_node(self._edge_node(1).key)
+
+    def _edge_node(self, direction):
+        """Get the leftmost (0) or rightmost (1) node without key comparisons."""
+        node = self._root
+        if node is None:
+            raise ValueError("Tree is empty")
+        while node[direction] is not None:
+            node = node[direction]
+        return node
+
+    def cursor(self, key=None):
+        """T.cursor([key]) -> TreeCursor positioned on the smallest key greater
+        than or equal to key, or on the min key if key is None.
+        """
+        return TreeCursor(self, key)
+
+    def rank(self, key):
+        """T.rank(key) -> index of key in ascending key order, raises KeyError
+        if key does not exist.
+        """
+        if self._key is not None:
+            key = self._key(key)
+        index = 0
         node = self._root
         while node is not None:
             if key == node.key:
-                return node.value
+                left = node.left
+                return index if left is None else index + left.size
             elif key < node.key:
                 node = node.left
             else:
+                left = node.left
+                index += 1 if left is None else left.size + 1
                 node = node.right
         raise KeyError(str(key))
 
+    def _bisect(self, key, right):
+        if self._key is not None:
+            key = self._key(key)
+        index = 0
+        node = self._root
+        while node is not None:
+            if key == node.key:
+                left = node.left
+                return index + right + (0 if left is None else left.size)
+            elif key < node.key:
+                node = node.left
+            else:
+                left = node.left
+                index += 1 if left is None else left.size + 1
+                node = node.right
+        return index
+
+    def bisect_left(self, key):
+        """T.bisect_left(key) -> count of keys less than key."""
+        return self._bisect(key, 0)
+
+    def bisect_right(self, key):
+        """T.bisect_right(key) -> count of keys less than or equal to key."""
+        return self._bisect(key, 1)
+
+    def select(self, index):
+        """T.select(index) -> (k, v) pair at index in ascending key order,
+        negative indices count from the end, raises IndexError if index is
+        out of range.
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("tree index out of range")
+        node = self._root
+        while True:
+            left = node.left
+            left_size = 0 if left is None else left.size
+            if index == left_size:
+                return node.orig_key, node.value
+            elif index < left_size:
+                node = left
+            else:
+                index -= left_size + 1
+                node = node.right
+
+    def _build_sorted(self, items):
+        """Replace the content of T by a balanced tree of items, a list of
+        (key, value) tuples in strictly ascending key order, O(n). Trees with
+        a key function get (key_function(k), value, k) tuples.
+        """
+        new_node = self._new_node
+        init_node = self._init_built_node
+        red_depth = (len(items) + 1).bit_length() - 1  # depth of the incomplete lowest level
+
+        def build(lo, hi, depth):
+            # returns root of the subtree for items[lo:hi] and its height
+            if lo >= hi:
+                return None, -1
+            mid = (lo + hi) // 2
+            item = items[mid]
+            node = new_node(item[0], item[1])
+            if len(item) > 2:
+                node.orig_key = item[2]
+            node.left, left_height = build(lo, mid, depth + 1)
+            node.right, right_height = build(mid + 1, hi, depth + 1)
+            node.size = hi - lo
+            node_height = max(left_height, right_height) + 1
+            init_node(node, node_height, depth == red_depth)
+            return node, node_height
+
+        self.clear()
+        self._root = build(0, len(items), 0)[0]
+
+    def split(self, key):
+        """T.split(key) -> (left, right), move items with keys < key into the
+        new tree left and items with keys >= key into the new tree right, T
+        is empty afterwards, O(log(n)).
+        """
+        # the split by index compares no keys, an incomparable key raises
+        # TypeError before T is modified
+        left, right = self._split_nodes(self._root, self._bisect(key, 0))
+        self._root = None
+        self._count = 0
+        self._version += 1
+        return self._new_tree(left), self._new_tree(right)
+
+    def _new_tree(self, root):
+        # new tree of the same type, which takes the ownership of root
+        tree = self.__class__(key=self._key)
+        tree._root = root
+        tree._count = root.size if root is not None else 0
+        return tree
+
+    def _split_nodes(self, node, index):
+        """Split subtree node into the subtrees of the first index nodes in
+        key order and of the other nodes, returns the roots of both subtrees.
+        """
+        if node is None:
+            return None, None
+        left = node.left
+        right = node.right
+        left_size = 0 if left is None else left.size
+        if left_size < index:
+            split_left, split_right = self._split_nodes(right, index - left_size - 1)
+            return self._join_nodes(left, node, split_left), split_right
+        else:
+            split_left, split_right = self._split_nodes(left, index)
+            return split_left, self._join_nodes(split_right, node, right)
+
+    def _join(self, other):
+        # other is a non empty tree of the same type and all keys of other
+        # are greater than the keys of T
+        if self._root is None:
+            self._root = other._root
+        else:
+            min_node = other._edge_node(0)
+            mid = self._new_node(min_node.key, min_node.value)
+            mid.orig_key = min_node.orig_key
+            other._remove_node(min_node.key)
+            self._root = self._join_nodes(self._root, mid, other._root)
+        self._count = self._root.size
+        self._version += 1
+        other._root = None
+        other._count = 0
+        other._version += 1
+
+    def _init_built_node(self, node, height, lowest_level):
+        """Set the balance data of a node created by _build_sorted(), height
+        of the subtree and if node is in the incomplete lowest level of the tree.
+        """
+        pass
+
     def pop_item(self):
         """T.pop_item() -> (k, v), remove and return some (key, value) pair as a
         2-tuple; but raise KeyError if T is empty.
@@ -642,10 +1446,7 @@ class CPYTHON_ABCTree(_ABCTree):
                 node = node.right
             else:
                 break
-        key = node.key
-        value = node.value
-        self.remove(key)
-        return key, value
+        return self._remove_node(node.key)
 
     popitem = pop_item  # for compatibility  to dict()
 
@@ -657,20 +1458,39 @@ class CPYTHON_ABCTree(_ABCTree):
         """
         if self.count == 0:
             return
-
-        def _traverse(node):
-            if order == -1:
-                func(node.key, node.value)
-            if node.left is not None:
-                _traverse(node.left)
-            if order == 0:
-                func(node.key, node.value)
-            if node.right is not None:
-                _traverse(node.right)
-            if order == +1:
-                func(node.key, node.value)
-
-        _traverse(self._root)
+        # non recursive, the height of an unbalanced tree is unbounded
+        stack = []
+        node = self._root
+        if order == 0:
+            while stack or node is not None:
+                if node is not None:
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = stack.pop()
+                    func(node.orig_key, node.value)
+                    node = node.right
+        elif order == -1:
+            stack.append(node)
+            while stack:
+                node = stack.pop()
+                func(node.orig_key, node.value)
+                if node.right is not None:
+                    stack.append(node.right)
+                if node.left is not None:
+                    stack.append(node.left)
+        elif order == +1:
+            tempstack = [node]
+            while tempstack:
+                node = tempstack.pop()
+                stack.append(node)
+                if node.left is not None:
+                    tempstack.append(node.left)
+                if node.right is not None:
+                    tempstack.append(node.right)
+            while stack:
+                node = stack.pop()
+                func(node.orig_key, node.value)
 
     def min_item(self):
         """Get item with min key of tree, raises ValueError if tree is empty."""
@@ -679,7 +1499,7 @@ class CPYTHON_ABCTree(_ABCTree):
         node = self._root
         while node.left is not None:
             node = node.left
-        return node.key, node.value
+        return node.orig_key, node.value
 
     def max_item(self):
         """Get item with max key of tree, raises ValueError if tree is empty."""
@@ -688,7 +1508,7 @@ class CPYTHON_ABCTree(_ABCTree):
         node = self._root
         while node.right is not None:
             node = node.right
-        return node.key, node.value
+        return node.orig_key, node.value
 
     def succ_item(self, key):
         """Get successor (k,v) pair of key, raises KeyError if key is max key
@@ -697,6 +1517,8 @@ class CPYTHON_ABCTree(_ABCTree):
         # removed graingets version, because it was little slower on CPython and much slower on pypy
         # this version runs about 4x faster with pypy than the Cython version
         # Note: Code sharing of succ_item() and ceiling_item() is possible, but has always a speed penalty.
+        if self._key is not None:
+            key = self._key(key)
         node = self._root
         succ_node = None
         while node is not None:
@@ -723,7 +1545,7 @@ class CPYTHON_ABCTree(_ABCTree):
                 succ_node = node
         elif succ_node is None:  # given key is biggest in tree
             raise KeyError(str(key))
-        return succ_node.key, succ_node.value
+        return succ_node.orig_key, succ_node.value
 
     def prev_item(self, key):
         """Get predecessor (k,v) pair of key, raises KeyError if key is min key
@@ -732,6 +1554,8 @@ class CPYTHON_ABCTree(_ABCTree):
         # removed graingets version, because it was little slower on CPython and much slower on pypy
         # this version runs about 4x faster with pypy than the Cython version
         # Note: Code sharing of prev_item() and floor_item() is possible, but has always a speed penalty.
+        if self._key is not None:
+            key = self._key(key)
         node = self._root
         prev_node = None
 
@@ -759,18 +1583,20 @@ class CPYTHON_ABCTree(_ABCTree):
                 prev_node = node
         elif prev_node is None:  # given key is smallest in tree
             raise KeyError(str(key))
-        return prev_node.key, prev_node.value
+        return prev_node.orig_key, prev_node.value
 
     def floor_item(self, key):
         """Get the element (k,v) pair associated with the greatest key less
         than or equal to the given key, raises KeyError if there is no such key.
         """
         # Note: Code sharing of prev_item() and floor_item() is possible, but has always a speed penalty.
+        if self._key is not None:
+            key = self._key(key)
         node = self._root
         prev_node = None
         while node is not None:
             if key == node.key:
-                return node.key, node.value
+                return node.orig_key, node.value
             elif key < node.key:
                 node = node.left
             else:
@@ -779,7 +1605,7 @@ class CPYTHON_ABCTree(_ABCTree):
                 node = node.right
         # node must be None here
         if prev_node:
-            return prev_node.key, prev_node.value
+            return prev_node.orig_key, prev_node.value
         raise KeyError(str(key))
 
     def ceiling_item(self, key):
@@ -787,11 +1613,13 @@ class CPYTHON_ABCTree(_ABCTree):
         than or equal to the given key, raises KeyError if there is no such key.
         """
         # Note: Code sharing of succ_item() and ceiling_item() is possible, but has always a speed penalty.
+        if self._key is not None:
+            key = self._key(key)
         node = self._root
         succ_node = None
         while node is not None:
             if key == node.key:
-                return node.key, node.value
+                return node.orig_key, node.value
             elif key > node.key:
                 node = node.right
             else:
@@ -800,7 +1628,7 @@ class CPYTHON_ABCTree(_ABCTree):
                 node = node.left
             # node must be None here
         if succ_node:
-            return succ_node.key, succ_node.value
+            return succ_node.orig_key, succ_node.value
         raise KeyError(str(key))
 
     def iter_items(self, start_key=None, end_key=None, reverse=False):
@@ -811,53 +1639,55 @@ class CPYTHON_ABCTree(_ABCTree):
 
         if self.is_empty():
             return []
+        if self._key is not None:
+            start_key = None if start_key is None else self._key(start_key)
+            end_key = None if end_key is None else self._key(end_key)
         if reverse:
             return self._iter_items_backward(start_key, end_key)
         else:
             return self._iter_items_forward(start_key, end_key)
 
     def _iter_items_forward(self, start_key=None, end_key=None):
-        for item in self._iter_items(left=attrgetter("left"), right=attrgetter("right"),
-                                     start_key=start_key, end_key=end_key):
-            yield item
+        node = self._root
+        stack = []
+        # seek the first key >= start_key, remember the ancestors to visit
+        while node is not None:
+            if start_key is None or not (node.key < start_key):
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
 
-    def _iter_items_backward(self, start_key=None, end_key=None):
-        for item in self._iter_items(left=attrgetter("right"), right=attrgetter("left"),
-                                     start_key=start_key, end_key=end_key):
-            yield item
+        while stack:
+            node = stack.pop()
+            if end_key is not None and not (node.key < end_key):
+                return  # all done
+            yield node.orig_key, node.value
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
 
-    def _iter_items(self, left=attrgetter("left"), right=attrgetter("right"), start_key=None, end_key=None):
+    def _iter_items_backward(self, start_key=None, end_key=None):
         node = self._root
         stack = []
-        go_left = True
-        in_range = self._get_in_range_func(start_key, end_key)
-
-        while True:
-            if left(node) is not None and go_left:
+        # seek the last key < end_key, remember the ancestors to visit
+        while node is not None:
+            if end_key is None or node.key < end_key:
                 stack.append(node)
-                node = left(node)
+                node = node.right
             else:
-                if in_range(node.key):
-                    yield node.key, node.value
-                if right(node) is not None:
-                    node = right(node)
-                    go_left = True
-                else:
-                    if not len(stack):
-                        return  # all done
-                    node = stack.pop()
-                    go_left = False
+                node = node.left
 
-    def _get_in_range_func(self, start_key, end_key):
-        if start_key is None and end_key is None:
-            return lambda x: True
-        else:
-            if start_key is None:
-                start_key = self.min_key()
-            if end_key is None:
-                return lambda x: x >= start_key
-            else:
-                return lambda x: start_key <= x < end_key
+        while stack:
+            node = stack.pop()
+            if start_key is not None and node.key < start_key:
+                return  # all done
+            yield node.orig_key, node.value
+            node = node.left
+            while node is not None:
+                stack.append(node)
+                node = node.right
 
 
 class PYPY_ABCTree(CPYTHON_ABCTree):
@@ -868,28 +1698,37 @@ class PYPY_ABCTree(CPYTHON_ABCTree):
         # optimized for pypy, but slower on CPython
         if self.is_empty():
             return
+        if self._key is not None:
+            start_key = None if start_key is None else self._key(start_key)
+            end_key = None if end_key is None else self._key(end_key)
         direction = 1 if reverse else 0
         other = 1 - direction
-        go_down = True
         stack = []
         node = self._root
-        in_range = self._get_in_range_func(start_key, end_key)
-
-        while True:
-            if node[direction] is not None and go_down:
+        # seek the first node in range, remember the ancestors to visit
+        while node is not None:
+            if reverse:
+                in_front = end_key is None or node.key < end_key
+            else:
+                in_front = start_key is None or not (node.key < start_key)
+            if in_front:
                 stack.append(node)
                 node = node[direction]
             else:
-                if in_range(node.key):
-                    yield node.key, node.value
-                if node[other] is not None:
-                    node = node[other]
-                    go_down = True
-                else:
-                    if not len(stack):
-                        return  # all done
-                    node = stack.pop()
-                    go_down = False
+                node = node[other]
+
+        while stack:
+            node = stack.pop()
+            if reverse:
+                if start_key is not None and node.key < start_key:
+                    return  # all done
+            elif end_key is not None and not (node.key < end_key):
+                return  # all done
+            yield node.orig_key, node.value
+            node = node[other]
+            while node is not None:
+                stack.append(node)
+                node = node[direction]
 
 
 if PYPY:
@@ -34,19 +34,23 @@ from array import array
 
 __all__ = ['AVLTree']
 
-MAXSTACK = 32
+# the height of an AVL tree of n nodes is less than 1.44*log2(n+2), less
+# than 92 for 2**63 nodes
+MAXSTACK = 128
 
 
 class Node(object):
     """Internal object, represents a tree node."""
-    __slots__ = ['left', 'right', 'balance', 'key', 'value']
+    __slots__ = ['left', 'right', 'balance', 'key', 'value', 'size', 'orig_key']
 
     def __init__(self, key=None, value=None):
         self.left = None
         self.right = None
-        self.key = key
+        self.key = key  # key of the tree order
         self.value = value
+        self.orig_key = key  # key given by the user, key is key_function(orig_key)
         self.balance = 0
+        self.size = 1  # count of nodes in this subtree
 
     def __getitem__(self, key):
         """N.__getitem__(key) <==> x[key], where key is 0 (left) or 1 (right)."""
@@ -65,12 +69,21 @@ class Node(object):
         self.right = None
         self.key = None
         self.value = None
+        self.orig_key = None
 
 
 def height(node):
     return node.balance if node is not None else -1
 
 
+def size(node):
+    return node.size if node is not None else 0
+
+
+def update_size(node):
+    node.size = size(node.left) + size(node.right) + 1
+
+
 def jsw_single(root, direction):
     other_side = 1 - direction
     save = root[other_side]
@@ -81,6 +94,8 @@ def jsw_single(root, direction):
     slh = height(save[other_side])
     root.balance = max(rlh, rrh) + 1
     save.balance = max(slh, root.balance) + 1
+    update_size(root)
+    update_size(save)
     return save
 
 
@@ -90,6 +105,30 @@ def jsw_double(root, direction):
     return jsw_single(root, direction)
 
 
+def update_node(node):
+    node.balance = max(height(node.left), height(node.right)) + 1
+    update_size(node)
+
+
+def join_direction(big, mid, small, direction):
+    """Join tree big with the lower tree small at side direction."""
+    other_side = 1 - direction
+    child = big[direction]
+    if height(child) <= height(small) + 1:
+        mid[other_side] = child
+        mid[direction] = small
+        update_node(mid)
+        if height(mid) > height(big[other_side]) + 1:
+            mid = jsw_single(mid, direction)
+        big[direction] = mid
+    else:
+        big[direction] = join_direction(child, mid, small, direction)
+    update_node(big)
+    if height(big[direction]) > height(big[other_side]) + 1:
+        return jsw_single(big, other_side)
+    return big
+
+
 class AVLTree(ABCTree):
     """
     AVLTree implements a balanced binary tree with a dict-like interface.
@@ -120,10 +159,30 @@ class AVLTree(ABCTree):
         self._count += 1
         return Node(key, value)
 
-    def insert(self, key, value):
-        """T.insert(key, value) <==> T[key] = value, insert key, value into tree."""
+    def _init_built_node(self, node, height, lowest_level):
+        node.balance = height
+
+    def _join_nodes(self, left, mid, right):
+        """Join subtrees left and right with node mid in between."""
+        left_height = height(left)
+        right_height = height(right)
+        if left_height > right_height + 1:
+            return join_direction(left, mid, right, 1)
+        if right_height > left_height + 1:
+            return join_direction(right, mid, left, 0)
+        mid.left = left
+        mid.right = right
+        update_node(mid)
+        return mid
+
+    def _insert_node(self, key, value, replace):
+        """Insert key, value into tree, replace the value of an existing key
+        only if replace is True, returns (node of key, True for a new node).
+        """
+        self._version += 1
         if self._root is None:
             self._root = self._new_node(key, value)
+            return self._root, True
         else:
             node_stack = []  # node stack
             dir_stack = array('I')  # direction stack
@@ -133,8 +192,9 @@ class AVLTree(ABCTree):
             # search for an empty link, save path
             while True:
                 if key == node.key:  # update existing item
-                    node.value = value
-                    return
+                    if replace:
+                        node.value = value
+                    return node, False
                 direction = 1 if key > node.key else 0
                 dir_stack.append(direction)
                 node_stack.append(node)
@@ -143,7 +203,8 @@ class AVLTree(ABCTree):
                 node = node[direction]
 
             # Insert a new node at the bottom of the tree
-            node[direction] = self._new_node(key, value)
+            new_node = self._new_node(key, value)
+            node[direction] = new_node
 
             # Walk back up the search path
             top = len(node_stack) - 1
@@ -179,10 +240,18 @@ class AVLTree(ABCTree):
                 right_height = height(top_node[other_side])
 
                 top_node.balance = max(left_height, right_height) + 1
+                update_size(top_node)
                 top -= 1
 
-    def remove(self, key):
-        """T.remove(key) <==> del T[key], remove item <key> from tree."""
+            # Update subtree sizes of the remaining path
+            while top >= 0:
+                node_stack[top].size += 1
+                top -= 1
+            return new_node, True
+
+    def _remove_node(self, key):
+        """Remove item <key> from tree, returns the removed (key, value) pair."""
+        self._version += 1
         if self._root is None:
             raise KeyError(str(key))
         else:
@@ -196,6 +265,7 @@ class AVLTree(ABCTree):
                 if node is None:
                     raise KeyError(str(key))
                 elif node.key == key:
+                    item = node.orig_key, node.value
                     break
 
                 # Push direction and node onto stack
@@ -235,6 +305,7 @@ class AVLTree(ABCTree):
 
                 # Swap data
                 node.key = heir.key
+                node.orig_key = heir.orig_key
                 node.value = heir.value
 
                 # Unlink successor and fix parent
@@ -255,6 +326,7 @@ class AVLTree(ABCTree):
 
                 # Update balance factors
                 top_node.balance = b_max + 1
+                update_size(top_node)
 
                 # Terminate or rebalance as necessary
                 if (left_height - right_height) == -1:
@@ -272,3 +344,9 @@ class AVLTree(ABCTree):
                     else:
                         self._root = node_stack[0]
                 top -= 1
+
+            # Update subtree sizes of the remaining path
+            while top > 0:
+                top -= 1
+                node_stack[top].size -= 1
+        return item
@@ -15,13 +15,15 @@ __all__ = ['BinaryTree']
 
 class Node(object):
     """Internal object, represents a tree node."""
-    __slots__ = ['key', 'value', 'left', 'right']
+    __slots__ = ['key', 'value', 'left', 'right', 'size', 'orig_key']
 
     def __init__(self, key, value):
-        self.key = key
+        self.key = key  # key of the tree order
         self.value = value
+        self.orig_key = key  # key given by the user, key is key_function(orig_key)
         self.left = None
         self.right = None
+        self.size = 1  # count of nodes in this subtree
 
     def __getitem__(self, key):
         """N.__getitem__(key) <==> x[key], where key is 0 (left) or 1 (right)."""
@@ -40,6 +42,7 @@ class Node(object):
         self.right = None
         self.value = None
         self.key = None
+        self.orig_key = None
 
 
 class BinaryTree(ABCTree):
@@ -62,49 +65,106 @@ class BinaryTree(ABCTree):
         self._count += 1
         return Node(key, value)
 
-    def insert(self, key, value):
-        """T.insert(key, value) <==> T[key] = value, insert key, value into tree."""
+    def _join_nodes(self, left, mid, right):
+        """Join subtrees left and right with node mid in between."""
+        mid.left = left
+        mid.right = right
+        mid.size = (left.size if left is not None else 0) + (right.size if right is not None else 0) + 1
+        return mid
+
+    def _split_nodes(self, node, index):
+        """Split subtree node into the subtrees of the first index nodes in
+        key order and of the other nodes, non recursive because the height of
+        an unbalanced tree is unbounded.
+        """
+        left_spine = []  # linked by right links
+        right_spine = []  # linked by left links
+        while node is not None:
+            left_size = 0 if node.left is None else node.left.size
+            if left_size < index:
+                index -= left_size + 1
+                if left_spine:
+                    left_spine[-1].right = node
+                left_spine.append(node)
+                node = node.right
+            else:
+                if right_spine:
+                    right_spine[-1].left = node
+                right_spine.append(node)
+                node = node.left
+        if left_spine:
+            left_spine[-1].right = None
+        if right_spine:
+            right_spine[-1].left = None
+        size = 0
+        for node in reversed(left_spine):
+            size += (node.left.size if node.left is not None else 0) + 1
+            node.size = size
+        size = 0
+        for node in reversed(right_spine):
+            size += (node.right.size if node.right is not None else 0) + 1
+            node.size = size
+        return (left_spine[0] if left_spine else None), (right_spine[0] if right_spine else None)
+
+    def _insert_node(self, key, value, replace):
+        """Insert key, value into tree, replace the value of an existing key
+        only if replace is True, returns (node of key, True for a new node).
+        """
+        self._version += 1
         if self._root is None:
             self._root = self._new_node(key, value)
+            return self._root, True
         else:
             parent = None
             direction = 0
             node = self._root
+            path = []
             while True:
                 if node is None:
-                    parent[direction] = self._new_node(key, value)
-                    break
+                    node = self._new_node(key, value)
+                    parent[direction] = node
+                    for parent in path:
+                        parent.size += 1
+                    return node, True
                 if key == node.key:
-                    node.value = value  # replace value
-                    break
+                    if replace:
+                        node.value = value  # replace value
+                    return node, False
                 else:
+                    path.append(node)
                     parent = node
                     direction = 0 if key <= node.key else 1
                     node = node[direction]
 
-    def remove(self, key):
-        """T.remove(key) <==> del T[key], remove item <key> from tree."""
+    def _remove_node(self, key):
+        """Remove item <key> from tree, returns the removed (key, value) pair."""
+        self._version += 1
         node = self._root
         if node is None:
             raise KeyError(str(key))
         else:
             parent = None
             direction = 0
+            path = []
             while True:
                 if key == node.key:
+                    item = node.orig_key, node.value
                     # remove node
                     if (node.left is not None) and (node.right is not None):
                         # find replacment node: smallest key in right-subtree
+                        path.append(node)
                         parent = node
                         direction = 1
                         replacement = node.right
                         while replacement.left is not None:
+                            path.append(replacement)
                             parent = replacement
                             direction = 0
                             replacement = replacement.left
                         parent[direction] = replacement.right
                         #swap places
                         node.key = replacement.key
+                        node.orig_key = replacement.orig_key
                         node.value = replacement.value
                         node = replacement  # delete replacement!
                     else:
@@ -113,10 +173,13 @@ class BinaryTree(ABCTree):
                             self._root = node[down_dir]
                         else:
                             parent[direction] = node[down_dir]
+                    for parent in path:
+                        parent.size -= 1
                     node.free()
                     self._count -= 1
-                    break
+                    return item
                 else:
+                    path.append(node)
                     direction = 0 if key < node.key else 1
                     parent = node
                     node = node[direction]
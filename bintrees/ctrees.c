@@ -8,10 +8,14 @@
 
 #include "ctrees.h"
 #include <Python.h>
+#include <stddef.h>
+#include <float.h>
+#include <math.h>
 
 #define LEFT 0
 #define RIGHT 1
 #define KEY(node) (node->key)
+#define ORIG_KEY(node) (node->orig_key)
 #define VALUE(node) (node->value)
 #define LEFT_NODE(node) (node->link[LEFT])
 #define RIGHT_NODE(node) (node->link[RIGHT])
@@ -19,94 +23,764 @@
 #define XDATA(node) (node->xdata)
 #define RED(node) (node->xdata)
 #define BALANCE(node) (node->xdata)
+#define SIZE(node) ((node) == NULL ? 0 : (node)->size)
+#define UPDATE_SIZE(node) ((node)->size = SIZE(LEFT_NODE(node)) + SIZE(RIGHT_NODE(node)) + 1)
+
+#ifdef CT_OBJECT_KEYS
+#define KEY_INCREF(key) Py_INCREF(key)
+#define KEY_DECREF(key) Py_XDECREF(key)
+#if defined(CT_BYTES_KEYS)
+#define KEY_COMPARE(key1, key2) ct_compare_bytes(key1, key2)
+#elif defined(CT_STR_KEYS)
+#define KEY_COMPARE(key1, key2) PyUnicode_Compare(key1, key2)
+#elif defined(CT_TUPLE_KEYS)
+#define KEY_COMPARE(key1, key2) ct_compare_tuples(key1, key2)
+#else
+#define KEY_COMPARE(key1, key2) ct_compare(key1, key2)
+#endif
+#define KEY_COMPARE_FAILED(res) ((res) == CT_COMPARE_ERROR)
+#define NO_KEY NULL
+#else /* C keys are compared without rich comparison */
+#define KEY_INCREF(key)
+#define KEY_DECREF(key)
+#define KEY_COMPARE(key1, key2) (((key1) > (key2)) - ((key1) < (key2)))
+#define KEY_COMPARE_FAILED(res) 0
+#define NO_KEY 0
+#endif
+
+/* max path length of rb_insert/rb_remove: the rb-tree height is less
+   than 2*log2(n+1), and rotations can add nodes to the path */
+#define RB_MAXPATH 512
+
+/* max path length of avl_insert/avl_remove: the avl-tree height is less
+   than 1.44*log2(n+2), less than 92 for 2**63 nodes, and fits into the
+   8 bits of xdata */
+#define AVL_MAXPATH 128
+
+/* node pools: the nodes are allocated in slabs, freed nodes are kept in a
+ * free list for reuse, the slabs are released with the pool */
+
+#define SLAB_MIN_NODES 1
+#define SLAB_MAX_NODES 4096
+#define CT_COMPACT_NODES SLAB_MAX_NODES
+
+struct ct_slab {
+	ct_slab_t *next;
+	node_t nodes[1];
+};
+
+static ct_pool_t *
+ct_pool_root(ct_pool_t *pool)
+{
+	while (pool->merged != NULL)
+		pool = pool->merged;
+	return pool;
+}
 
-static node_t *
-ct_new_node(PyObject *key, PyObject *value, int xdata)
-{
-    PyGILState_STATE state = PyGILState_Ensure();
-	node_t *new_node = PyMem_Malloc(sizeof(node_t));
-	PyGILState_Release(state);
-	if (new_node != NULL) {
-		KEY(new_node) = key;
-		Py_INCREF(key);
-		VALUE(new_node) = value;
-		Py_INCREF(value);
-		LEFT_NODE(new_node) = NULL;
-		RIGHT_NODE(new_node) = NULL;
-		XDATA(new_node) = xdata;
+extern ct_pool_t *
+ct_pool_new(void)
+{
+	ct_pool_t *pool = PyMem_Malloc(sizeof(ct_pool_t));
+	if (pool == NULL)
+		return (ct_pool_t *)PyErr_NoMemory();
+	pool->refcount = 1;
+	pool->merged = NULL;
+	pool->slabs = NULL;
+	pool->free_nodes = NULL;
+	pool->free_tail = NULL;
+	pool->capacity = 0;
+	pool->nbytes = 0;
+	pool->available = 0;
+	return pool;
+}
+
+extern void
+ct_pool_release(ct_pool_t *pool)
+/* release a reference to pool, frees the slabs with the last reference */
+{
+	ct_pool_t *merged;
+	ct_slab_t *slab;
+
+	while (pool != NULL && --pool->refcount == 0) {
+		while (pool->slabs != NULL) {
+			slab = pool->slabs;
+			pool->slabs = slab->next;
+			PyMem_Free(slab);
+		}
+		merged = pool->merged;
+		PyMem_Free(pool);
+		pool = merged;
 	}
-	return new_node;
 }
 
-static void
-ct_delete_node(node_t *node)
+extern ct_pool_t *
+ct_pool_share(ct_pool_t *pool)
+/* new reference to the pool of pool */
 {
-    PyGILState_STATE state;
-	if (node != NULL) {
-		Py_XDECREF(KEY(node));
-		Py_XDECREF(VALUE(node));
-		LEFT_NODE(node) = NULL;
-		RIGHT_NODE(node) = NULL;
-		state = PyGILState_Ensure();
-		PyMem_Free(node);
-		PyGILState_Release(state);
+	if (pool != NULL) {
+		pool = ct_pool_root(pool);
+		pool->refcount++;
 	}
+	return pool;
 }
 
 extern void
-ct_delete_tree(node_t *root)
+ct_pool_merge(ct_pool_t *pool, ct_pool_t *other)
+/* move the slabs and free nodes of other into pool, before nodes of other
+ * are linked into a tree of pool, other forwards to pool afterwards */
 {
-	if (root == NULL)
+	ct_slab_t **slabaddr;
+
+	pool = ct_pool_root(pool);
+	other = ct_pool_root(other);
+	if (pool == other)
 		return;
-	if (LEFT_NODE(root) != NULL) {
-		ct_delete_tree(LEFT_NODE(root));
+	slabaddr = &other->slabs;
+	while (*slabaddr != NULL)
+		slabaddr = &(*slabaddr)->next;
+	*slabaddr = pool->slabs;
+	pool->slabs = other->slabs;
+	if (other->free_nodes != NULL) {
+		LEFT_NODE(other->free_tail) = pool->free_nodes;
+		if (pool->free_nodes == NULL)
+			pool->free_tail = other->free_tail;
+		pool->free_nodes = other->free_nodes;
+	}
+	pool->capacity += other->capacity;
+	pool->nbytes += other->nbytes;
+	pool->available += other->available;
+	other->slabs = NULL;
+	other->free_nodes = NULL;
+	other->free_tail = NULL;
+	other->capacity = 0;
+	other->nbytes = 0;
+	other->available = 0;
+	other->merged = pool;
+	pool->refcount++;
+}
+
+static int
+ct_pool_grow(ct_pool_t *pool, Py_ssize_t count)
+/* add a slab of count nodes to the free nodes, returns -1 if out of memory */
+{
+	ct_slab_t *slab;
+	Py_ssize_t index;
+	size_t nbytes;
+
+	if (count > (PY_SSIZE_T_MAX - (Py_ssize_t)sizeof(ct_slab_t)) / (Py_ssize_t)sizeof(node_t)) {
+		PyErr_NoMemory();
+		return -1;
+	}
+	nbytes = offsetof(ct_slab_t, nodes) + count * sizeof(node_t);
+	slab = PyMem_Malloc(nbytes);
+	if (slab == NULL) {
+		PyErr_NoMemory();
+		return -1;
+	}
+	slab->next = pool->slabs;
+	pool->slabs = slab;
+	/* the nodes of a slab are handed out in address order */
+	if (pool->free_nodes == NULL)
+		pool->free_tail = &slab->nodes[count - 1];
+	for (index = count - 1; index >= 0; index--) {
+		slab->nodes[index].link[LEFT] = pool->free_nodes;
+		pool->free_nodes = &slab->nodes[index];
+	}
+	pool->capacity += count;
+	pool->nbytes += nbytes;
+	pool->available += count;
+	return 0;
+}
+
+static node_t *
+ct_pool_take_node(ct_pool_t *pool)
+/* uninitialized node from the free list of pool, which is not empty */
+{
+	node_t *node = pool->free_nodes;
+
+	pool->free_nodes = LEFT_NODE(node);
+	if (pool->free_nodes == NULL)
+		pool->free_tail = NULL;
+	pool->available--;
+	return node;
+}
+
+static void
+ct_pool_put_node(ct_pool_t *pool, node_t *node)
+/* put node into the free list of pool, does not release key and value */
+{
+	RIGHT_NODE(node) = NULL;
+	LEFT_NODE(node) = pool->free_nodes;
+	if (pool->free_nodes == NULL)
+		pool->free_tail = node;
+	pool->free_nodes = node;
+	pool->available++;
+}
+
+extern int
+ct_pool_reserve(ct_pool_t *pool, Py_ssize_t count)
+/* make sure count nodes can be allocated without allocating a slab,
+ * returns -1 if out of memory */
+{
+	pool = ct_pool_root(pool);
+	if (count <= pool->available)
+		return 0;
+	return ct_pool_grow(pool, count - pool->available);
+}
+
+extern Py_ssize_t
+ct_pool_capacity(ct_pool_t *pool)
+/* count of nodes in all slabs */
+{
+	return (pool == NULL) ? 0 : ct_pool_root(pool)->capacity;
+}
+
+extern Py_ssize_t
+ct_pool_nbytes(ct_pool_t *pool)
+/* memory of the pool and all slabs in bytes */
+{
+	return (pool == NULL) ? 0 : sizeof(ct_pool_t) + ct_pool_root(pool)->nbytes;
+}
+
+extern Py_ssize_t
+ct_pool_share_nbytes(ct_pool_t *pool, Py_ssize_t count)
+/* share of the memory of the pool in bytes of a tree of count nodes, in
+ * proportion to the nodes in use by all trees sharing the pool */
+{
+	Py_ssize_t in_use, nbytes = ct_pool_nbytes(pool);
+
+	if (pool == NULL)
+		return 0;
+	pool = ct_pool_root(pool);
+	in_use = pool->capacity - pool->available;
+	if (count >= in_use)
+		return nbytes;
+	return (Py_ssize_t)((double)nbytes * count / in_use);
+}
+
+extern int
+ct_pool_compact(ct_pool_t **pooladdr, node_t **rootaddr)
+/* move the nodes of a small tree, which shares the pool *pooladdr with
+ * other trees, into a new pool, so the slabs of the shared pool are freed
+ * with the other trees, the moved nodes become free nodes of the shared
+ * pool; a no-op for trees of more than CT_COMPACT_NODES nodes and if more
+ * than half of the nodes of the shared pool would be free afterwards, which
+ * limits the free nodes of repeated splits and joins,
+ * returns -1 if out of memory else 0 */
+{
+	ct_pool_t *pool, *target;
+	node_t ***stack, **linkaddr, *node, *new_node;
+	Py_ssize_t count = SIZE(*rootaddr), depth = 0;
+
+	if (*pooladdr == NULL || count == 0 || count > CT_COMPACT_NODES)
+		return 0;
+	pool = ct_pool_root(*pooladdr);
+	if (pool->refcount < 2 || 2 * (pool->available + count) > pool->capacity)
+		return 0;
+	target = ct_pool_new();
+	if (target == NULL)
+		return -1;
+	/* every node is pushed once */
+	stack = PyMem_Malloc(count * sizeof(node_t **));
+	if (stack == NULL || ct_pool_reserve(target, count) < 0) {
+		if (stack == NULL)
+			PyErr_NoMemory();
+		PyMem_Free(stack);
+		ct_pool_release(target);
+		return -1;
+	}
+	stack[depth++] = rootaddr;
+	while (depth > 0) {
+		linkaddr = stack[--depth];
+		node = *linkaddr;
+		new_node = ct_pool_take_node(target);
+		*new_node = *node; /* moves the references to key and value */
+		*linkaddr = new_node;
+		ct_pool_put_node(pool, node);
+		if (LEFT_NODE(new_node) != NULL)
+			stack[depth++] = &LEFT_NODE(new_node);
+		if (RIGHT_NODE(new_node) != NULL)
+			stack[depth++] = &RIGHT_NODE(new_node);
+	}
+	PyMem_Free(stack);
+	ct_pool_release(*pooladdr);
+	*pooladdr = target;
+	return 0;
+}
+
+static node_t *
+ct_new_node(ct_pool_t *pool, ct_key_t key, PyObject *value, int xdata)
+{
+	node_t *new_node;
+	Py_ssize_t count;
+
+	if (pool->free_nodes == NULL) {
+		/* the slabs double with the pool, small trees allocate small slabs */
+		count = pool->capacity;
+		if (count < SLAB_MIN_NODES)
+			count = SLAB_MIN_NODES;
+		else if (count > SLAB_MAX_NODES)
+			count = SLAB_MAX_NODES;
+		if (ct_pool_grow(pool, count) < 0)
+			return NULL;
 	}
-	if (RIGHT_NODE(root) != NULL) {
-		ct_delete_tree(RIGHT_NODE(root));
+	new_node = ct_pool_take_node(pool);
+
+	KEY(new_node) = key;
+	KEY_INCREF(key);
+#if CT_KEY_FUNCTIONS
+	ORIG_KEY(new_node) = key; /* without a key function */
+	Py_INCREF(key);
+#endif
+	VALUE(new_node) = value;
+	Py_INCREF(value);
+	LEFT_NODE(new_node) = NULL;
+	RIGHT_NODE(new_node) = NULL;
+	new_node->size = 1;
+	XDATA(new_node) = xdata;
+	return new_node;
+}
+
+static void
+ct_free_node(ct_pool_t *pool, node_t *node)
+/* release key and value and put node into the free list of pool */
+{
+#ifdef CT_OBJECT_KEYS
+	PyObject *key = KEY(node);
+#endif
+	PyObject *value = VALUE(node);
+#if CT_KEY_FUNCTIONS
+	PyObject *orig_key = ORIG_KEY(node);
+#endif
+
+	ct_pool_put_node(pool, node);
+	/* releasing the objects can run arbitrary code, node is not used
+	 * anymore */
+	KEY_DECREF(key);
+#if CT_KEY_FUNCTIONS
+	Py_XDECREF(orig_key);
+#endif
+	Py_XDECREF(value);
+}
+
+extern void
+ct_delete_tree(ct_pool_t *pool, node_t *root)
+/* free all nodes of root, non recursive because the height of an unbalanced
+ * tree is unbounded: left subtrees are rotated into the right spine, every
+ * step is a rotation or frees a node, O(n) time and O(1) space */
+{
+	node_t *node;
+
+	while (root != NULL) {
+		node = LEFT_NODE(root);
+		if (node != NULL) {
+			LEFT_NODE(root) = RIGHT_NODE(node);
+			RIGHT_NODE(node) = root;
+		} else {
+			node = RIGHT_NODE(root);
+			ct_free_node(pool, root);
+		}
+		root = node;
 	}
-	ct_delete_node(root);
 }
 
 static void
 ct_swap_data(node_t *node1, node_t *node2)
 {
-	PyObject *tmp;
-	tmp = KEY(node1);
+	ct_key_t key = KEY(node1);
+	PyObject *value = VALUE(node1);
 	KEY(node1) = KEY(node2);
-	KEY(node2) = tmp;
-	tmp = VALUE(node1);
+	KEY(node2) = key;
 	VALUE(node1) = VALUE(node2);
-	VALUE(node2) = tmp;
+	VALUE(node2) = value;
+#if CT_KEY_FUNCTIONS
+	value = ORIG_KEY(node1);
+	ORIG_KEY(node1) = ORIG_KEY(node2);
+	ORIG_KEY(node2) = value;
+#endif
+}
+
+static void
+ct_take_data(node_t *node, ct_key_t *keyaddr, PyObject **valueaddr)
+/* move the references to key and value of node to the not NULL addresses,
+ * the key is the original key of the item */
+{
+	if (keyaddr != NULL) {
+#if CT_KEY_FUNCTIONS
+		*keyaddr = ORIG_KEY(node);
+		ORIG_KEY(node) = NULL;
+#else
+		*keyaddr = KEY(node);
+		KEY(node) = NO_KEY;
+#endif
+	}
+	if (valueaddr != NULL) {
+		*valueaddr = VALUE(node);
+		VALUE(node) = NULL;
+	}
+}
+
+static void
+ct_replace_value(node_t *node, PyObject *value, int replace)
+{
+	if (replace) {
+		Py_XDECREF(VALUE(node)); /* release old value object */
+		VALUE(node) = value; /* set new value object */
+		Py_INCREF(value); /* take new value object */
+	}
+}
+
+static int
+ct_compare_bytes(PyObject *key1, PyObject *key2)
+/* three-way compare of two bytes objects by memcmp() */
+{
+	Py_ssize_t size1 = PyBytes_GET_SIZE(key1);
+	Py_ssize_t size2 = PyBytes_GET_SIZE(key2);
+	int res = memcmp(PyBytes_AS_STRING(key1), PyBytes_AS_STRING(key2),
+					 (size_t)(size1 < size2 ? size1 : size2));
+	if (res != 0)
+		return (res > 0) - (res < 0);
+	return (size1 > size2) - (size1 < size2);
+}
+
+static int ct_compare_tuples(PyObject *key1, PyObject *key2);
+
+#define CT_GENERIC_COMPARE 2
+
+/* three-way compare of two keys of the same exact builtin type without
+   rich comparison dispatch, returns CT_GENERIC_COMPARE for all other types
+   and for ints out of the range of long */
+static int
+ct_compare_exact(PyObject *key1, PyObject *key2)
+{
+	PyTypeObject *type = Py_TYPE(key1);
+
+	if (type == &PyLong_Type) {
+		int overflow1, overflow2;
+		long value1 = PyLong_AsLongAndOverflow(key1, &overflow1);
+		long value2 = PyLong_AsLongAndOverflow(key2, &overflow2);
+		if (overflow1 || overflow2)
+			return CT_GENERIC_COMPARE;
+		return (value1 > value2) - (value1 < value2);
+	}
+	else if (type == &PyFloat_Type) {
+		/* NaN compares equal like the rich comparison path */
+		double value1 = PyFloat_AS_DOUBLE(key1);
+		double value2 = PyFloat_AS_DOUBLE(key2);
+		return (value1 > value2) - (value1 < value2);
+	}
+	else if (type == &PyUnicode_Type) {
+		return PyUnicode_Compare(key1, key2);
+	}
+	else if (type == &PyBytes_Type) {
+		return ct_compare_bytes(key1, key2);
+	}
+	else if (type == &PyTuple_Type) {
+		return ct_compare_tuples(key1, key2);
+	}
+	return CT_GENERIC_COMPARE;
 }
 
 int
 ct_compare(PyObject *key1, PyObject *key2)
+/* three-way compare, returns CT_COMPARE_ERROR with the error of the rich
+ * comparison set, or a TypeError if the keys are not comparable */
 {
 	int res;
 
+	if (Py_TYPE(key1) == Py_TYPE(key2)) {
+		res = ct_compare_exact(key1, key2);
+		if (res != CT_GENERIC_COMPARE)
+			return res;
+	}
 	res = PyObject_RichCompareBool(key1, key2, Py_LT);
 	if (res > 0)
 		return -1;
-	else if (res < 0) {
+	if (res == 0) {
+		/* second compare: +1 if key1 > key2, 0 if not -> equal */
+		res = PyObject_RichCompareBool(key1, key2, Py_GT);
+		if (res >= 0)
+			return res;
+	}
+	if (!PyErr_Occurred())
 		PyErr_SetString(PyExc_TypeError, "invalid type for key");
+	return CT_COMPARE_ERROR;
+}
+
+static int
+ct_compare_tuples(PyObject *key1, PyObject *key2)
+/* lexicographic three-way compare of two tuples, the fields are compared by
+ * ct_compare(), which takes the fast paths for builtin field types,
+ * returns CT_COMPARE_ERROR with an exception set on error */
+{
+	Py_ssize_t size1 = PyTuple_GET_SIZE(key1);
+	Py_ssize_t size2 = PyTuple_GET_SIZE(key2);
+	Py_ssize_t index;
+	PyObject *field1, *field2;
+	int res = 0;
+
+	if (Py_EnterRecursiveCall(" in key comparison"))
+		return CT_COMPARE_ERROR;
+	for (index = 0; index < size1 && index < size2; index++) {
+		field1 = PyTuple_GET_ITEM(key1, index);
+		field2 = PyTuple_GET_ITEM(key2, index);
+		if (field1 == field2)
+			continue;
+		res = ct_compare(field1, field2);
+		if (res != 0)
+			break;
+	}
+	Py_LeaveRecursiveCall();
+	if (res != 0 || (index < size1 && index < size2))
+		return res;
+	return (size1 > size2) - (size1 < size2);
+}
+
+static int ct_key_from_object(PyObject *keyobj, ct_key_t *keyaddr);
+
+/* position of a lookup key relative to the nearest tree key of
+ * ct_probe_from_object(): equal, less, greater or NaN */
+#define CT_PROBE_EQUAL 0
+#define CT_PROBE_LESS (-1)
+#define CT_PROBE_GREATER 1
+#define CT_PROBE_NAN 2
+
+#if defined(CT_FLOAT64_KEYS)
+static int
+ct_double_from_long(PyObject *value, double *keyaddr, int *biasaddr)
+/* convert the int value to the nearest double, *biasaddr is the sign of
+ * value - *keyaddr, returns -1 with OverflowError set and the sign of value
+ * in *biasaddr if value is out of the range of double */
+{
+	PyObject *rounded;
+	int overflow, res;
+	long long small = PyLong_AsLongLongAndOverflow(value, &overflow);
+
+	*biasaddr = CT_PROBE_EQUAL;
+	if (small == -1 && PyErr_Occurred())
+		return -1;
+	if (!overflow && small >= -(1LL << 53) && small <= (1LL << 53)) {
+		*keyaddr = (double)small; /* exact */
 		return 0;
+	}
+	*keyaddr = PyLong_AsDouble(value);
+	if (*keyaddr == -1.0 && PyErr_Occurred()) {
+		*biasaddr = overflow;
+		return -1;
+	}
+	rounded = PyLong_FromDouble(*keyaddr);
+	if (rounded == NULL)
+		return -1;
+	res = PyObject_RichCompareBool(value, rounded, Py_LT);
+	if (res == 0) {
+		res = PyObject_RichCompareBool(value, rounded, Py_GT);
+		if (res > 0)
+			*biasaddr = CT_PROBE_GREATER;
+	}
+	else if (res > 0)
+		*biasaddr = CT_PROBE_LESS;
+	Py_DECREF(rounded);
+	return (res < 0) ? -1 : 0;
+}
+#endif
+
+static int
+ct_probe_from_object(PyObject *keyobj, ct_key_t *keyaddr, int *biasaddr)
+/* convert the Python object keyobj of a lookup to the nearest tree key,
+ * numbers out of the range or between the values of the C keys get the
+ * nearest key and CT_PROBE_LESS or CT_PROBE_GREATER in *biasaddr, NaN gets
+ * CT_PROBE_NAN, exact keys CT_PROBE_EQUAL; returns -1 with an exception set
+ * if keyobj is not comparable to the keys */
+{
+#if defined(CT_INT64_KEYS)
+	PyObject *index;
+	double value, floor_value;
+	int overflow;
+
+	*biasaddr = CT_PROBE_EQUAL;
+	if (PyLong_Check(keyobj) || (!PyFloat_Check(keyobj) && PyIndex_Check(keyobj))) {
+		index = PyNumber_Index(keyobj);
+		if (index == NULL)
+			return -1;
+		*keyaddr = PyLong_AsLongLongAndOverflow(index, &overflow);
+		Py_DECREF(index);
+		if (*keyaddr == -1 && PyErr_Occurred())
+			return -1;
+		if (overflow) {
+			*keyaddr = (overflow > 0) ? INT64_MAX : INT64_MIN;
+			*biasaddr = overflow;
+		}
+		return 0;
+	}
+	value = PyFloat_AsDouble(keyobj);
+	if (value == -1.0 && PyErr_Occurred())
+		return -1;
+	if (Py_IS_NAN(value)) {
+		*keyaddr = 0;
+		*biasaddr = CT_PROBE_NAN;
+	}
+	else if (value >= 9223372036854775808.0) { /* 2**63 */
+		*keyaddr = INT64_MAX;
+		*biasaddr = CT_PROBE_GREATER;
+	}
+	else if (value < -9223372036854775808.0) {
+		*keyaddr = INT64_MIN;
+		*biasaddr = CT_PROBE_LESS;
+	}
+	else {
+		floor_value = floor(value);
+		*keyaddr = (int64_t)floor_value;
+		if (value > floor_value)
+			*biasaddr = CT_PROBE_GREATER;
+	}
+	return 0;
+#elif defined(CT_FLOAT64_KEYS)
+	PyObject *index;
+	int res;
+
+	*biasaddr = CT_PROBE_EQUAL;
+	if (PyLong_Check(keyobj) || (!PyFloat_Check(keyobj) && PyIndex_Check(keyobj))) {
+		index = PyNumber_Index(keyobj);
+		if (index == NULL)
+			return -1;
+		res = ct_double_from_long(index, keyaddr, biasaddr);
+		if (res < 0 && PyErr_ExceptionMatches(PyExc_OverflowError)) {
+			/* greater than DBL_MAX and less than inf or vice versa */
+			PyErr_Clear();
+			*keyaddr = (*biasaddr > 0) ? DBL_MAX : -DBL_MAX;
+			res = 0;
+		}
+		Py_DECREF(index);
+		return (res < 0) ? -1 : 0;
+	}
+	*keyaddr = PyFloat_AsDouble(keyobj);
+	if (*keyaddr == -1.0 && PyErr_Occurred())
+		return -1;
+	if (Py_IS_NAN(*keyaddr))
+		*biasaddr = CT_PROBE_NAN;
+	return 0;
+#else
+	*biasaddr = CT_PROBE_EQUAL;
+	return ct_key_from_object(keyobj, keyaddr);
+#endif
+}
+
+static int
+ct_bound_from_object(PyObject *keyobj, ct_key_t *keyaddr, int *biasaddr)
+/* ct_probe_from_object() for the ordered lookups, which have no result for
+ * NaN */
+{
+	if (ct_probe_from_object(keyobj, keyaddr, biasaddr) < 0)
+		return -1;
+	if (*biasaddr == CT_PROBE_NAN) {
+		PyErr_SetString(PyExc_ValueError, "NaN is not a valid key");
+		return -1;
+	}
+	return 0;
+}
+
+Py_LOCAL_INLINE(int)
+ct_probe_compare(ct_key_t key, int bias, ct_key_t node_key)
+/* KEY_COMPARE() of the lookup key of ct_bound_from_object() */
+{
+	int res = KEY_COMPARE(key, node_key);
+	return (res == 0) ? bias : res;
+}
+
+static int
+ct_key_from_object(PyObject *keyobj, ct_key_t *keyaddr)
+/* convert the Python object keyobj to a tree key for an insert, returns -1
+ * with an exception set if keyobj is not convertible without a change of
+ * its value */
+{
+#if defined(CT_INT64_KEYS)
+	PyObject *index;
+	if (PyLong_CheckExact(keyobj))
+		*keyaddr = PyLong_AsLongLong(keyobj);
+	else {
+		index = PyNumber_Index(keyobj); /* no floats */
+		if (index == NULL)
+			return -1;
+		*keyaddr = PyLong_AsLongLong(index);
+		Py_DECREF(index);
+	}
+	if (*keyaddr == -1 && PyErr_Occurred())
+		return -1;
+#elif defined(CT_FLOAT64_KEYS)
+	PyObject *index;
+	int bias, res;
+
+	if (PyLong_Check(keyobj) || (!PyFloat_Check(keyobj) && PyIndex_Check(keyobj))) {
+		index = PyNumber_Index(keyobj);
+		if (index == NULL)
+			return -1;
+		res = ct_double_from_long(index, keyaddr, &bias);
+		if (res == 0 && bias != CT_PROBE_EQUAL) {
+			PyErr_Format(PyExc_ValueError, "int key %R has no exact float value", index);
+			res = -1;
 		}
-	/* second compare:
-	+1 if key1 > key2
-	 0 if not -> equal
-	-1 means error, if error, it should happen at the first compare
-	*/
-	return PyObject_RichCompareBool(key1, key2, Py_GT);
+		Py_DECREF(index);
+		return res;
+	}
+	*keyaddr = PyFloat_AsDouble(keyobj);
+	if (*keyaddr == -1.0 && PyErr_Occurred())
+		return -1;
+	if (Py_IS_NAN(*keyaddr)) {
+		PyErr_SetString(PyExc_ValueError, "NaN is not a valid key");
+		return -1;
+	}
+#else
+#if defined(CT_BYTES_KEYS)
+	if (!PyBytes_Check(keyobj)) {
+		PyErr_Format(PyExc_TypeError, "key must be bytes, not %.200s",
+					 Py_TYPE(keyobj)->tp_name);
+		return -1;
+	}
+#elif defined(CT_STR_KEYS)
+	if (!PyUnicode_Check(keyobj)) {
+		PyErr_Format(PyExc_TypeError, "key must be str, not %.200s",
+					 Py_TYPE(keyobj)->tp_name);
+		return -1;
+	}
+#elif defined(CT_TUPLE_KEYS)
+	if (!PyTuple_Check(keyobj)) {
+		PyErr_Format(PyExc_TypeError, "key must be tuple, not %.200s",
+					 Py_TYPE(keyobj)->tp_name);
+		return -1;
+	}
+#endif
+	*keyaddr = keyobj;
+#endif
+	return 0;
+}
+
+static int
+ct_target_compare(node_t *node, ct_key_t key, int target, int found)
+/* like KEY_COMPARE(KEY(node), key) for target CT_KEY, else steer to the node
+ * with the smallest or largest key, found is 1 if the target node was passed */
+{
+	if (target == CT_MIN)
+		return (LEFT_NODE(node) == NULL) ? 0 : 1;
+	if (target == CT_MAX)
+		return (RIGHT_NODE(node) == NULL && !found) ? 0 : -1;
+	return KEY_COMPARE(KEY(node), key);
 }
 
 extern node_t *
-ct_find_node(node_t *root, PyObject *key)
+ct_find_node(node_t *root, PyObject *keyobj)
 {
+	ct_key_t key;
+	int bias;
 	int res;
+
+	if (ct_probe_from_object(keyobj, &key, &bias) < 0 || bias != CT_PROBE_EQUAL)
+		return NULL; /* error or no such key */
 	while (root != NULL) {
-		res = ct_compare(key, KEY(root));
+		res = KEY_COMPARE(key, KEY(root));
 		if (res == 0) /* key found */
 			return root;
+		else if (KEY_COMPARE_FAILED(res))
+			return NULL;
 		else {
 			root = LINK(root, (res > 0));
 		}
@@ -114,6 +788,87 @@ ct_find_node(node_t *root, PyObject *key)
 	return NULL; /* key not found */
 }
 
+static void
+ct_finger_set_key(ct_finger_t *finger, ct_key_t key)
+{
+#ifdef CT_OBJECT_KEYS
+	Py_INCREF(key);
+	if (finger->valid)
+		Py_DECREF(finger->key);
+#endif
+	finger->key = key;
+	finger->valid = 1;
+}
+
+extern void
+ct_finger_init(ct_finger_t *finger)
+{
+	finger->valid = 0;
+	finger->depth = 0;
+}
+
+extern void
+ct_finger_clear(ct_finger_t *finger)
+/* release the last key */
+{
+#ifdef CT_OBJECT_KEYS
+	if (finger->valid)
+		Py_DECREF(finger->key);
+#endif
+	ct_finger_init(finger);
+}
+
+extern node_t *
+ct_finger_find(node_t *root, PyObject *keyobj, ct_finger_t *finger)
+/* like ct_find_node(), a key greater than or equal to the last key resumes
+ * the search at the deepest node of the last search path, at which the
+ * search went left and the key is still less than the key of the node, the
+ * search of sorted keys doesn't start at the root for every key */
+{
+	ct_key_t key;
+	int bias;
+	node_t *node = root;
+	int res;
+
+	if (ct_probe_from_object(keyobj, &key, &bias) < 0 || bias != CT_PROBE_EQUAL)
+		return NULL; /* error or no such key */
+	res = finger->valid ? KEY_COMPARE(key, finger->key) : -1;
+	if (KEY_COMPARE_FAILED(res))
+		return NULL;
+	if (res >= 0) {
+		while (finger->depth > 0) {
+			res = KEY_COMPARE(key, KEY(finger->path[finger->depth - 1]));
+			if (KEY_COMPARE_FAILED(res))
+				return NULL;
+			if (res == 0) {
+				ct_finger_set_key(finger, key);
+				return finger->path[finger->depth - 1];
+			}
+			if (res < 0) { /* key is in the left subtree */
+				node = LEFT_NODE(finger->path[finger->depth - 1]);
+				break;
+			}
+			finger->depth--;
+		}
+	}
+	else
+		finger->depth = 0;
+	ct_finger_set_key(finger, key);
+	while (node != NULL) {
+		res = KEY_COMPARE(key, KEY(node));
+		if (res == 0)
+			return node;
+		if (KEY_COMPARE_FAILED(res))
+			return NULL;
+		/* the nodes below CT_FINGER_DEPTH left turns are not stored, the
+		 * search resumes higher up */
+		if (res < 0 && finger->depth < CT_FINGER_DEPTH)
+			finger->path[finger->depth++] = node;
+		node = LINK(node, (res > 0));
+	}
+	return NULL;
+}
+
 extern node_t*
 ct_get_leaf_node(node_t *node)
 {
@@ -128,6 +883,7 @@ ct_get_leaf_node(node_t *node)
     }
 }
 
+#ifdef CT_OBJECT_KEYS
 extern PyObject *
 ct_get_item(node_t *root, PyObject *key)
 {
@@ -143,6 +899,7 @@ ct_get_item(node_t *root, PyObject *key)
 	}
 	Py_RETURN_NONE;
 }
+#endif
 
 extern node_t *
 ct_max_node(node_t *root)
@@ -166,8 +923,72 @@ ct_min_node(node_t *root)
 	return root;
 }
 
-extern int
-ct_bintree_remove(node_t **rootaddr, PyObject *key)
+typedef int (*insert_func_t)(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, PyObject *value,
+							 int replace, node_t **nodeaddr);
+typedef int (*remove_func_t)(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, int target,
+							 ct_key_t *keyaddr, PyObject **valueaddr);
+
+static int
+ct_insert_object(ct_pool_t *pool, node_t **rootaddr, PyObject *keyobj, PyObject *value,
+				 int replace, node_t **nodeaddr, insert_func_t insert)
+/* insert by a Python object as key */
+{
+	ct_key_t key;
+	node_t *node;
+
+	if (ct_key_from_object(keyobj, &key) < 0)
+		return -1;
+	return insert(pool, rootaddr, key, value, replace, (nodeaddr != NULL) ? nodeaddr : &node);
+}
+
+static int
+ct_remove_object(ct_pool_t *pool, node_t **rootaddr, PyObject *keyobj, int target,
+				 PyObject **keyaddr, PyObject **valueaddr, remove_func_t remove)
+/* remove by a Python object as key, stores new references to the removed
+ * key and value in *keyaddr and *valueaddr if keyaddr is not NULL */
+{
+	ct_key_t key = NO_KEY;
+	ct_key_t removed_key;
+	int result, bias;
+
+	if (target == CT_KEY) {
+		if (ct_probe_from_object(keyobj, &key, &bias) < 0)
+			return -1;
+		if (bias != CT_PROBE_EQUAL)
+			return 0; /* no such key */
+	}
+	if (keyaddr == NULL)
+		return remove(pool, rootaddr, key, target, NULL, NULL);
+	result = remove(pool, rootaddr, key, target, &removed_key, valueaddr);
+	if (result > 0) {
+		*keyaddr = ct_new_key_object(removed_key);
+		KEY_DECREF(removed_key); /* the reference moved to *keyaddr */
+		if (*keyaddr == NULL) {
+			Py_XDECREF(*valueaddr);
+			return -1;
+		}
+	}
+	return result;
+}
+
+static void
+ct_bintree_add_size(node_t *node, ct_key_t key, Py_ssize_t delta)
+/* add delta to the size of all nodes on the search path of key, except the
+   node of key itself */
+{
+	int cval;
+	while (node != NULL) {
+		cval = KEY_COMPARE(key, KEY(node));
+		if (cval == 0)
+			return;
+		node->size += delta;
+		node = LINK(node, (cval > 0));
+	}
+}
+
+static int
+ct_bintree_remove_node(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, int target,
+					   ct_key_t *keyaddr, PyObject **valueaddr)
 /* attention: rootaddr is the address of the root pointer */
 {
 	node_t *node, *parent, *replacement;
@@ -181,15 +1002,23 @@ ct_bintree_remove(node_t **rootaddr, PyObject *key)
 	direction = 0;
 
 	while (1) {
-		cmp_res = ct_compare(key, KEY(node));
+		cmp_res = ct_target_compare(node, key, target, 0);
+		if (KEY_COMPARE_FAILED(cmp_res)) {
+			/* restore the sizes of the ancestors of node */
+			ct_bintree_add_size(*rootaddr, KEY(node), +1);
+			return -1;
+		}
+		cmp_res = -cmp_res;
 		if (cmp_res == 0) /* key found, remove node */
 		{
 			if ((LEFT_NODE(node) != NULL) && (RIGHT_NODE(node) != NULL)) {
 				/* find replacement node: smallest key in right-subtree */
+				node->size -= 1;
 				parent = node;
 				direction = RIGHT;
 				replacement = RIGHT_NODE(node);
 				while (LEFT_NODE(replacement) != NULL) {
+					replacement->size -= 1;
 					parent = replacement;
 					direction = LEFT;
 					replacement = LEFT_NODE(replacement);
@@ -209,52 +1038,84 @@ ct_bintree_remove(node_t **rootaddr, PyObject *key)
 					LINK(parent, direction) = LINK(node, down_dir);
 				}
 			}
-			ct_delete_node(node);
+			ct_take_data(node, keyaddr, valueaddr);
+			ct_free_node(pool, node);
 			return 1; /* remove was success full */
 		}
 		else {
+			/* decrement size of ancestors in advance */
+			node->size -= 1;
 			direction = (cmp_res < 0) ? LEFT : RIGHT;
 			parent = node;
 			node = LINK(node, direction);
-			if (node == NULL)
-				return 0; /* error key not found */
+			if (node == NULL) {
+				/* error key not found, restore sizes */
+				ct_bintree_add_size(*rootaddr, key, +1);
+				return 0;
+			}
 		}
 	}
 }
 
 extern int
-ct_bintree_insert(node_t **rootaddr, PyObject *key, PyObject *value)
+ct_bintree_remove(ct_pool_t *pool, node_t **rootaddr, PyObject *key)
+{
+	return ct_remove_object(pool, rootaddr, key, CT_KEY, NULL, NULL, ct_bintree_remove_node);
+}
+
+extern int
+ct_bintree_pop(ct_pool_t *pool, node_t **rootaddr, PyObject *key, int target,
+			   PyObject **keyaddr, PyObject **valueaddr)
+{
+	return ct_remove_object(pool, rootaddr, key, target, keyaddr, valueaddr, ct_bintree_remove_node);
+}
+
+static int
+ct_bintree_insert_node(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, PyObject *value,
+					   int replace, node_t **nodeaddr)
 /* attention: rootaddr is the address of the root pointer */
 {
 	node_t *parent, *node;
 	int direction, cval;
 	node = *rootaddr;
 	if (node == NULL) {
-		node = ct_new_node(key, value, 0); /* new node is also the root */
+		node = ct_new_node(pool, key, value, 0); /* new node is also the root */
 		if (node == NULL)
 			return -1; /* got no memory */
 		*rootaddr = node;
+		*nodeaddr = node;
 	}
 	else {
 		direction = LEFT;
 		parent = NULL;
 		while (1) {
 			if (node == NULL) {
-				node = ct_new_node(key, value, 0);
-				if (node == NULL)
+				node = ct_new_node(pool, key, value, 0);
+				if (node == NULL) {
+					ct_bintree_add_size(*rootaddr, key, -1);
 					return -1; /* get no memory */
+				}
 				LINK(parent, direction) = node;
+				*nodeaddr = node;
 				return 1;
 			}
-			cval = ct_compare(key, KEY(node));
+			cval = KEY_COMPARE(key, KEY(node));
+			if (KEY_COMPARE_FAILED(cval)) {
+				/* restore the sizes of the ancestors of node */
+				ct_bintree_add_size(*rootaddr, KEY(node), -1);
+				return -1;
+			}
 			if (cval == 0) {
 				/* key exists, replace value object */
-				Py_XDECREF(VALUE(node)); /* release old value object */
-				VALUE(node) = value; /* set new value object */
-				Py_INCREF(value); /* take new value object */
+				ct_replace_value(node, value, replace);
+				*nodeaddr = node;
+				/* no new node, restore sizes */
+				ct_bintree_add_size(*rootaddr, key, -1);
 				return 0;
 			}
 			else {
+				/* increment size of ancestors in advance */
+				node->size += 1;
 				parent = node;
 				direction = (cval < 0) ? LEFT : RIGHT;
 				node = LINK(node, direction);
@@ -264,13 +1125,25 @@ ct_bintree_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 	return 1;
 }
 
+extern int
+ct_bintree_insert(ct_pool_t *pool, node_t **rootaddr, PyObject *key, PyObject *value)
+{
+	return ct_insert_object(pool, rootaddr, key, value, 1, NULL, ct_bintree_insert_node);
+}
+
+extern int
+ct_bintree_setdefault(ct_pool_t *pool, node_t **rootaddr, PyObject *key, PyObject *value, node_t **nodeaddr)
+{
+	return ct_insert_object(pool, rootaddr, key, value, 0, nodeaddr, ct_bintree_insert_node);
+}
+
 static int
 is_red (node_t *node)
 {
 	return (node != NULL) && (RED(node) == 1);
 }
 
-#define rb_new_node(key, value) ct_new_node(key, value, 1)
+#define rb_new_node(pool, key, value) ct_new_node(pool, key, value, 1)
 
 static node_t *
 rb_single(node_t *root, int dir)
@@ -279,6 +1152,8 @@ rb_single(node_t *root, int dir)
 
 	root->link[!dir] = save->link[dir];
 	save->link[dir] = root;
+	UPDATE_SIZE(root);
+	UPDATE_SIZE(save);
 
 	RED(root) = 1;
 	RED(save) = 0;
@@ -292,10 +1167,11 @@ rb_double(node_t *root, int dir)
 	return rb_single(root, dir);
 }
 
-#define rb_new_node(key, value) ct_new_node(key, value, 1)
+#define rb_new_node(pool, key, value) ct_new_node(pool, key, value, 1)
 
-extern int
-rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
+static int
+rb_insert_node(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, PyObject *value,
+			   int replace, node_t **nodeaddr)
 {
     int new_node = 0;
 	node_t *root = *rootaddr;
@@ -305,15 +1181,18 @@ rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 		 We have an empty tree; attach the
 		 new node directly to the root
 		 */
-		root = rb_new_node(key, value);
+		root = rb_new_node(pool, key, value);
 		new_node = 1;
 		if (root == NULL)
 			return -1; // got no memory
+		*nodeaddr = root;
 	}
 	else {
 		node_t head; /* False tree root */
 		node_t *g, *t; /* Grandparent & parent */
 		node_t *p, *q; /* Iterator & parent */
+		node_t *path[RB_MAXPATH]; /* visited nodes, to update the subtree sizes */
+		int top = 0;
 		int dir = 0;
 		int last = 0;
 
@@ -330,11 +1209,12 @@ rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 			int cmp_res;
 			if (q == NULL) {
 				/* Insert a new node at the first null link */
-				q = rb_new_node(key, value);
+				q = rb_new_node(pool, key, value);
 				new_node = 1;
 				p->link[dir] = q;
 				if (q == NULL)
 					return -1; /* get no memory */
+				*nodeaddr = q;
 			}
 			else if (is_red(q->link[0]) && is_red(q->link[1])) {
 				/* Simple red violation: color flip */
@@ -342,6 +1222,7 @@ rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 				RED(q->link[0]) = 0;
 				RED(q->link[1]) = 0;
 			}
+			path[top++] = q;
 
 			if (is_red(q) && is_red(p)) {
 				/* Hard red violation: rotations necessary */
@@ -357,11 +1238,15 @@ rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 			if (new_node)
 				break;
 
-			cmp_res = ct_compare(KEY(q), key);
+			cmp_res = KEY_COMPARE(KEY(q), key);
+			if (KEY_COMPARE_FAILED(cmp_res)) {
+				/* the color flips and rotations keep a valid tree */
+				new_node = -1;
+				break;
+			}
 			if (cmp_res == 0) {       /* if key exists            */
-				Py_XDECREF(VALUE(q)); /* release old value object */
-				VALUE(q) = value;     /* set new value object     */
-				Py_INCREF(value);     /* take new value object    */
+				ct_replace_value(q, value, replace);
+				*nodeaddr = q;
 				break;
 			}
 			last = dir;
@@ -375,6 +1260,12 @@ rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 			p = q;
 			q = q->link[dir];
 		}
+		/* Update subtree sizes bottom up, the order of the path is still
+		   valid after rotations, and rotations update the sizes of nodes
+		   which left the path */
+		if (new_node > 0)
+			while (--top >= 0)
+				UPDATE_SIZE(path[top]);
 		/* Update the root (it may be different) */
 		root = head.link[1];
 	}
@@ -386,14 +1277,30 @@ rb_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 }
 
 extern int
-rb_remove(node_t **rootaddr, PyObject *key)
+rb_insert(ct_pool_t *pool, node_t **rootaddr, PyObject *key, PyObject *value)
+{
+	return ct_insert_object(pool, rootaddr, key, value, 1, NULL, rb_insert_node);
+}
+
+extern int
+rb_setdefault(ct_pool_t *pool, node_t **rootaddr, PyObject *key, PyObject *value, node_t **nodeaddr)
+{
+	return ct_insert_object(pool, rootaddr, key, value, 0, nodeaddr, rb_insert_node);
+}
+
+static int
+rb_remove_node(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, int target,
+			   ct_key_t *keyaddr, PyObject **valueaddr)
 {
 	node_t *root = *rootaddr;
 
 	node_t head = { { NULL } }; /* False tree root */
 	node_t *q, *p, *g; /* Helpers */
 	node_t *f = NULL; /* Found item */
+	node_t *path[RB_MAXPATH]; /* visited nodes, to update the subtree sizes */
+	int top = 0;
 	int dir = 1;
+	int failed = 0;
 
 	if (root == NULL)
 		return 0;
@@ -414,8 +1321,15 @@ rb_remove(node_t **rootaddr, PyObject *key)
 		/* Move the helpers down */
 		g = p, p = q;
 		q = q->link[dir];
+		path[top++] = q;
 
-		cmp_res =  ct_compare(KEY(q), key);
+		cmp_res = ct_target_compare(q, key, target, f != NULL);
+		if (KEY_COMPARE_FAILED(cmp_res)) {
+			/* the red pushes so far keep a valid tree, remove nothing */
+			f = NULL;
+			failed = 1;
+			break;
+		}
 
 		dir = cmp_res < 0;
 
@@ -428,8 +1342,12 @@ rb_remove(node_t **rootaddr, PyObject *key)
 
 		/* Push the red node down with rotations and color flips */
 		if (!is_red(q) && !is_red(q->link[dir])) {
-			if (is_red(q->link[!dir]))
+			if (is_red(q->link[!dir])) {
 				p = p->link[last] = rb_single(q, dir);
+				/* p moved in between old p and q */
+				path[top - 1] = p;
+				path[top++] = q;
+			}
 			else if (!is_red(q->link[!dir])) {
 				node_t *s = p->link[!last];
 
@@ -453,6 +1371,12 @@ rb_remove(node_t **rootaddr, PyObject *key)
 						RED(q) = RED(g->link[dir2]) = 1;
 						RED(g->link[dir2]->link[0]) = 0;
 						RED(g->link[dir2]->link[1]) = 0;
+
+						/* g->link[dir2] moved in between g and p */
+						path[top] = q;
+						path[top - 1] = p;
+						path[top - 2] = g->link[dir2];
+						top++;
 					}
 				}
 			}
@@ -463,7 +1387,12 @@ rb_remove(node_t **rootaddr, PyObject *key)
 	if (f != NULL) {
 		ct_swap_data(f, q);
 		p->link[p->link[1] == q] = q->link[q->link[0] == NULL];
-		ct_delete_node(q);
+		ct_take_data(q, keyaddr, valueaddr);
+		ct_free_node(pool, q);
+		/* Update subtree sizes bottom up, path[top - 1] is the removed node q */
+		top--;
+		while (--top >= 0)
+			UPDATE_SIZE(path[top]);
 	}
 
 	/* Update the root (it may be different) */
@@ -473,10 +1402,23 @@ rb_remove(node_t **rootaddr, PyObject *key)
 	if (root != NULL)
 		RED(root) = 0;
 	*rootaddr = root;
-	return (f != NULL);
+	return failed ? -1 : (f != NULL);
+}
+
+extern int
+rb_remove(ct_pool_t *pool, node_t **rootaddr, PyObject *key)
+{
+	return ct_remove_object(pool, rootaddr, key, CT_KEY, NULL, NULL, rb_remove_node);
 }
 
-#define avl_new_node(key, value) ct_new_node(key, value, 0)
+extern int
+rb_pop(ct_pool_t *pool, node_t **rootaddr, PyObject *key, int target,
+	   PyObject **keyaddr, PyObject **valueaddr)
+{
+	return ct_remove_object(pool, rootaddr, key, target, keyaddr, valueaddr, rb_remove_node);
+}
+
+#define avl_new_node(pool, key, value) ct_new_node(pool, key, value, 0)
 #define height(p) ((p) == NULL ? -1 : (p)->xdata)
 #define avl_max(a, b) ((a) > (b) ? (a) : (b))
 
@@ -498,6 +1440,9 @@ avl_single(node_t *root, int dir)
 	BALANCE(root) = avl_max(rlh, rrh) + 1;
 	BALANCE(save) = avl_max(slh, BALANCE(root)) + 1;
 
+	UPDATE_SIZE(root);
+	UPDATE_SIZE(save);
+
 	return save;
 }
 
@@ -508,19 +1453,21 @@ avl_double(node_t *root, int dir)
 	return avl_single(root, dir);
 }
 
-extern int
-avl_insert(node_t **rootaddr, PyObject *key, PyObject *value)
+static int
+avl_insert_node(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, PyObject *value,
+				int replace, node_t **nodeaddr)
 {
 	node_t *root = *rootaddr;
 
 	if (root == NULL) {
-		root = avl_new_node(key, value);
+		root = avl_new_node(pool, key, value);
 		if (root == NULL)
 			return -1; /* got no memory */
+		*nodeaddr = root;
 	}
 	else {
-		node_t *it, *up[32];
-		int upd[32], top = 0;
+		node_t *it, *up[AVL_MAXPATH];
+		int upd[AVL_MAXPATH], top = 0;
 		int done = 0;
 		int cmp_res;
 
@@ -528,11 +1475,12 @@ avl_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 		/* Search for an empty link, save the path */
 		for (;;) {
 			/* Push direction and node onto stack */
-			cmp_res = ct_compare(KEY(it), key);
+			cmp_res = KEY_COMPARE(KEY(it), key);
+			if (KEY_COMPARE_FAILED(cmp_res))
+				return -1;
 			if (cmp_res == 0) {
-				Py_XDECREF(VALUE(it)); /* release old value object */
-				VALUE(it) = value; /* set new value object */
-				Py_INCREF(value); /* take new value object */
+				ct_replace_value(it, value, replace);
+				*nodeaddr = it;
 				return 0;
 			}
 			/* upd[top] = it->data < data; */
@@ -545,17 +1493,15 @@ avl_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 		}
 
 		/* Insert a new node at the bottom of the tree */
-		it->link[upd[top - 1]] = avl_new_node(key, value);
+		it->link[upd[top - 1]] = avl_new_node(pool, key, value);
 		if (it->link[upd[top - 1]] == NULL)
 			return -1; // got no memory
+		*nodeaddr = it->link[upd[top - 1]];
 
 		/* Walk back up the search path */
 		while (--top >= 0 && !done) {
-			// int dir = (cmp_res < 0);
 			int lh, rh, max;
 
-			cmp_res = ct_compare(KEY(up[top]), key);
-
 			lh = height(up[top]->link[upd[top]]);
 			rh = height(up[top]->link[!upd[top]]);
 
@@ -583,28 +1529,49 @@ avl_insert(node_t **rootaddr, PyObject *key, PyObject *value)
 			rh = height(up[top]->link[!upd[top]]);
 			max = avl_max(lh, rh);
 			BALANCE(up[top]) = max + 1;
+			UPDATE_SIZE(up[top]);
 		}
+		/* Update subtree sizes of the remaining path */
+		for (; top >= 0; top--)
+			up[top]->size += 1;
 	}
 	(*rootaddr) = root;
 	return 1;
 }
 
 extern int
-avl_remove(node_t **rootaddr, PyObject *key)
+avl_insert(ct_pool_t *pool, node_t **rootaddr, PyObject *key, PyObject *value)
+{
+	return ct_insert_object(pool, rootaddr, key, value, 1, NULL, avl_insert_node);
+}
+
+extern int
+avl_setdefault(ct_pool_t *pool, node_t **rootaddr, PyObject *key, PyObject *value, node_t **nodeaddr)
+{
+	return ct_insert_object(pool, rootaddr, key, value, 0, nodeaddr, avl_insert_node);
+}
+
+static int
+avl_remove_node(ct_pool_t *pool, node_t **rootaddr, ct_key_t key, int target,
+				ct_key_t *keyaddr, PyObject **valueaddr)
 {
 	node_t *root = *rootaddr;
 	int cmp_res;
 
-	if (root != NULL) {
-		node_t *it, *up[32];
-		int upd[32], top = 0;
+	if (root == NULL)
+		return 0;
+	else {
+		node_t *it, *up[AVL_MAXPATH];
+		int upd[AVL_MAXPATH], top = 0;
 
 		it = root;
 		for (;;) {
 			/* Terminate if not found */
 			if (it == NULL)
 				return 0;
-			cmp_res = ct_compare(KEY(it), key);
+			cmp_res = ct_target_compare(it, key, target, 0);
+			if (KEY_COMPARE_FAILED(cmp_res))
+				return -1;
 			if (cmp_res == 0)
 				break;
 
@@ -626,7 +1593,8 @@ avl_remove(node_t **rootaddr, PyObject *key)
 			else
 				root = it->link[dir];
 
-			ct_delete_node(it);
+			ct_take_data(it, keyaddr, valueaddr);
+			ct_free_node(pool, it);
 		}
 		else {
 			/* Find the inorder successor */
@@ -645,7 +1613,8 @@ avl_remove(node_t **rootaddr, PyObject *key)
 			ct_swap_data(it, heir);
 			/* Unlink successor and fix parent */
 			up[top - 1]->link[up[top - 1] == it] = heir->link[1];
-			ct_delete_node(heir);
+			ct_take_data(heir, keyaddr, valueaddr);
+			ct_free_node(pool, heir);
 		}
 
 		/* Walk back up the search path */
@@ -656,6 +1625,7 @@ avl_remove(node_t **rootaddr, PyObject *key)
 
 			/* Update balance factors */
 			BALANCE(up[top]) = max + 1;
+			UPDATE_SIZE(up[top]);
 
 			/* Terminate or rebalance as necessary */
 			if (lh - rh == -1)
@@ -676,25 +1646,47 @@ avl_remove(node_t **rootaddr, PyObject *key)
 					root = up[0];
 			}
 		}
+		/* Update subtree sizes of the remaining path */
+		while (--top >= 0)
+			up[top]->size -= 1;
 	}
 	(*rootaddr) = root;
 	return 1;
 }
 
+extern int
+avl_remove(ct_pool_t *pool, node_t **rootaddr, PyObject *key)
+{
+	return ct_remove_object(pool, rootaddr, key, CT_KEY, NULL, NULL, avl_remove_node);
+}
+
+extern int
+avl_pop(ct_pool_t *pool, node_t **rootaddr, PyObject *key, int target,
+		PyObject **keyaddr, PyObject **valueaddr)
+{
+	return ct_remove_object(pool, rootaddr, key, target, keyaddr, valueaddr, avl_remove_node);
+}
+
 extern node_t *
-ct_succ_node(node_t *root, PyObject *key)
+ct_succ_node(node_t *root, PyObject *keyobj)
 {
+	ct_key_t key;
+	int bias;
 	node_t *succ = NULL;
 	node_t *node = root;
 	int cval;
 
+	if (ct_probe_from_object(keyobj, &key, &bias) < 0 || bias != CT_PROBE_EQUAL)
+		return NULL; /* error or no such key */
 	while (node != NULL) {
-		cval = ct_compare(key, KEY(node));
+		cval = KEY_COMPARE(key, KEY(node));
+		if (KEY_COMPARE_FAILED(cval))
+			return NULL;
 		if (cval == 0)
 			break;
 		else if (cval < 0) {
 			if ((succ == NULL) ||
-				(ct_compare(KEY(node), KEY(succ)) < 0))
+				(KEY_COMPARE(KEY(node), KEY(succ)) < 0))
 				succ = node;
 			node = LEFT_NODE(node);
 		} else
@@ -710,27 +1702,33 @@ ct_succ_node(node_t *root, PyObject *key)
 			node = LEFT_NODE(node);
 		if (succ == NULL)
 			succ = node;
-		else if (ct_compare(KEY(node), KEY(succ)) < 0)
+		else if (KEY_COMPARE(KEY(node), KEY(succ)) < 0)
 			succ = node;
 	}
 	return succ;
 }
 
 extern node_t *
-ct_prev_node(node_t *root, PyObject *key)
+ct_prev_node(node_t *root, PyObject *keyobj)
 {
+	ct_key_t key;
+	int bias;
 	node_t *prev = NULL;
 	node_t *node = root;
 	int cval;
 
+	if (ct_probe_from_object(keyobj, &key, &bias) < 0 || bias != CT_PROBE_EQUAL)
+		return NULL; /* error or no such key */
 	while (node != NULL) {
-		cval = ct_compare(key, KEY(node));
+		cval = KEY_COMPARE(key, KEY(node));
+		if (KEY_COMPARE_FAILED(cval))
+			return NULL;
 		if (cval == 0)
 			break;
 		else if (cval < 0)
 			node = LEFT_NODE(node);
 		else {
-			if ((prev == NULL) || (ct_compare(KEY(node), KEY(prev)) > 0))
+			if ((prev == NULL) || (KEY_COMPARE(KEY(node), KEY(prev)) > 0))
 				prev = node;
 			node = RIGHT_NODE(node);
 		}
@@ -745,27 +1743,32 @@ ct_prev_node(node_t *root, PyObject *key)
 			node = RIGHT_NODE(node);
 		if (prev == NULL)
 			prev = node;
-		else if (ct_compare(KEY(node), KEY(prev)) > 0)
+		else if (KEY_COMPARE(KEY(node), KEY(prev)) > 0)
 			prev = node;
 	}
 	return prev;
 }
 
 extern node_t *
-ct_floor_node(node_t *root, PyObject *key)
+ct_floor_node(node_t *root, PyObject *keyobj)
 {
+	ct_key_t key;
 	node_t *prev = NULL;
 	node_t *node = root;
-	int cval;
+	int cval, bias;
 
+	if (ct_bound_from_object(keyobj, &key, &bias) < 0)
+		return NULL;
 	while (node != NULL) {
-		cval = ct_compare(key, KEY(node));
+		cval = ct_probe_compare(key, bias, KEY(node));
+		if (KEY_COMPARE_FAILED(cval))
+			return NULL;
 		if (cval == 0)
 			return node;
 		else if (cval < 0)
 			node = LEFT_NODE(node);
 		else {
-			if ((prev == NULL) || (ct_compare(KEY(node), KEY(prev)) > 0))
+			if ((prev == NULL) || (KEY_COMPARE(KEY(node), KEY(prev)) > 0))
 				prev = node;
 			node = RIGHT_NODE(node);
 		}
@@ -774,19 +1777,24 @@ ct_floor_node(node_t *root, PyObject *key)
 }
 
 extern node_t *
-ct_ceiling_node(node_t *root, PyObject *key)
+ct_ceiling_node(node_t *root, PyObject *keyobj)
 {
+	ct_key_t key;
 	node_t *succ = NULL;
 	node_t *node = root;
-	int cval;
+	int cval, bias;
 
+	if (ct_bound_from_object(keyobj, &key, &bias) < 0)
+		return NULL;
 	while (node != NULL) {
-		cval = ct_compare(key, KEY(node));
+		cval = ct_probe_compare(key, bias, KEY(node));
+		if (KEY_COMPARE_FAILED(cval))
+			return NULL;
 		if (cval == 0)
 			return node;
 		else if (cval < 0) {
 			if ((succ == NULL) ||
-				(ct_compare(KEY(node), KEY(succ)) < 0))
+				(KEY_COMPARE(KEY(node), KEY(succ)) < 0))
 				succ = node;
 			node = LEFT_NODE(node);
 		} else
@@ -794,3 +1802,520 @@ ct_ceiling_node(node_t *root, PyObject *key)
 	}
 	return succ;
 }
+
+extern Py_ssize_t
+ct_index_of(node_t *root, PyObject *keyobj)
+/* get index of key in ascending key order, -1 if key does not exist, -2
+ * with an exception set if the key is not convertible or comparable */
+{
+	ct_key_t key;
+	Py_ssize_t index = 0;
+	int cval, bias;
+
+	if (ct_probe_from_object(keyobj, &key, &bias) < 0)
+		return -2;
+	if (bias != CT_PROBE_EQUAL)
+		return -1;
+	while (root != NULL) {
+		cval = KEY_COMPARE(key, KEY(root));
+		if (KEY_COMPARE_FAILED(cval))
+			return -2;
+		if (cval == 0)
+			return index + SIZE(LEFT_NODE(root));
+		else if (cval > 0) {
+			index += SIZE(LEFT_NODE(root)) + 1;
+			root = RIGHT_NODE(root);
+		} else
+			root = LEFT_NODE(root);
+	}
+	return -1;
+}
+
+extern Py_ssize_t
+ct_bisect(node_t *root, PyObject *keyobj, int right)
+/* get count of keys less than key, or less than or equal to key if right is
+ * 1, -1 with an exception set if the key is not convertible or comparable */
+{
+	ct_key_t key;
+	Py_ssize_t index = 0;
+	int cval, bias;
+
+	if (ct_bound_from_object(keyobj, &key, &bias) < 0)
+		return -1;
+	while (root != NULL) {
+		cval = ct_probe_compare(key, bias, KEY(root));
+		if (KEY_COMPARE_FAILED(cval))
+			return -1;
+		if (cval == 0)
+			return index + SIZE(LEFT_NODE(root)) + right;
+		else if (cval > 0) {
+			index += SIZE(LEFT_NODE(root)) + 1;
+			root = RIGHT_NODE(root);
+		} else
+			root = LEFT_NODE(root);
+	}
+	return index;
+}
+
+extern node_t *
+ct_node_at(node_t *root, Py_ssize_t index)
+/* get node at index in ascending key order, NULL if index is out of range */
+{
+	Py_ssize_t left_size;
+
+	while (root != NULL) {
+		left_size = SIZE(LEFT_NODE(root));
+		if (index == left_size)
+			return root;
+		else if (index < left_size)
+			root = LEFT_NODE(root);
+		else {
+			index -= left_size + 1;
+			root = RIGHT_NODE(root);
+		}
+	}
+	return NULL;
+}
+
+#define BUILD_BINARY 0
+#define BUILD_AVL 1
+#define BUILD_RB 2
+
+static int
+ct_build_subtree(ct_pool_t *pool, node_t **nodeaddr, PyObject *items, Py_ssize_t lo,
+				 Py_ssize_t hi, int depth, int red_depth, int mode)
+/* build a balanced subtree of the (key, value) tuples items[lo:hi] in
+ * *nodeaddr, returns 0 on error */
+{
+	Py_ssize_t mid;
+	node_t *node;
+	PyObject *item;
+	ct_key_t key;
+
+	if (lo >= hi)
+		return 1;
+	mid = lo + (hi - lo) / 2;
+	item = PyList_GET_ITEM(items, mid);
+	if (ct_key_from_object(PyTuple_GET_ITEM(item, 0), &key) < 0)
+		return 0;
+	node = ct_new_node(pool, key, PyTuple_GET_ITEM(item, 1), 0);
+	if (node == NULL)
+		return 0;
+	if (PyTuple_GET_SIZE(item) > 2) /* (sort key, value, key) of a key function */
+		ct_set_orig_key(node, PyTuple_GET_ITEM(item, 2));
+	*nodeaddr = node;
+	node->size = hi - lo;
+	if (!ct_build_subtree(pool, &LEFT_NODE(node), items, lo, mid, depth + 1, red_depth, mode) ||
+		!ct_build_subtree(pool, &RIGHT_NODE(node), items, mid + 1, hi, depth + 1, red_depth, mode))
+		return 0;
+	if (mode == BUILD_AVL)
+		BALANCE(node) = avl_max(height(LEFT_NODE(node)), height(RIGHT_NODE(node))) + 1;
+	else if (mode == BUILD_RB)
+		/* only nodes of the incomplete lowest level are red */
+		RED(node) = (depth == red_depth);
+	return 1;
+}
+
+static int
+ct_check_items(PyObject *items)
+/* check that items contains only (key, value) or (sort key, value, key)
+ * tuples, returns -1 with an exception set on error */
+{
+	Py_ssize_t index, size;
+	PyObject *item;
+
+	for (index = 0; index < PyList_GET_SIZE(items); index++) {
+		item = PyList_GET_ITEM(items, index);
+		if (!PyTuple_Check(item) || (size = PyTuple_GET_SIZE(item)) < 2 || size > 3) {
+			PyErr_SetString(PyExc_TypeError, "items have to be (key, value) tuples");
+			return -1;
+		}
+	}
+	return 0;
+}
+
+#ifdef CT_TYPED_KEYS
+static int
+ct_check_key_order(PyObject *items)
+/* check the type and order of the converted keys, different Python keys can
+ * convert to the same C key, returns -1 with an exception set on error */
+{
+	Py_ssize_t index;
+	ct_key_t key, prev_key = NO_KEY;
+	int res;
+
+	for (index = 0; index < PyList_GET_SIZE(items); index++) {
+		if (ct_key_from_object(PyTuple_GET_ITEM(PyList_GET_ITEM(items, index), 0), &key) < 0)
+			return -1;
+		res = (index > 0) ? KEY_COMPARE(prev_key, key) : -1;
+		if (KEY_COMPARE_FAILED(res))
+			return -1;
+		if (res >= 0) {
+			PyErr_SetString(PyExc_ValueError, "keys are not in strictly ascending order");
+			return -1;
+		}
+		prev_key = key;
+	}
+	return 0;
+}
+#endif
+
+static int
+ct_build_tree(ct_pool_t *pool, node_t **rootaddr, PyObject *items, int mode)
+/* replace the empty tree *rootaddr by a balanced tree of the list items,
+ * which contains (key, value) tuples in ascending key order, the list must
+ * not change during the build, returns -1 on error else 1 */
+{
+	Py_ssize_t count = PyList_GET_SIZE(items);
+	int red_depth = 0;
+
+	if (ct_check_items(items) < 0)
+		return -1;
+#ifdef CT_TYPED_KEYS
+	if (ct_check_key_order(items) < 0)
+		return -1;
+#endif
+	/* red_depth = floor(log2(count + 1)), depth of the incomplete lowest level */
+	while (((Py_ssize_t)2 << red_depth) <= count + 1)
+		red_depth++;
+	*rootaddr = NULL;
+	if (ct_pool_reserve(pool, count) < 0)
+		return -1;
+	if (!ct_build_subtree(pool, rootaddr, items, 0, count, 0, red_depth, mode)) {
+		ct_delete_tree(pool, *rootaddr);
+		*rootaddr = NULL;
+		return -1;
+	}
+	return 1;
+}
+
+extern int
+ct_bintree_build(ct_pool_t *pool, node_t **rootaddr, PyObject *items)
+{
+	return ct_build_tree(pool, rootaddr, items, BUILD_BINARY);
+}
+
+extern int
+avl_build(ct_pool_t *pool, node_t **rootaddr, PyObject *items)
+{
+	return ct_build_tree(pool, rootaddr, items, BUILD_AVL);
+}
+
+extern int
+rb_build(ct_pool_t *pool, node_t **rootaddr, PyObject *items)
+{
+	return ct_build_tree(pool, rootaddr, items, BUILD_RB);
+}
+
+/* split and join functions */
+
+typedef node_t *(*join_func_t)(node_t *left, node_t *mid, node_t *right);
+
+static int
+ct_join_trees(ct_pool_t *pool, node_t **leftaddr, node_t **rightaddr, join_func_t join,
+			  remove_func_t remove)
+/* move all nodes of the right tree into the left tree, all keys of the right
+ * tree have to be greater than the keys of the left tree, the smallest node
+ * of the right tree is the connecting node,
+ * returns -1 if out of memory else 1 */
+{
+	node_t *min_node, *mid;
+
+	if (*rightaddr == NULL)
+		return 1;
+	if (*leftaddr == NULL) {
+		*leftaddr = *rightaddr;
+		*rightaddr = NULL;
+		return 1;
+	}
+	min_node = ct_min_node(*rightaddr);
+	mid = ct_new_node(pool, KEY(min_node), VALUE(min_node), 0);
+	if (mid == NULL)
+		return -1;
+#if CT_KEY_FUNCTIONS
+	ct_set_orig_key(mid, ORIG_KEY(min_node));
+#endif
+	remove(pool, rightaddr, NO_KEY, CT_MIN, NULL, NULL);
+	*leftaddr = join(*leftaddr, mid, *rightaddr);
+	*rightaddr = NULL;
+	return 1;
+}
+
+static node_t *
+ct_bintree_join_nodes(node_t *left, node_t *mid, node_t *right)
+{
+	LEFT_NODE(mid) = left;
+	RIGHT_NODE(mid) = right;
+	UPDATE_SIZE(mid);
+	return mid;
+}
+
+extern int
+ct_bintree_join(ct_pool_t *pool, node_t **leftaddr, node_t **rightaddr)
+{
+	return ct_join_trees(pool, leftaddr, rightaddr, ct_bintree_join_nodes, ct_bintree_remove_node);
+}
+
+static void
+ct_update_spine_sizes(node_t *node, int dir)
+/* update the sizes of the nodes linked by link[dir], only the subtrees of
+ * the other links are unchanged */
+{
+	node_t *spine;
+	Py_ssize_t total = 0;
+
+	for (spine = node; spine != NULL; spine = LINK(spine, dir))
+		total += SIZE(LINK(spine, !dir)) + 1;
+	for (spine = node; spine != NULL; spine = LINK(spine, dir)) {
+		spine->size = total;
+		total -= SIZE(LINK(spine, !dir)) + 1;
+	}
+}
+
+extern void
+ct_bintree_split(node_t *root, Py_ssize_t index, node_t **leftaddr, node_t **rightaddr)
+/* split tree into the first index nodes in key order and the other nodes,
+ * O(h), non recursive because the height of an unbalanced tree is unbounded,
+ * the split by node sizes compares no keys and can not fail */
+{
+	node_t *left_tail = NULL; /* append to link[RIGHT] */
+	node_t *right_tail = NULL; /* append to link[LEFT] */
+
+	*leftaddr = NULL;
+	*rightaddr = NULL;
+	while (root != NULL) {
+		if (SIZE(LEFT_NODE(root)) < index) {
+			index -= SIZE(LEFT_NODE(root)) + 1;
+			if (left_tail == NULL)
+				*leftaddr = root;
+			else
+				RIGHT_NODE(left_tail) = root;
+			left_tail = root;
+			root = RIGHT_NODE(root);
+		} else {
+			if (right_tail == NULL)
+				*rightaddr = root;
+			else
+				LEFT_NODE(right_tail) = root;
+			right_tail = root;
+			root = LEFT_NODE(root);
+		}
+	}
+	if (left_tail != NULL)
+		RIGHT_NODE(left_tail) = NULL;
+	if (right_tail != NULL)
+		LEFT_NODE(right_tail) = NULL;
+	ct_update_spine_sizes(*leftaddr, RIGHT);
+	ct_update_spine_sizes(*rightaddr, LEFT);
+}
+
+static node_t *
+ct_rotate(node_t *root, int dir)
+/* rotate in direction dir without changing colors or balance data */
+{
+	node_t *save = LINK(root, !dir);
+
+	LINK(root, !dir) = LINK(save, dir);
+	LINK(save, dir) = root;
+	UPDATE_SIZE(root);
+	UPDATE_SIZE(save);
+	return save;
+}
+
+static int
+rb_black_height(node_t *node)
+{
+	int black_height = 0;
+
+	while (node != NULL) {
+		if (!RED(node))
+			black_height++;
+		node = LEFT_NODE(node);
+	}
+	return black_height;
+}
+
+static node_t *
+rb_join_dir(node_t *big, int big_bh, node_t *mid, node_t *small, int small_bh, int dir)
+/* join the tree big with the tree small of lower black height at side dir,
+ * the root of small is black */
+{
+	node_t *child;
+
+	if (big_bh == small_bh && !is_red(big)) {
+		LINK(mid, !dir) = big;
+		LINK(mid, dir) = small;
+		RED(mid) = 1;
+		UPDATE_SIZE(mid);
+		return mid;
+	}
+	child = rb_join_dir(LINK(big, dir), big_bh - !RED(big), mid, small, small_bh, dir);
+	LINK(big, dir) = child;
+	UPDATE_SIZE(big);
+	if (!RED(big) && is_red(child) && is_red(LINK(child, dir))) {
+		/* fix red violation */
+		RED(LINK(child, dir)) = 0;
+		return ct_rotate(big, !dir);
+	}
+	return big;
+}
+
+static node_t *
+rb_join_bh(node_t *left, int left_bh, node_t *mid, node_t *right, int right_bh, int *bh)
+/* join left, mid and right, stores the black height of the result in *bh */
+{
+	node_t *root;
+
+	if (is_red(left)) {
+		RED(left) = 0;
+		left_bh++;
+	}
+	if (is_red(right)) {
+		RED(right) = 0;
+		right_bh++;
+	}
+	if (left_bh > right_bh) {
+		root = rb_join_dir(left, left_bh, mid, right, right_bh, RIGHT);
+		*bh = left_bh;
+	} else if (right_bh > left_bh) {
+		root = rb_join_dir(right, right_bh, mid, left, left_bh, LEFT);
+		*bh = right_bh;
+	} else {
+		LEFT_NODE(mid) = left;
+		RIGHT_NODE(mid) = right;
+		UPDATE_SIZE(mid);
+		root = mid;
+		RED(root) = 0;
+		*bh = left_bh + 1;
+	}
+	if (RED(root)) {
+		RED(root) = 0;
+		*bh += 1;
+	}
+	return root;
+}
+
+static node_t *
+rb_join_nodes(node_t *left, node_t *mid, node_t *right)
+{
+	int bh;
+
+	return rb_join_bh(left, rb_black_height(left), mid, right, rb_black_height(right), &bh);
+}
+
+extern int
+rb_join(ct_pool_t *pool, node_t **leftaddr, node_t **rightaddr)
+{
+	return ct_join_trees(pool, leftaddr, rightaddr, rb_join_nodes, rb_remove_node);
+}
+
+static void
+rb_split_bh(node_t *root, int bh, Py_ssize_t index, node_t **leftaddr,
+			int *left_bh, node_t **rightaddr, int *right_bh)
+/* split the tree root of black height bh into the first index nodes and the
+ * other nodes */
+{
+	node_t *left, *right;
+	int child_bh;
+
+	if (root == NULL) {
+		*leftaddr = *rightaddr = NULL;
+		*left_bh = *right_bh = 0;
+		return;
+	}
+	child_bh = bh - !RED(root);
+	left = LEFT_NODE(root);
+	right = RIGHT_NODE(root);
+	if (SIZE(left) < index) {
+		rb_split_bh(right, child_bh, index - SIZE(left) - 1, leftaddr, left_bh, rightaddr, right_bh);
+		*leftaddr = rb_join_bh(left, child_bh, root, *leftaddr, *left_bh, left_bh);
+	} else {
+		rb_split_bh(left, child_bh, index, leftaddr, left_bh, rightaddr, right_bh);
+		*rightaddr = rb_join_bh(*rightaddr, *right_bh, root, right, child_bh, right_bh);
+	}
+}
+
+extern void
+rb_split(node_t *root, Py_ssize_t index, node_t **leftaddr, node_t **rightaddr)
+{
+	int left_bh, right_bh;
+
+	rb_split_bh(root, rb_black_height(root), index, leftaddr, &left_bh, rightaddr, &right_bh);
+}
+
+static void
+avl_update(node_t *node)
+{
+	BALANCE(node) = avl_max(height(LEFT_NODE(node)), height(RIGHT_NODE(node))) + 1;
+	UPDATE_SIZE(node);
+}
+
+static node_t *
+avl_join_dir(node_t *big, node_t *mid, node_t *small, int dir)
+/* join the tree big with the lower tree small at side dir */
+{
+	node_t *child = LINK(big, dir);
+
+	if (height(child) <= height(small) + 1) {
+		LINK(mid, !dir) = child;
+		LINK(mid, dir) = small;
+		avl_update(mid);
+		if (height(mid) > height(LINK(big, !dir)) + 1)
+			mid = avl_single(mid, dir);
+		LINK(big, dir) = mid;
+	} else
+		LINK(big, dir) = avl_join_dir(child, mid, small, dir);
+	avl_update(big);
+	if (height(LINK(big, dir)) > height(LINK(big, !dir)) + 1)
+		return avl_single(big, !dir);
+	return big;
+}
+
+static node_t *
+avl_join_nodes(node_t *left, node_t *mid, node_t *right)
+{
+	int left_height = height(left);
+	int right_height = height(right);
+
+	if (left_height > right_height + 1)
+		return avl_join_dir(left, mid, right, RIGHT);
+	if (right_height > left_height + 1)
+		return avl_join_dir(right, mid, left, LEFT);
+	LEFT_NODE(mid) = left;
+	RIGHT_NODE(mid) = right;
+	avl_update(mid);
+	return mid;
+}
+
+extern int
+avl_join(ct_pool_t *pool, node_t **leftaddr, node_t **rightaddr)
+{
+	return ct_join_trees(pool, leftaddr, rightaddr, avl_join_nodes, avl_remove_node);
+}
+
+static void
+avl_split_nodes(node_t *root, Py_ssize_t index, node_t **leftaddr, node_t **rightaddr)
+/* split the tree root into the first index nodes and the other nodes */
+{
+	node_t *left, *right;
+
+	if (root == NULL) {
+		*leftaddr = *rightaddr = NULL;
+		return;
+	}
+	left = LEFT_NODE(root);
+	right = RIGHT_NODE(root);
+	if (SIZE(left) < index) {
+		avl_split_nodes(right, index - SIZE(left) - 1, leftaddr, rightaddr);
+		*leftaddr = avl_join_nodes(left, root, *leftaddr);
+	} else {
+		avl_split_nodes(left, index, leftaddr, rightaddr);
+		*rightaddr = avl_join_nodes(*rightaddr, root, right);
+	}
+}
+
+extern void
+avl_split(node_t *root, Py_ssize_t index, node_t **leftaddr, node_t **rightaddr)
+{
+	avl_split_nodes(root, index, leftaddr, rightaddr);
+}
@@ -11,22 +11,225 @@
 
 #include <Python.h>
 
+/* Key type of the tree nodes, Python objects by default. setup.py builds
+ * the extensions of the typed trees with CT_INT64_KEYS or CT_FLOAT64_KEYS
+ * defined, these trees store the keys as C values in the nodes and the
+ * exported functions get a prefix to keep the symbols of the extensions
+ * apart. The trees built with CT_BYTES_KEYS, CT_STR_KEYS or CT_TUPLE_KEYS
+ * store Python objects, but accept only bytes, str or tuple keys and compare
+ * them in C. */
+#if defined(CT_INT64_KEYS)
+typedef int64_t ct_key_t;
+#define CT_SYMBOL(name) int64_##name
+#elif defined(CT_FLOAT64_KEYS)
+typedef double ct_key_t;
+#define CT_SYMBOL(name) float64_##name
+#elif defined(CT_BYTES_KEYS)
+#define CT_OBJECT_KEYS
+typedef PyObject *ct_key_t;
+#define CT_SYMBOL(name) bytes_##name
+#elif defined(CT_STR_KEYS)
+#define CT_OBJECT_KEYS
+typedef PyObject *ct_key_t;
+#define CT_SYMBOL(name) str_##name
+#elif defined(CT_TUPLE_KEYS)
+#define CT_OBJECT_KEYS
+typedef PyObject *ct_key_t;
+#define CT_SYMBOL(name) tuple_##name
+#else
+#define CT_OBJECT_KEYS
+typedef PyObject *ct_key_t;
+#endif
+
+#ifdef CT_SYMBOL
+#define CT_TYPED_KEYS /* keys are checked or converted on entry */
+#define CT_KEY_FUNCTIONS 0
+#else
+/* the nodes of the object trees keep the original key of an item besides
+ * the key of the tree order, which is the result of the key function */
+#define CT_KEY_FUNCTIONS 1
+#endif
+
+#ifdef CT_BYTES_KEYS
+/* the bytes trees store the keys of the key function keycodec.encode_key()
+ * and decode them on output, the encoded keys are compared by memcmp() */
+#define CT_ENCODED_KEYS 1
+#else
+#define CT_ENCODED_KEYS 0
+#endif
+
 typedef struct tree_node node_t;
 
 struct tree_node {
 	node_t *link[2];
-	PyObject *key;
+	ct_key_t key;
+#if CT_KEY_FUNCTIONS
+	PyObject *orig_key; /* key of the item, key is the key of the tree order */
+#endif
 	PyObject *value;
-	int xdata;
+#if SIZEOF_SIZE_T >= 8
+	/* size and xdata share one word, the 56 bits of size count more nodes
+	 * than fit into memory */
+	Py_ssize_t size : 56; /* count of nodes in this subtree */
+	Py_ssize_t xdata : 8; /* RB trees: color, AVL trees: height */
+#else
+	Py_ssize_t size; /* count of nodes in this subtree */
+	int xdata; /* RB trees: color, AVL trees: height */
+#endif
 };
 
 typedef node_t* nodeptr;
 
+/* Every tree allocates its nodes from a pool of slabs, see ct_pool_new().
+ * Trees created by split() share the pool of the split tree, the smaller
+ * tree moves into a new pool by ct_pool_compact(), join() merges the pool of
+ * the joined tree into the pool of the tree. */
+typedef struct ct_slab ct_slab_t;
+typedef struct ct_pool ct_pool_t;
+
+struct ct_pool {
+	Py_ssize_t refcount; /* trees and merged pools using the pool */
+	ct_pool_t *merged; /* pool, which took over the slabs, or NULL */
+	ct_slab_t *slabs;
+	node_t *free_nodes; /* free list, linked by link[0] */
+	node_t *free_tail;
+	Py_ssize_t capacity; /* count of nodes in all slabs */
+	Py_ssize_t nbytes; /* memory of all slabs */
+	Py_ssize_t available; /* count of free nodes */
+};
+
+/* search path of the last key of ct_finger_find(), the nodes at which the
+ * search went left, initialized by ct_finger_init(), ct_finger_clear()
+ * releases the last key */
+#define CT_FINGER_DEPTH 128
+
+typedef struct {
+	int valid; /* key is set */
+	int depth;
+	ct_key_t key;
+	node_t *path[CT_FINGER_DEPTH];
+} ct_finger_t;
+
+/* ct_compare() and the key comparisons of the object trees return
+ * CT_COMPARE_ERROR with an exception set, if the keys are not comparable */
+#define CT_COMPARE_ERROR (-2)
+
+/* targets of the pop functions */
+#define CT_KEY 0 /* node of key */
+#define CT_MIN 1 /* node of the smallest key */
+#define CT_MAX 2 /* node of the largest key */
+
+/* new reference to key as Python object */
+Py_LOCAL_INLINE(PyObject *)
+ct_new_key_object(ct_key_t key)
+{
+#if defined(CT_INT64_KEYS)
+	return PyLong_FromLongLong(key);
+#elif defined(CT_FLOAT64_KEYS)
+	return PyFloat_FromDouble(key);
+#else
+	Py_INCREF(key);
+	return key;
+#endif
+}
+
+/* new reference to the key of node as Python object, ct_node_key() returns
+ * the key of the item, ct_node_sort_key() the key of the tree order */
+#if CT_KEY_FUNCTIONS
+#define ct_node_key(node) ct_new_key_object((node)->orig_key)
+#else
+#define ct_node_key(node) ct_new_key_object((node)->key)
+#endif
+#define ct_node_sort_key(node) ct_new_key_object((node)->key)
+
+/* replace the original key of a node, a no-op for the typed trees */
+Py_LOCAL_INLINE(void)
+ct_set_orig_key(node_t *node, PyObject *key)
+{
+#if CT_KEY_FUNCTIONS
+	Py_INCREF(key);
+	Py_XDECREF(node->orig_key);
+	node->orig_key = key;
+#endif
+}
+
+#ifdef CT_SYMBOL
+#define ct_pool_new CT_SYMBOL(ct_pool_new)
+#define ct_pool_release CT_SYMBOL(ct_pool_release)
+#define ct_pool_share CT_SYMBOL(ct_pool_share)
+#define ct_pool_merge CT_SYMBOL(ct_pool_merge)
+#define ct_pool_reserve CT_SYMBOL(ct_pool_reserve)
+#define ct_pool_capacity CT_SYMBOL(ct_pool_capacity)
+#define ct_pool_nbytes CT_SYMBOL(ct_pool_nbytes)
+#define ct_pool_share_nbytes CT_SYMBOL(ct_pool_share_nbytes)
+#define ct_pool_compact CT_SYMBOL(ct_pool_compact)
+#define ct_delete_tree CT_SYMBOL(ct_delete_tree)
+#define ct_compare CT_SYMBOL(ct_compare)
+#define ct_get_item CT_SYMBOL(ct_get_item)
+#define ct_find_node CT_SYMBOL(ct_find_node)
+#define ct_finger_init CT_SYMBOL(ct_finger_init)
+#define ct_finger_clear CT_SYMBOL(ct_finger_clear)
+#define ct_finger_find CT_SYMBOL(ct_finger_find)
+#define ct_get_leaf_node CT_SYMBOL(ct_get_leaf_node)
+#define ct_succ_node CT_SYMBOL(ct_succ_node)
+#define ct_prev_node CT_SYMBOL(ct_prev_node)
+#define ct_max_node CT_SYMBOL(ct_max_node)
+#define ct_min_node CT_SYMBOL(ct_min_node)
+#define ct_floor_node CT_SYMBOL(ct_floor_node)
+#define ct_ceiling_node CT_SYMBOL(ct_ceiling_node)
+#define ct_index_of CT_SYMBOL(ct_index_of)
+#define ct_bisect CT_SYMBOL(ct_bisect)
+#define ct_node_at CT_SYMBOL(ct_node_at)
+#define ct_bintree_insert CT_SYMBOL(ct_bintree_insert)
+#define ct_bintree_remove CT_SYMBOL(ct_bintree_remove)
+#define ct_bintree_setdefault CT_SYMBOL(ct_bintree_setdefault)
+#define ct_bintree_pop CT_SYMBOL(ct_bintree_pop)
+#define ct_bintree_build CT_SYMBOL(ct_bintree_build)
+#define ct_bintree_split CT_SYMBOL(ct_bintree_split)
+#define ct_bintree_join CT_SYMBOL(ct_bintree_join)
+#define avl_insert CT_SYMBOL(avl_insert)
+#define avl_remove CT_SYMBOL(avl_remove)
+#define avl_setdefault CT_SYMBOL(avl_setdefault)
+#define avl_pop CT_SYMBOL(avl_pop)
+#define avl_build CT_SYMBOL(avl_build)
+#define avl_split CT_SYMBOL(avl_split)
+#define avl_join CT_SYMBOL(avl_join)
+#define rb_insert CT_SYMBOL(rb_insert)
+#define rb_remove CT_SYMBOL(rb_remove)
+#define rb_setdefault CT_SYMBOL(rb_setdefault)
+#define rb_pop CT_SYMBOL(rb_pop)
+#define rb_build CT_SYMBOL(rb_build)
+#define rb_split CT_SYMBOL(rb_split)
+#define rb_join CT_SYMBOL(rb_join)
+#endif
+
+/* The functions with a PyObject *key argument convert the key to ct_key_t
+ * and return NULL (node_t *) or -1 with an exception set if the key is not
+ * convertible, as do the insert, build and join functions if they get no
+ * memory. The functions with a pool argument allocate or free nodes, pool
+ * has to be the pool of the tree and must not be merged into another pool. */
+
+/* node pools */
+ct_pool_t *ct_pool_new(void);
+void ct_pool_release(ct_pool_t *pool);
+ct_pool_t *ct_pool_share(ct_pool_t *pool);
+void ct_pool_merge(ct_pool_t *pool, ct_pool_t *other);
+int ct_pool_reserve(ct_pool_t *pool, Py_ssize_t count);
+Py_ssize_t ct_pool_capacity(ct_pool_t *pool);
+Py_ssize_t ct_pool_nbytes(ct_pool_t *pool);
+Py_ssize_t ct_pool_share_nbytes(ct_pool_t *pool, Py_ssize_t count);
+int ct_pool_compact(ct_pool_t **pool, node_t **root);
+
 /* common binary tree functions */
-void ct_delete_tree(node_t *root);
+void ct_delete_tree(ct_pool_t *pool, node_t *root);
 int ct_compare(PyObject *key1, PyObject *key2);
+#ifdef CT_OBJECT_KEYS
 PyObject *ct_get_item(node_t *root, PyObject *key);
+#endif
 node_t *ct_find_node(node_t *root, PyObject *key);
+void ct_finger_init(ct_finger_t *finger);
+void ct_finger_clear(ct_finger_t *finger);
+node_t *ct_finger_find(node_t *root, PyObject *key, ct_finger_t *finger);
 node_t *ct_get_leaf_node(node_t *node);
 node_t *ct_succ_node(node_t *root, PyObject *key);
 node_t *ct_prev_node(node_t *root, PyObject *key);
@@ -35,16 +238,36 @@ node_t *ct_min_node(node_t *root);
 node_t *ct_floor_node(node_t *root, PyObject *key);
 node_t *ct_ceiling_node(node_t *root, PyObject *key);
 
+/* order statistic functions */
+Py_ssize_t ct_index_of(node_t *root, PyObject *key); /* -2 for an invalid key */
+Py_ssize_t ct_bisect(node_t *root, PyObject *key, int right);
+node_t *ct_node_at(node_t *root, Py_ssize_t index);
+
 /* unbalanced binary tree */
-int ct_bintree_insert(node_t **root, PyObject *key, PyObject *value);
-int ct_bintree_remove(node_t **root, PyObject *key);
+int ct_bintree_insert(ct_pool_t *pool, node_t **root, PyObject *key, PyObject *value);
+int ct_bintree_remove(ct_pool_t *pool, node_t **root, PyObject *key);
+int ct_bintree_setdefault(ct_pool_t *pool, node_t **root, PyObject *key, PyObject *value, node_t **node);
+int ct_bintree_pop(ct_pool_t *pool, node_t **root, PyObject *key, int target, PyObject **key_out, PyObject **value_out);
+int ct_bintree_build(ct_pool_t *pool, node_t **root, PyObject *items);
+void ct_bintree_split(node_t *root, Py_ssize_t index, node_t **left, node_t **right);
+int ct_bintree_join(ct_pool_t *pool, node_t **left, node_t **right);
 
 /* avl-tree functions */
-int avl_insert(node_t **root, PyObject *key, PyObject *value);
-int avl_remove(node_t **root, PyObject *key);
+int avl_insert(ct_pool_t *pool, node_t **root, PyObject *key, PyObject *value);
+int avl_remove(ct_pool_t *pool, node_t **root, PyObject *key);
+int avl_setdefault(ct_pool_t *pool, node_t **root, PyObject *key, PyObject *value, node_t **node);
+int avl_pop(ct_pool_t *pool, node_t **root, PyObject *key, int target, PyObject **key_out, PyObject **value_out);
+int avl_build(ct_pool_t *pool, node_t **root, PyObject *items);
+void avl_split(node_t *root, Py_ssize_t index, node_t **left, node_t **right);
+int avl_join(ct_pool_t *pool, node_t **left, node_t **right);
 
 /* rb-tree functions */
-int rb_insert(node_t **root, PyObject *key, PyObject *value);
-int rb_remove(node_t **root, PyObject *key);
+int rb_insert(ct_pool_t *pool, node_t **root, PyObject *key, PyObject *value);
+int rb_remove(ct_pool_t *pool, node_t **root, PyObject *key);
+int rb_setdefault(ct_pool_t *pool, node_t **root, PyObject *key, PyObject *value, node_t **node);
+int rb_pop(ct_pool_t *pool, node_t **root, PyObject *key, int target, PyObject **key_out, PyObject **value_out);
+int rb_build(ct_pool_t *pool, node_t **root, PyObject *items);
+void rb_split(node_t *root, Py_ssize_t index, node_t **left, node_t **right);
+int rb_join(ct_pool_t *pool, node_t **left, node_t **right);
 
 #endif
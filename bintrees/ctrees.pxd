@@ -9,31 +9,77 @@ cdef extern from "ctrees.h":
     ctypedef struct PyObject:
         pass
 
+    enum:
+        CT_KEY
+        CT_MIN
+        CT_MAX
+        CT_KEY_FUNCTIONS
+        CT_ENCODED_KEYS
+
+    # the key of a node is a Python object or a C value, see ct_node_key()
     ctypedef struct node_t:
         node_t *link[2]
-        PyObject *key
         PyObject *value
+        Py_ssize_t size
+
+    ctypedef struct ct_pool_t:
+        ct_pool_t *merged
+
+    ctypedef struct ct_finger_t:
+        pass
+
+    ct_pool_t *ct_pool_new() except NULL
+    void ct_pool_release(ct_pool_t *pool)
+    ct_pool_t *ct_pool_share(ct_pool_t *pool)
+    void ct_pool_merge(ct_pool_t *pool, ct_pool_t *other)
+    int ct_pool_reserve(ct_pool_t *pool, Py_ssize_t count) except -1
+    Py_ssize_t ct_pool_capacity(ct_pool_t *pool)
+    Py_ssize_t ct_pool_nbytes(ct_pool_t *pool)
+    Py_ssize_t ct_pool_share_nbytes(ct_pool_t *pool, Py_ssize_t count)
+    int ct_pool_compact(ct_pool_t **pool, node_t **root) except -1
 
-    int ct_compare(object key1, object key2)
-    void ct_delete_tree(node_t *root)
-    node_t *ct_find_node(node_t *root, object key)
+    object ct_node_key(node_t *node)
+    object ct_node_sort_key(node_t *node)
+    void ct_set_orig_key(node_t *node, object key)
+    int ct_compare(object key1, object key2) except? -2
+    void ct_delete_tree(ct_pool_t *pool, node_t *root)
+    node_t *ct_find_node(node_t *root, object key) except? NULL
+    void ct_finger_init(ct_finger_t *finger)
+    void ct_finger_clear(ct_finger_t *finger)
+    node_t *ct_finger_find(node_t *root, object key, ct_finger_t *finger) except? NULL
     node_t *ct_get_leaf_node(node_t *node)
-    PyObject *ct_get_item(node_t *root, object key)
     node_t *ct_max_node(node_t *root)
     node_t *ct_min_node(node_t *root)
-    node_t *ct_succ_node(node_t *root, object key)
-    node_t *ct_prev_node(node_t *root, object key)
-    node_t *ct_floor_node(node_t *root, object key)
-    node_t *ct_ceiling_node(node_t *root, object key)
-    int ct_index_of(node_t *root, object key)
-    node_t *ct_node_at(node_t *root, int index)
+    node_t *ct_succ_node(node_t *root, object key) except? NULL
+    node_t *ct_prev_node(node_t *root, object key) except? NULL
+    node_t *ct_floor_node(node_t *root, object key) except? NULL
+    node_t *ct_ceiling_node(node_t *root, object key) except? NULL
+    # order statistic functions
+    Py_ssize_t ct_index_of(node_t *root, object key) except -2
+    Py_ssize_t ct_bisect(node_t *root, object key, int right) except -1
+    node_t *ct_node_at(node_t *root, Py_ssize_t index)
 
     # binary-tree functions
-    int ct_bintree_insert(node_t **root, object key, object value)
-    int ct_bintree_remove(node_t **root, object key)
+    int ct_bintree_insert(ct_pool_t *pool, node_t **root, object key, object value) except -1
+    int ct_bintree_remove(ct_pool_t *pool, node_t **root, object key) except -1
+    int ct_bintree_setdefault(ct_pool_t *pool, node_t **root, object key, object value, node_t **node) except -1
+    int ct_bintree_pop(ct_pool_t *pool, node_t **root, object key, int target, PyObject **key_out, PyObject **value_out) except -1
+    int ct_bintree_build(ct_pool_t *pool, node_t **root, list items) except -1
+    void ct_bintree_split(node_t *root, Py_ssize_t index, node_t **left, node_t **right)
+    int ct_bintree_join(ct_pool_t *pool, node_t **left, node_t **right) except -1
     # avl-tree functions
-    int avl_insert(node_t **root, object key, object value)
-    int avl_remove(node_t **root, object key)
+    int avl_insert(ct_pool_t *pool, node_t **root, object key, object value) except -1
+    int avl_remove(ct_pool_t *pool, node_t **root, object key) except -1
+    int avl_setdefault(ct_pool_t *pool, node_t **root, object key, object value, node_t **node) except -1
+    int avl_pop(ct_pool_t *pool, node_t **root, object key, int target, PyObject **key_out, PyObject **value_out) except -1
+    int avl_build(ct_pool_t *pool, node_t **root, list items) except -1
+    void avl_split(node_t *root, Py_ssize_t index, node_t **left, node_t **right)
+    int avl_join(ct_pool_t *pool, node_t **left, node_t **right) except -1
     # rb-tree functions
-    int rb_insert(node_t **root, object key, object value)
-    int rb_remove(node_t **root, object key)
\ No newline at end of file
+    int rb_insert(ct_pool_t *pool, node_t **root, object key, object value) except -1
+    int rb_remove(ct_pool_t *pool, node_t **root, object key) except -1
+    int rb_setdefault(ct_pool_t *pool, node_t **root, object key, object value, node_t **node) except -1
+    int rb_pop(ct_pool_t *pool, node_t **root, object key, int target, PyObject **key_out, PyObject **value_out) except -1
+    int rb_build(ct_pool_t *pool, node_t **root, list items) except -1
+    void rb_split(node_t *root, Py_ssize_t index, node_t **left, node_t **right)
+    int rb_join(ct_pool_t *pool, node_t **left, node_t **right) except -1
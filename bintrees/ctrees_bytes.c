@@ -0,0 +1,16 @@
+/*
+ * ctrees_bytes.c
+ *
+ *  tree functions for bytes keys, setup.py compiles this file for the
+ *  extension bintrees.cython_bytes_trees
+ *
+ *  Author: mozman
+ *  Copyright (c) 2010-2013 by Manfred Moitzi
+ *  License: MIT-License
+ */
+
+#ifndef CT_BYTES_KEYS
+#error "ctrees_bytes.c requires CT_BYTES_KEYS"
+#endif
+
+#include "ctrees.c"
@@ -0,0 +1,16 @@
+/*
+ * ctrees_float64.c
+ *
+ *  tree functions for float64 keys, setup.py compiles this file for the
+ *  extension bintrees.cython_float64_trees
+ *
+ *  Author: mozman
+ *  Copyright (c) 2010-2013 by Manfred Moitzi
+ *  License: MIT-License
+ */
+
+#ifndef CT_FLOAT64_KEYS
+#error "ctrees_float64.c requires CT_FLOAT64_KEYS"
+#endif
+
+#include "ctrees.c"
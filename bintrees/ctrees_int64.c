@@ -0,0 +1,16 @@
+/*
+ * ctrees_int64.c
+ *
+ *  tree functions for int64 keys, setup.py compiles this file for the
+ *  extension bintrees.cython_int64_trees
+ *
+ *  Author: mozman
+ *  Copyright (c) 2010-2013 by Manfred Moitzi
+ *  License: MIT-License
+ */
+
+#ifndef CT_INT64_KEYS
+#error "ctrees_int64.c requires CT_INT64_KEYS"
+#endif
+
+#include "ctrees.c"
@@ -0,0 +1,16 @@
+/*
+ * ctrees_str.c
+ *
+ *  tree functions for str keys, setup.py compiles this file for the
+ *  extension bintrees.cython_str_trees
+ *
+ *  Author: mozman
+ *  Copyright (c) 2010-2013 by Manfred Moitzi
+ *  License: MIT-License
+ */
+
+#ifndef CT_STR_KEYS
+#error "ctrees_str.c requires CT_STR_KEYS"
+#endif
+
+#include "ctrees.c"
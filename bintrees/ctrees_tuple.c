@@ -0,0 +1,16 @@
+/*
+ * ctrees_tuple.c
+ *
+ *  tree functions for tuple keys, setup.py compiles this file for the
+ *  extension bintrees.cython_tuple_trees
+ *
+ *  Author: mozman
+ *  Copyright (c) 2010-2013 by Manfred Moitzi
+ *  License: MIT-License
+ */
+
+#ifndef CT_TUPLE_KEYS
+#error "ctrees_tuple.c requires CT_TUPLE_KEYS"
+#endif
+
+#include "ctrees.c"
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: Red-black tree with native float64 keys implemented in Cython/C
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+# compiled against ctrees_float64.c, keys are stored as C double values
+include "cython_trees.pxi"
+
+
+class FastFloat64RBTree(_RBTree, _ABCTree):
+    """Red-black tree of float keys, int keys are stored and returned as
+    float, raises ValueError for int keys without an exact float value.
+    """
@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: Red-black tree with native int64 keys implemented in Cython/C
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+# compiled against ctrees_int64.c, keys are stored as C int64_t values
+include "cython_trees.pxi"
+
+
+class FastInt64RBTree(_RBTree, _ABCTree):
+    pass
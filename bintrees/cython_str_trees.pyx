@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: Red-black tree with str keys implemented in Cython/C
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+# compiled against ctrees_str.c, keys are compared by code points
+include "cython_trees.pxi"
+
+
+class FastStrRBTree(_RBTree, _ABCTree):
+    pass
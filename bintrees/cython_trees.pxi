@@ -0,0 +1,1163 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: Binary trees implemented in Cython/C, shared by all key types
+# Created: 28.04.2010
+# Copyright (c) 2010-2013 by Manfred Moitzi
+# License: MIT License
+
+from .abctree import _ABCTree, TreeSlice, _lookup_many
+from .keycodec import encode_key, decode_key
+from ctrees cimport *
+from cpython.ref cimport Py_INCREF, Py_XDECREF
+from cpython.list cimport PyList_New, PyList_SET_ITEM
+from cpython.mem cimport PyMem_Malloc, PyMem_Realloc, PyMem_Free
+from libc.string cimport memcpy
+
+DEF STACK_BUFFER = 64  # nodes, enough for balanced trees
+
+# entries of the tree iterators and lists
+cdef enum:
+    ITER_KEYS
+    ITER_VALUES
+    ITER_ITEMS
+
+# functions specific for the tree type: balanced build of a tree of sorted
+# items, split by index and join of two trees
+ctypedef int (*build_func_t)(ct_pool_t *pool, node_t **root, list items) except -1
+ctypedef void (*split_func_t)(node_t *root, Py_ssize_t index, node_t **left, node_t **right)
+ctypedef int (*join_func_t)(ct_pool_t *pool, node_t **left, node_t **right) except -1
+
+cdef class NodeStack:
+    """Stack for tree nodes, grows on the heap for deeper trees."""
+    cdef node_t **stack
+    cdef node_t *buffer[STACK_BUFFER]
+    cdef Py_ssize_t capacity
+    cdef Py_ssize_t stackptr
+
+    def __cinit__(self):
+        self.stack = self.buffer
+        self.capacity = STACK_BUFFER
+        self.stackptr = 0
+
+    def __dealloc__(self):
+        if self.stack != self.buffer:
+            PyMem_Free(self.stack)
+
+    cdef int _grow(self) except -1:
+        cdef Py_ssize_t capacity = self.capacity * 2
+        cdef node_t **stack
+        if self.stack == self.buffer:
+            stack = <node_t **>PyMem_Malloc(capacity * sizeof(node_t *))
+            if stack != NULL:
+                memcpy(stack, self.buffer, self.capacity * sizeof(node_t *))
+        else:
+            stack = <node_t **>PyMem_Realloc(self.stack, capacity * sizeof(node_t *))
+        if stack == NULL:
+            raise MemoryError()
+        self.stack = stack
+        self.capacity = capacity
+        return 0
+
+    cdef push(self, node_t* node):
+        if self.stackptr >= self.capacity:
+            self._grow()
+        self.stack[self.stackptr] = node
+        self.stackptr += 1
+
+    cdef node_t* pop(self):
+        if self.stackptr <= 0:
+            raise RuntimeError("Stack underflow in NodeStack.pop().")
+        self.stackptr -= 1
+        return self.stack[self.stackptr]
+
+    cdef node_t* top(self):
+        if self.stackptr <= 0:
+            raise RuntimeError("Stack underflow in NodeStack.top().")
+        return self.stack[self.stackptr - 1]
+
+    cdef bint is_empty(self):
+        return self.stackptr == 0
+
+cdef class _BaseTree:
+    cdef node_t *root  # private (hidden) for CPython
+    cdef ct_pool_t *pool  # node pool, NULL until the first node is allocated
+    cdef readonly Py_ssize_t count  # public readonly access for CPython
+    cdef unsigned long version  # incremented by every modification of the tree structure
+    cdef readonly object key  # key function of the tree order or None
+    cdef build_func_t build_tree  # set by the tree types
+    cdef split_func_t split_tree
+    cdef join_func_t join_trees
+
+    def __cinit__(self, items=None, key=None):
+        self.root = NULL
+        self.pool = NULL
+        self.count = 0
+        self.version = 0
+        self.key = None
+
+    def __init__(self, items=None, key=None):
+        if key is not None:
+            if not (CT_KEY_FUNCTIONS or (CT_ENCODED_KEYS and key is encode_key)):
+                raise TypeError("%s does not support key functions" % self.__class__.__name__)
+            self.key = key
+        if items is not None:
+            self.update(items)
+
+    def __dealloc__(self):
+        if self.root != NULL:
+            ct_delete_tree(self._pool(), self.root)
+        ct_pool_release(self.pool)
+
+    def __getstate__(self):
+        if self.key is None:
+            return dict(self.items())
+        return dict(self.items()), self.key
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):  # tree with key function
+            state, self.key = state
+        self.update(state)
+
+    cdef inline object _order_key(self, key):
+        # key of the tree order
+        return key if self.key is None else self.key(key)
+
+    cdef inline object _node_key(self, node_t *node):
+        # key of the item, the typed trees with key function store only the
+        # encoded key
+        if CT_KEY_FUNCTIONS or self.key is None:
+            return ct_node_key(node)
+        return decode_key(ct_node_key(node))
+
+    cdef inline ct_pool_t *_pool(self) except NULL:
+        # node pool of the tree, follows the merge of the pool by join()
+        cdef ct_pool_t *pool = self.pool
+        if pool == NULL:
+            self.pool = ct_pool_new()
+        elif pool.merged != NULL:
+            self.pool = ct_pool_share(pool)
+            ct_pool_release(pool)
+        return self.pool
+
+    def clear(self):
+        cdef node_t *root = self.root
+        self.root = NULL
+        self.count = 0
+        self.version += 1
+        if root != NULL:
+            ct_delete_tree(self._pool(), root)
+        # releases the slabs, if no other tree shares the pool
+        ct_pool_release(self.pool)
+        self.pool = NULL
+
+    def reserve(self, Py_ssize_t count):
+        """T.reserve(n) -> None, preallocate the nodes for n items in total,
+        the nodes are released by clear().
+        """
+        if count > self.count:
+            ct_pool_reserve(self._pool(), count - self.count)
+
+    def __sizeof__(self):
+        """T.__sizeof__() -> size of T in memory in bytes, including the node
+        pool, excluding keys and values. Trees split from T share the pool,
+        each tree counts a share in proportion to its count of items.
+        """
+        return object.__sizeof__(self) + ct_pool_share_nbytes(self.pool, self.count)
+
+    def _build_sorted(self, items):
+        """Replace the content of T by a balanced tree of items, a list of
+        (key, value) tuples in strictly ascending key order, or of
+        (key(k), value, k) tuples for a tree with key function, O(n).
+
+        Raises TypeError for other items.
+        """
+        # private copy, the key conversion can run Python code, which must
+        # not change the list during the build
+        items = list(items)
+        self.clear()
+        self.build_tree(self._pool(), &self.root, items)
+        self.count = len(items)
+
+    def split(self, key):
+        """T.split(key) -> (left, right), move items with keys < key into the
+        new tree left and items with keys >= key into the new tree right, T
+        is empty afterwards, O(log(n)).
+
+        Both trees share the node pool of T, which is freed with the last of
+        them, a smaller tree of up to 4096 items moves into a new pool unless
+        half of the shared pool would be free nodes, copy() of a tree
+        allocates a new pool.
+        """
+        cdef _BaseTree left, right, smaller
+        left, right = self._split(key)
+        smaller = left if left.count <= right.count else right
+        ct_pool_compact(&smaller.pool, &smaller.root)
+        return left, right
+
+    def _split(self, key):
+        # split() without moving a tree into a new pool, for trees which are
+        # joined again
+        cdef node_t *left
+        cdef node_t *right
+        # the split by index compares no keys, an incomparable key raises
+        # TypeError before T is modified
+        cdef Py_ssize_t index = ct_bisect(self.root, self._order_key(key), 0)
+        self.split_tree(self.root, index, &left, &right)
+        self.root = NULL
+        self.count = 0
+        self.version += 1
+        result = self._new_tree(left), self._new_tree(right)
+        ct_pool_release(self.pool)
+        self.pool = NULL
+        return result
+
+    def _join(self, _BaseTree other):
+        if other.root != NULL:
+            if self.pool == NULL:
+                self.pool = ct_pool_share(other.pool)
+            else:
+                # T takes over the node pool of other
+                ct_pool_merge(self._pool(), other.pool)
+        self.join_trees(self._pool(), &self.root, &other.root)
+        self.count += other.count
+        self.version += 1
+        other.count = 0
+        other.version += 1
+        ct_pool_release(other.pool)
+        other.pool = NULL
+
+    cdef _new_tree(self, node_t *root):
+        # new tree of the same type, which takes the ownership of root
+        cdef _BaseTree tree = self.__class__(key=self.key)
+        tree.root = root
+        if root != NULL:
+            tree.pool = ct_pool_share(self.pool)
+        tree.count = root.size if root != NULL else 0
+        return tree
+
+    def cursor(self, key=None):
+        """T.cursor([key]) -> TreeCursor positioned on the smallest key greater
+        than or equal to key, or on the min key if key is None.
+        """
+        return TreeCursor(self, key)
+
+    def get_value(self, key):
+        cdef node_t *result = ct_find_node(self.root, self._order_key(key))
+        if result == NULL:
+            raise KeyError(key)
+        else:
+            return <object> result.value
+
+    def get(self, key, default=None):
+        """T.get(k[,d]) -> T[k] if k in T, else d.  d defaults to None."""
+        cdef node_t *result = ct_find_node(self.root, self._order_key(key))
+        if result == NULL:
+            return default
+        else:
+            return <object> result.value
+
+    def __contains__(self, key):
+        """k in T -> True if T has a key k, else False"""
+        return ct_find_node(self.root, self._order_key(key)) != NULL
+
+    def get_many(self, keys, default=None):
+        """T.get_many(keys[, d]) -> list of T.get(k, d) for k in keys, an object
+        array for a NumPy array of keys. The search of a key greater than or
+        equal to the previous key resumes on the previous search path.
+        """
+        return _lookup_many(lambda probes: self._find_many(probes, default, False), keys, object)
+
+    def contains_many(self, keys):
+        """T.contains_many(keys) -> list of k in T for k in keys, a bool array
+        for a NumPy array of keys. The search of a key greater than or equal to
+        the previous key resumes on the previous search path.
+        """
+        return _lookup_many(lambda probes: self._find_many(probes, None, True), keys, bool)
+
+    cdef list _find_many(self, keys, default, bint contains):
+        # one finger search for all keys, sorted keys don't restart at the root
+        cdef ct_finger_t finger
+        cdef node_t *node
+        cdef list probes = keys if type(keys) is list else list(keys)
+        cdef Py_ssize_t index, size = len(probes)
+        cdef unsigned long version = self.version
+        cdef list result = PyList_New(size)
+        ct_finger_init(&finger)
+        try:
+            for index in range(size):
+                key = self._order_key(probes[index])
+                if version != self.version:  # modified by the key function
+                    ct_finger_clear(&finger)
+                    version = self.version
+                node = ct_finger_find(self.root, key, &finger)
+                if contains:
+                    value = node != NULL
+                elif node == NULL:
+                    value = default
+                else:
+                    value = <object>node.value
+                Py_INCREF(value)
+                PyList_SET_ITEM(result, index, value)  # steals the reference
+        finally:
+            ct_finger_clear(&finger)
+        return result
+
+    def __len__(self):
+        """T.__len__() <==> len(x)"""
+        return self.count
+
+    def __getitem__(self, key):
+        """T.__getitem__(y) <==> x[y]"""
+        cdef node_t *result
+        if isinstance(key, slice):
+            return TreeSlice(self, key.start, key.stop)
+        result = ct_find_node(self.root, self._order_key(key))
+        if result == NULL:
+            raise KeyError(key)
+        return <object> result.value
+
+    def __setitem__(self, key, value):
+        """T.__setitem__(i, y) <==> x[i]=y"""
+        if isinstance(key, slice):
+            self.replace_range(key.start, key.stop, value)
+        else:
+            self._insert(key, value)
+
+    def __delitem__(self, key):
+        """T.__delitem__(y) <==> del x[y]"""
+        if isinstance(key, slice):
+            self._replace_range(key.start, key.stop).clear()
+        elif self._remove_item(self._order_key(key)) == 0:
+            raise KeyError(str(key))
+
+    def __iter__(self):
+        """T.__iter__() <==> iter(x), iterate over the keys in ascending order"""
+        return self._iterator(0, self.count, False, ITER_KEYS)
+
+    def __reversed__(self):
+        return self._iterator(0, self.count, True, ITER_KEYS)
+
+    def keys_list(self, reverse=False):
+        """T.keys_list([reverse]) -> list of the keys of T, in ascending order,
+        in descending order if reverse is True.
+        """
+        return self._list(reverse, ITER_KEYS)
+
+    def values_list(self, reverse=False):
+        """T.values_list([reverse]) -> list of the values of T, in ascending key
+        order, in descending key order if reverse is True.
+        """
+        return self._list(reverse, ITER_VALUES)
+
+    def items_list(self, reverse=False):
+        """T.items_list([reverse]) -> list of the (key, value) items of T, in
+        ascending key order, in descending key order if reverse is True.
+        """
+        return self._list(reverse, ITER_ITEMS)
+
+    cdef inline object _entry(self, node_t *node, int entry):
+        if entry == ITER_KEYS:
+            return self._node_key(node)
+        if entry == ITER_VALUES:
+            return <object>node.value
+        return self._node_key(node), <object>node.value
+
+    cdef TreeIterator _iterator(self, Py_ssize_t lo, Py_ssize_t hi, bint reverse, int entry):
+        # iterator over the items with index lo <= index < hi
+        cdef TreeIterator iterator = TreeIterator.__new__(TreeIterator)
+        iterator._start(self, lo, hi, reverse, entry)
+        return iterator
+
+    cdef list _list(self, bint reverse, int entry):
+        # fills the list in one in-order walk
+        cdef int direction = 1 if reverse else 0
+        cdef int other = 1 - direction
+        cdef unsigned long version = self.version
+        cdef list result = PyList_New(self.count)
+        cdef Py_ssize_t index = 0
+        cdef NodeStack stack = NodeStack()
+        cdef node_t *node = self.root
+        while True:
+            while node != NULL:
+                stack.push(node)
+                node = node.link[direction]
+            if stack.is_empty():
+                return result
+            node = stack.pop()
+            value = self._entry(node, entry)
+            if version != self.version:  # modified by the garbage collection
+                raise RuntimeError("tree changed during iteration")
+            Py_INCREF(value)
+            PyList_SET_ITEM(result, index, value)  # steals the reference
+            index += 1
+            node = node.link[other]
+
+    def insert(self, key, value):
+        """T.insert(key, value) <==> T[key] = value, insert key, value into tree."""
+        self._insert(key, value)
+
+    def remove(self, key):
+        """T.remove(key) <==> del T[key], remove item <key> from tree."""
+        if self._remove_item(self._order_key(key)) == 0:
+            raise KeyError(str(key))
+
+    def discard(self, key):
+        """T.discard(k) -> None, remove k from T, if k is present"""
+        self._remove_item(self._order_key(key))
+
+    def is_empty(self):
+        """T.is_empty() -> False if T contains any items else True"""
+        return self.count == 0
+
+    cdef int _insert(self, key, value) except -1:
+        # insert key, value or replace the value of an existing key, an
+        # existing item keeps its original key
+        cdef node_t *node
+        if self.key is None:
+            return self._insert_item(key, value)
+        if self._setdefault(key, value, &node):
+            return 1
+        Py_XDECREF(node.value)
+        node.value = <PyObject *> value
+        Py_INCREF(value)
+        return 0
+
+    cdef int _setdefault(self, key, value, node_t **nodeaddr) except -1:
+        # _setdefault_node() for the original key of an item
+        cdef int is_new
+        if self.key is None:
+            return self._setdefault_node(key, value, nodeaddr)
+        is_new = self._setdefault_node(self.key(key), value, nodeaddr)
+        if is_new:
+            ct_set_orig_key(nodeaddr[0], key)
+        return is_new
+
+    cdef int _insert_item(self, key, value) except -1:
+        # insert key, value or replace the value of an existing key
+        raise NotImplementedError
+
+    cdef int _remove_item(self, key) except -1:
+        # remove key, returns 0 if key does not exist
+        raise NotImplementedError
+
+    def max_item(self):
+        """Get item with max key of tree, raises ValueError if tree is empty."""
+        cdef node_t *node = ct_max_node(self.root)
+        if node == NULL:
+            raise ValueError("Tree is empty")
+        return self._node_key(node), <object>node.value
+
+    def min_item(self):
+        """Get item with min key of tree, raises ValueError if tree is empty."""
+        cdef node_t *node = ct_min_node(self.root)
+        if node == NULL:
+            raise ValueError("Tree is empty")
+        return self._node_key(node), <object>node.value
+
+    def succ_item(self, key):
+        """Get successor (k,v) pair of key, raises KeyError if key is max key
+        or key does not exist.
+        """
+        cdef node_t *node = ct_succ_node(self.root, self._order_key(key))
+        if node == NULL: # given key is biggest in tree
+            raise KeyError(str(key))
+        return self._node_key(node), <object> node.value
+
+    def prev_item(self, key):
+        """Get predecessor (k,v) pair of key, raises KeyError if key is min key
+        or key does not exist.
+        """
+        cdef node_t *node = ct_prev_node(self.root, self._order_key(key))
+        if node == NULL: # given key is smallest in tree
+            raise KeyError(str(key))
+        return self._node_key(node), <object> node.value
+
+    def floor_item(self, key):
+        """Get (k,v) pair associated with the greatest key less than or equal to
+        the given key, raises KeyError if there is no such key.
+        """
+        cdef node_t *node = ct_floor_node(self.root, self._order_key(key))
+        if node == NULL:  # given key is smaller than min-key in tree
+            raise KeyError(str(key))
+        return self._node_key(node), <object> node.value
+
+    def ceiling_item(self, key):
+        """Get (k,v) pair associated with the smallest key greater than or equal to
+        the given key, raises KeyError if there is no such key.
+        """
+        cdef node_t *node = ct_ceiling_node(self.root, self._order_key(key))
+        if node == NULL:  # given key is greater than max-key in tree
+            raise KeyError(str(key))
+        return self._node_key(node), <object> node.value
+
+    def max_key(self):
+        """Get max key of tree, raises ValueError if tree is empty."""
+        cdef node_t *node = ct_max_node(self.root)
+        if node == NULL:
+            raise ValueError("Tree is empty")
+        return self._node_key(node)
+
+    def min_key(self):
+        """Get min key of tree, raises ValueError if tree is empty."""
+        cdef node_t *node = ct_min_node(self.root)
+        if node == NULL:
+            raise ValueError("Tree is empty")
+        return self._node_key(node)
+
+    def succ_key(self, key):
+        """Get successor to key, raises KeyError if key is max key
+        or key does not exist.
+        """
+        cdef node_t *node = ct_succ_node(self.root, self._order_key(key))
+        if node == NULL:
+            raise KeyError(str(key))
+        return self._node_key(node)
+
+    def prev_key(self, key):
+        """Get predecessor to key, raises KeyError if key is min key
+        or key does not exist.
+        """
+        cdef node_t *node = ct_prev_node(self.root, self._order_key(key))
+        if node == NULL:
+            raise KeyError(str(key))
+        return self._node_key(node)
+
+    def floor_key(self, key):
+        """Get the greatest key less than or equal to the given key, raises
+        KeyError if there is no such key.
+        """
+        cdef node_t *node = ct_floor_node(self.root, self._order_key(key))
+        if node == NULL:
+            raise KeyError(str(key))
+        return self._node_key(node)
+
+    def ceiling_key(self, key):
+        """Get the smallest key greater than or equal to the given key, raises
+        KeyError if there is no such key.
+        """
+        cdef node_t *node = ct_ceiling_node(self.root, self._order_key(key))
+        if node == NULL:
+            raise KeyError(str(key))
+        return self._node_key(node)
+
+    def rank(self, key):
+        """Get index of key in ascending key order, raises KeyError if key
+        does not exist.
+        """
+        cdef Py_ssize_t index = ct_index_of(self.root, self._order_key(key))
+        if index < 0:
+            raise KeyError(str(key))
+        return index
+
+    def bisect_left(self, key):
+        """Get count of keys less than key."""
+        return ct_bisect(self.root, self._order_key(key), 0)
+
+    def bisect_right(self, key):
+        """Get count of keys less than or equal to key."""
+        return ct_bisect(self.root, self._order_key(key), 1)
+
+    def count_range(self, start_key, end_key):
+        """T.count_range(start_key, end_key) -> count of keys:
+        start_key <= key < end_key.
+
+        Start or end key None means no lower or upper bound.
+        """
+        cdef Py_ssize_t start = 0 if start_key is None else ct_bisect(self.root, self._order_key(start_key), 0)
+        cdef Py_ssize_t end = self.count if end_key is None else ct_bisect(self.root, self._order_key(end_key), 0)
+        return max(end - start, 0)
+
+    def select(self, Py_ssize_t index):
+        """Get (k,v) pair at index in ascending key order, negative indices
+        count from the end, raises IndexError if index is out of range.
+        """
+        if index < 0:
+            index += self.count
+        cdef node_t *node = ct_node_at(self.root, index) if index >= 0 else NULL
+        if node == NULL:
+            raise IndexError("tree index out of range")
+        return self._node_key(node), <object> node.value
+
+    def iter_items(self, start_key=None, end_key=None, reverse=False):
+        """Iterate over the (key, value) items in ascending order
+        if reverse is True iterate in descending order.
+
+        Counts the keys in range s <= key < e, seeks to the first key in
+        range by its index and stops after the counted items, O(log(n)+k)
+        for k yielded items.
+        """
+        return self._range(start_key, end_key, reverse, ITER_ITEMS)
+
+    def iter_chunks(self, Py_ssize_t size, start_key=None, end_key=None, reverse=False, columns=False):
+        """T.iter_chunks(size[, start_key, end_key, reverse, columns]) ->
+        iterator over lists of up to size (key, value) items:
+        start_key <= key < end_key.
+
+        Yields a pair of lists (keys, values) per chunk if columns is True.
+        """
+        if size < 1:
+            raise ValueError("chunk size has to be >= 1")
+        cdef TreeIterator iterator = self._range(start_key, end_key, reverse, ITER_ITEMS)
+        while iterator.remaining > 0:
+            yield iterator._chunk(size, columns)
+
+    def key_slice(self, start_key, end_key, reverse=False):
+        """T.key_slice(start_key, end_key) -> key iterator:
+        start_key <= key < end_key.
+
+        Yields keys in ascending order if reverse is False else in descending order.
+        """
+        return self._range(start_key, end_key, reverse, ITER_KEYS)
+
+    def value_slice(self, start_key, end_key, reverse=False):
+        """T.value_slice(start_key, end_key) -> value iterator:
+        start_key <= key < end_key.
+
+        Yields values in ascending key order if reverse is False else in descending key order.
+        """
+        return self._range(start_key, end_key, reverse, ITER_VALUES)
+
+    def item_slice(self, start_key, end_key, reverse=False):
+        """T.item_slice(start_key, end_key) -> item iterator:
+        start_key <= key < end_key.
+
+        Yields items in ascending key order if reverse is False else in descending key order.
+        """
+        return self._range(start_key, end_key, reverse, ITER_ITEMS)
+
+    cdef TreeIterator _range(self, start_key, end_key, bint reverse, int entry):
+        # iterator over the items with start_key <= key < end_key
+        cdef Py_ssize_t lo = 0 if start_key is None else ct_bisect(self.root, self._order_key(start_key), 0)
+        cdef Py_ssize_t hi = self.count if end_key is None else ct_bisect(self.root, self._order_key(end_key), 0)
+        return self._iterator(lo, hi, reverse, entry)
+
+    def pop_item(self):
+        """ T.pop_item() -> (k, v), remove and return some (key, value) pair as a
+        2-tuple; but raise KeyError if T is empty.
+        """
+        if self.count == 0:
+            raise KeyError("pop_item(): tree is empty")
+
+        cdef node_t *node = ct_get_leaf_node(self.root)
+        key = self._node_key(node)
+        value = <object> node.value
+        self._remove_item(ct_node_sort_key(node))
+        return key, value
+    popitem = pop_item  # for compatibility to dict()
+
+    cdef int _setdefault_node(self, key, value, node_t **nodeaddr) except -1:
+        # get node of key, insert key with value if key does not exist,
+        # returns 1 for a new node else 0
+        raise NotImplementedError
+
+    cdef int _pop_node(self, key, int target, PyObject **keyaddr, PyObject **valueaddr) except -1:
+        # remove node of target, moves the references of key and value to
+        # the addresses, returns 0 if the node does not exist
+        raise NotImplementedError
+
+    cdef _pop_item(self, key, int target):
+        cdef PyObject *key_ref
+        cdef PyObject *value_ref
+        if self._pop_node(key, target, &key_ref, &value_ref) == 0:
+            return None
+        item = (<object> key_ref, <object> value_ref)
+        if not CT_KEY_FUNCTIONS and self.key is not None:
+            item = (decode_key(item[0]), item[1])
+        Py_XDECREF(key_ref)
+        Py_XDECREF(value_ref)
+        return item
+
+    def pop(self, key, *args):
+        """T.pop(k[,d]) -> v, remove specified key and return the corresponding value.
+        If key is not found, d is returned if given, otherwise KeyError is raised
+        """
+        if len(args) > 1:
+            raise TypeError("pop expected at most 2 arguments, got %d" % (1 + len(args)))
+        item = self._pop_item(self._order_key(key), CT_KEY)
+        if item is None:
+            if len(args) == 0:
+                raise KeyError(str(key))
+            return args[0]
+        return item[1]
+
+    def pop_min(self):
+        """T.pop_min() -> (k, v), remove item with minimum key, raise ValueError
+        if T is empty.
+        """
+        if self.count == 0:
+            raise ValueError("Tree is empty")
+        return self._pop_item(None, CT_MIN)
+
+    def pop_max(self):
+        """T.pop_max() -> (k, v), remove item with maximum key, raise ValueError
+        if T is empty.
+        """
+        if self.count == 0:
+            raise ValueError("Tree is empty")
+        return self._pop_item(None, CT_MAX)
+
+    def set_default(self, key, default=None):
+        """T.set_default(k[,d]) -> T.get(k,d), also set T[k]=d if k not in T"""
+        cdef node_t *node
+        self._setdefault(key, default, &node)
+        return <object> node.value
+    setdefault = set_default  # for compatibility to dict()
+
+    def update_value(self, key, func, default=None):
+        """T.update_value(k, f[,d]) -> v, set T[k] = v = f(T.get(k, d)) with one
+        search of k.
+        """
+        cdef node_t *node
+        cdef PyObject *old_value
+        cdef int is_new = self._setdefault(key, default, &node)
+        cdef unsigned long version = self.version
+        try:
+            value = func(<object> node.value)
+        except:
+            if is_new and version == self.version:
+                self.remove(key)
+            raise
+        if version == self.version:  # node is still valid
+            old_value = node.value
+            Py_INCREF(value)
+            node.value = <PyObject *> value
+            Py_XDECREF(old_value)
+        else:
+            self.insert(key, value)
+        return value
+
+    def foreach(self, func, int order=0):
+        """Visit all tree nodes and process tree data by func(key, Value).
+
+        parm func: function(key, value)
+        param int order: inorder = 0, preorder = -1, postorder = +1
+        """
+        if self.count == 0:
+            return
+        cdef NodeStack stack = NodeStack()
+        cdef NodeStack tempstack = NodeStack()
+        cdef node_t *node = self.root
+
+        if order == 0:
+            while not stack.is_empty() or node:
+                if node:
+                    stack.push(node)
+                    node = node.link[0]
+                else:
+                    node = stack.pop()
+                    func(self._node_key(node), <object>node.value)
+                    node = node.link[1]
+        elif order == -1:
+            stack.push(node)
+            while not stack.is_empty():
+                node = stack.pop()
+                func(self._node_key(node), <object>node.value)
+                if node.link[1]:
+                    stack.push(node.link[1])
+                if node.link[0]:
+                    stack.push(node.link[0])
+        elif order == +1:
+            tempstack.push(node)
+            while not tempstack.is_empty():
+                node = tempstack.pop()
+                stack.push(node)
+                if node.link[0]:
+                    tempstack.push(node.link[0])
+                if node.link[1]:
+                    tempstack.push(node.link[1])
+            while not stack.is_empty():
+                node = stack.pop()
+                func(self._node_key(node), <object>node.value)
+
+
+cdef class TreeCursor:
+    """Stateful bidirectional cursor over the Cython trees.
+
+    The cursor keeps the path from the root to the current node, next() and
+    prev() cost amortized O(1), seek() costs O(log(n)).
+
+    Modifying the tree invalidates the path, the next access re-seeks the
+    key of the current item, O(log(n)).
+    """
+    cdef _BaseTree tree
+    cdef NodeStack path
+    cdef object current  # tree-order key of the current item, survives removal of its node
+    cdef unsigned long version
+    cdef bint removed  # the current item was removed, next() and prev() re-seek its key
+
+    def __cinit__(self, _BaseTree tree, key=None):
+        self.tree = tree
+        self.path = NodeStack()
+        self.current = None
+        self.version = tree.version
+        self.removed = False
+        if key is None:
+            self.first()
+        else:
+            self.seek(key)
+
+    def __repr__(self):
+        if self.valid:
+            return "%s(%r: %r)" % (self.__class__.__name__, self.key, self.value)
+        return "%s()" % self.__class__.__name__
+
+    property valid:
+        """True if the cursor is positioned on an item."""
+        def __get__(self):
+            self._sync(0)
+            return not self.path.is_empty()
+
+    property key:
+        """Key of the current item, raises KeyError if the cursor is invalid."""
+        def __get__(self):
+            return self.tree._node_key(self._node())
+
+    property value:
+        """Value of the current item, raises KeyError if the cursor is invalid."""
+        def __get__(self):
+            return <object> self._node().value
+
+    property item:
+        """(key, value) of the current item, raises KeyError if the cursor is invalid."""
+        def __get__(self):
+            cdef node_t *node = self._node()
+            return self.tree._node_key(node), <object> node.value
+
+    def set_value(self, value):
+        """Replace the value of the current item, raises KeyError if the cursor is invalid."""
+        cdef node_t *node = self._node()
+        Py_XDECREF(node.value)
+        node.value = <PyObject *> value
+        Py_INCREF(value)
+
+    def first(self):
+        """Move to the item with the smallest key, returns False if tree is empty."""
+        return bool(self._edge(0))
+
+    def last(self):
+        """Move to the item with the largest key, returns False if tree is empty."""
+        return bool(self._edge(1))
+
+    def seek(self, key):
+        """Move to the item with the smallest key greater than or equal to
+        key, returns False if there is no such key.
+        """
+        return bool(self._seek(self.tree._order_key(key), 0))
+
+    def seek_floor(self, key):
+        """Move to the item with the greatest key less than or equal to
+        key, returns False if there is no such key.
+        """
+        return bool(self._seek(self.tree._order_key(key), 1))
+
+    def next(self):
+        """Move to the next item in ascending key order, returns False and
+        invalidates the cursor if the current item is the last item.
+        """
+        if not self._sync(+1):
+            return not self.path.is_empty()
+        return bool(self._step(1))
+
+    def prev(self):
+        """Move to the previous item in ascending key order, returns False
+        and invalidates the cursor if the current item is the first item.
+        """
+        if not self._sync(-1):
+            return not self.path.is_empty()
+        return bool(self._step(0))
+
+    cdef int _edge(self, int direction) except -1:
+        cdef node_t *node = self.tree.root
+        self._reset()
+        while node != NULL:
+            self.path.push(node)
+            node = node.link[direction]
+        return self._positioned()
+
+    cdef int _seek(self, key, int floor) except -1:
+        # floor == 0: stop at the smallest key >= key
+        # floor == 1: stop at the greatest key <= key
+        cdef node_t *node = self.tree.root
+        cdef Py_ssize_t depth = 0
+        cdef int cval
+        self._reset()
+        try:
+            while node != NULL:
+                self.path.push(node)
+                cval = ct_compare(key, ct_node_sort_key(node))
+                if cval == 0:
+                    return self._positioned()
+                if (cval < 0) != floor:
+                    depth = self.path.stackptr
+                node = node.link[cval > 0]
+        except:  # incomparable key, invalidates the cursor
+            self._reset()
+            self._positioned()
+            raise
+        self.path.stackptr = depth
+        return self._positioned()
+
+    cdef int _step(self, int direction) except -1:
+        cdef NodeStack path = self.path
+        cdef int other = 1 - direction
+        cdef node_t *child
+        cdef node_t *node
+
+        if path.is_empty():
+            return False
+        node = path.top().link[direction]
+        if node != NULL:
+            while node != NULL:
+                path.push(node)
+                node = node.link[other]
+        else:
+            child = path.pop()
+            while not path.is_empty() and path.top().link[direction] == child:
+                child = path.pop()
+        return self._positioned()
+
+    cdef int _positioned(self):
+        if self.path.is_empty():
+            self.current = None
+            return False
+        self.current = ct_node_sort_key(self.path.top())
+        return True
+
+    cdef _reset(self):
+        self.path.stackptr = 0
+        self.version = self.tree.version
+        self.removed = False
+
+    cdef node_t *_node(self) except NULL:
+        self._sync(0)
+        if self.path.is_empty():
+            raise KeyError("cursor is not positioned on an item")
+        return self.path.top()
+
+    cdef int _sync(self, int direction) except -1:
+        """Re-seek the current key if the tree was modified.
+
+        Returns True if the cursor is still positioned on its key, else the
+        cursor is moved to the nearest item in the given direction (+1 next,
+        -1 prev) and False is returned. Direction 0 leaves the cursor without
+        item, but keeps the key of the removed item for next() and prev().
+        """
+        if self.version == self.tree.version and not self.removed:
+            return True
+        if self.path.is_empty() and not self.removed:
+            self.version = self.tree.version
+            return True
+        key = self.current
+        self._seek(key, direction < 0)
+        if not self.path.is_empty() and ct_compare(key, ct_node_sort_key(self.path.top())) == 0:
+            return True
+        if direction == 0:
+            self._reset()
+            self.current = key
+            self.removed = True
+        return False
+
+
+cdef class TreeIterator:
+    """Iterator over the keys, values or items of a tree in a range of item
+    indices.
+
+    The first item is located by its index in O(log(n)), every next item in
+    amortized O(1), raises RuntimeError if the tree is modified during the
+    iteration.
+    """
+    cdef _BaseTree tree
+    cdef NodeStack stack
+    cdef Py_ssize_t remaining
+    cdef int direction
+    cdef int entry  # ITER_KEYS, ITER_VALUES or ITER_ITEMS
+    cdef unsigned long version
+
+    cdef _start(self, _BaseTree tree, Py_ssize_t lo, Py_ssize_t hi, bint reverse, int entry):
+        cdef Py_ssize_t index = hi - 1 if reverse else lo
+        cdef Py_ssize_t left_size
+        cdef node_t *node = tree.root
+        self.tree = tree
+        self.stack = NodeStack()
+        self.remaining = hi - lo if hi > lo else 0
+        self.direction = 1 if reverse else 0
+        self.entry = entry
+        self.version = tree.version
+        if self.remaining == 0:
+            return
+        # seek the first item by its index: push all nodes on the way, which
+        # are visited after the first item, the range is bounded by the count
+        # of items, no keys are compared while walking
+        while node != NULL:
+            left_size = 0 if node.link[0] == NULL else node.link[0].size
+            if index == left_size:
+                self.stack.push(node)
+                break
+            if (index < left_size) != reverse:
+                self.stack.push(node)
+            if index < left_size:
+                node = node.link[0]
+            else:
+                index -= left_size + 1
+                node = node.link[1]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cdef node_t *node = self._next_node()
+        if node == NULL:
+            raise StopIteration
+        return self.tree._entry(node, self.entry)
+
+    cdef node_t *_next_node(self) except? NULL:
+        # next node or NULL at the end of the range
+        cdef node_t *node
+        cdef node_t *child
+        if self.remaining == 0 or self.stack.is_empty():
+            return NULL
+        if self.version != self.tree.version:
+            self.remaining = 0
+            raise RuntimeError("tree changed during iteration")
+        node = self.stack.pop()
+        self.remaining -= 1
+        if self.remaining > 0:
+            child = node.link[1 - self.direction]
+            while child != NULL:
+                self.stack.push(child)
+                child = child.link[self.direction]
+        return node
+
+    cdef object _chunk(self, Py_ssize_t size, bint columns):
+        # list of the next size items or (keys, values) lists
+        cdef Py_ssize_t count = size if size < self.remaining else self.remaining
+        cdef list items = PyList_New(count)
+        cdef list values = PyList_New(count) if columns else None
+        cdef Py_ssize_t index
+        cdef node_t *node
+        for index in range(count):
+            node = self._next_node()
+            if node == NULL:  # the range is larger than the tree
+                del items[index:]
+                if columns:
+                    del values[index:]
+                break
+            if columns:
+                item = self.tree._node_key(node)
+                value = <object>node.value
+                Py_INCREF(value)
+                PyList_SET_ITEM(values, index, value)  # steals the reference
+            else:
+                item = self.tree._entry(node, ITER_ITEMS)
+            Py_INCREF(item)
+            PyList_SET_ITEM(items, index, item)
+        return (items, values) if columns else items
+
+    def __length_hint__(self):
+        return self.remaining
+
+
+cdef class _BinaryTree(_BaseTree):
+    def __cinit__(self, items=None, key=None):
+        self.build_tree = ct_bintree_build
+        self.split_tree = ct_bintree_split
+        self.join_trees = ct_bintree_join
+
+    cdef int _insert_item(self, key, value) except -1:
+        cdef int result
+        self.version += 1
+        result = ct_bintree_insert(self._pool(), &self.root, key, value)
+        self.count += result
+        return result
+
+    cdef int _remove_item(self, key) except -1:
+        cdef int result
+        self.version += 1
+        result = ct_bintree_remove(self._pool(), &self.root, key)
+        self.count -= result
+        return result
+
+    cdef int _setdefault_node(self, key, value, node_t **nodeaddr) except -1:
+        cdef int result
+        self.version += 1
+        result = ct_bintree_setdefault(self._pool(), &self.root, key, value, nodeaddr)
+        self.count += result
+        return result
+
+    cdef int _pop_node(self, key, int target, PyObject **keyaddr, PyObject **valueaddr) except -1:
+        cdef int result
+        self.version += 1
+        result = ct_bintree_pop(self._pool(), &self.root, key, target, keyaddr, valueaddr)
+        self.count -= result
+        return result
+
+
+cdef class _AVLTree(_BaseTree):
+    def __cinit__(self, items=None, key=None):
+        self.build_tree = avl_build
+        self.split_tree = avl_split
+        self.join_trees = avl_join
+
+    cdef int _insert_item(self, key, value) except -1:
+        cdef int result
+        self.version += 1
+        result = avl_insert(self._pool(), &self.root, key, value)
+        self.count += result
+        return result
+
+    cdef int _remove_item(self, key) except -1:
+        cdef int result
+        self.version += 1
+        result = avl_remove(self._pool(), &self.root, key)
+        self.count -= result
+        return result
+
+    cdef int _setdefault_node(self, key, value, node_t **nodeaddr) except -1:
+        cdef int result
+        self.version += 1
+        result = avl_setdefault(self._pool(), &self.root, key, value, nodeaddr)
+        self.count += result
+        return result
+
+    cdef int _pop_node(self, key, int target, PyObject **keyaddr, PyObject **valueaddr) except -1:
+        cdef int result
+        self.version += 1
+        result = avl_pop(self._pool(), &self.root, key, target, keyaddr, valueaddr)
+        self.count -= result
+        return result
+
+
+cdef class _RBTree(_BaseTree):
+    def __cinit__(self, items=None, key=None):
+        self.build_tree = rb_build
+        self.split_tree = rb_split
+        self.join_trees = rb_join
+
+    cdef int _insert_item(self, key, value) except -1:
+        cdef int result
+        self.version += 1
+        result = rb_insert(self._pool(), &self.root, key, value)
+        self.count += result
+        return result
+
+    cdef int _remove_item(self, key) except -1:
+        cdef int result
+        self.version += 1
+        result = rb_remove(self._pool(), &self.root, key)
+        self.count -= result
+        return result
+
+    cdef int _setdefault_node(self, key, value, node_t **nodeaddr) except -1:
+        cdef int result
+        self.version += 1
+        result = rb_setdefault(self._pool(), &self.root, key, value, nodeaddr)
+        self.count += result
+        return result
+
+    cdef int _pop_node(self, key, int target, PyObject **keyaddr, PyObject **valueaddr) except -1:
+        cdef int result
+        self.version += 1
+        result = rb_pop(self._pool(), &self.root, key, target, keyaddr, valueaddr)
+        self.count -= result
+        return result
@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: Red-black tree with composite tuple keys implemented in Cython/C
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+# compiled against ctrees_tuple.c, keys are compared field by field
+include "cython_trees.pxi"
+
+
+class FastTupleRBTree(_RBTree, _ABCTree):
+    pass
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# coding:utf-8
+# Author:  mozman
+# Purpose: order-preserving binary key encoding
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+"""
+Order-preserving binary encoding of keys.
+
+encode_key(k) encodes a key into a byte string, byte strings compare with
+memcmp() like the keys compare: encode_key(a) < encode_key(b) if a < b and
+encode_key(a) == encode_key(b) if a == b. decode_key(b) restores the key.
+
+Supported keys: None, bool, int, float (not NaN), str, bytes, datetime.date,
+datetime.datetime and tuples of these. Keys of different types, which are not
+comparable in Python, are ordered by type: None < numbers < bytes < str <
+date < naive datetime < aware datetime < tuple.
+
+Equal keys of different types share one encoding, decode_key() returns
+numbers as int if they are integral else as float, and aware datetimes in
+UTC.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from math import ldexp
+
+from .abctree import _TOP
+
+__all__ = ['encode_key', 'decode_key']
+
+# type tags, the tag of the tuple end sorts before all keys: shorter tuples
+# are less than longer tuples with the same leading fields
+_END = b'\x01'
+_NONE = b'\x05'
+_NEG_INF = b'\x10'
+_NEG = b'\x11'
+_ZERO = b'\x12'
+_POS = b'\x13'
+_POS_INF = b'\x14'
+_BYTES = b'\x20'
+_STR = b'\x28'
+_DATE = b'\x30'
+_DATETIME = b'\x31'
+_DATETIME_TZ = b'\x32'
+_TUPLE = b'\x40'
+_GREATEST = b'\xff'  # abctree._TOP, upper bound of tuple prefix ranges
+
+_INVERT = bytes(255 - b for b in range(256))
+_MIN_UTC = datetime(1, 1, 1, tzinfo=timezone.utc)
+_ONE_DAY = 86400 * 10 ** 6  # bias of aware datetimes, UTC can be before 0001-01-01
+
+
+def encode_key(key):
+    """encode_key(k) -> bytes, order-preserving encoding of key k.
+
+    Raises TypeError for unsupported key types and ValueError for NaN.
+    """
+    parts = []
+    _encode(key, parts.append)
+    return b''.join(parts)
+
+
+def decode_key(data):
+    """decode_key(b) -> key encoded by encode_key().
+
+    Raises ValueError if data is not a valid encoding.
+    """
+    try:
+        key, pos = _decode(data, 0)
+    except IndexError:
+        raise ValueError("truncated key encoding")
+    if pos != len(data):
+        raise ValueError("invalid key encoding")
+    return key
+
+
+def _encode(key, append):
+    if key is None:
+        append(_NONE)
+    elif isinstance(key, int):
+        _encode_number(key, 0, append)
+    elif isinstance(key, float):
+        if key != key:
+            raise ValueError("NaN is not a valid key")
+        if key == float('inf'):
+            append(_POS_INF)
+        elif key == float('-inf'):
+            append(_NEG_INF)
+        else:
+            numerator, denominator = key.as_integer_ratio()
+            _encode_number(numerator, denominator.bit_length() - 1, append)
+    elif isinstance(key, bytes):
+        append(_BYTES)
+        _encode_string(key, append)
+    elif isinstance(key, str):
+        append(_STR)
+        _encode_string(key.encode('utf-8', 'surrogatepass'), append)
+    elif isinstance(key, datetime):
+        if key.utcoffset() is None:
+            append(_DATETIME)
+            append(((key - datetime.min) // timedelta(microseconds=1)).to_bytes(8, 'big'))
+        else:
+            append(_DATETIME_TZ)
+            append(((key - _MIN_UTC) // timedelta(microseconds=1) + _ONE_DAY).to_bytes(8, 'big'))
+    elif isinstance(key, date):
+        append(_DATE)
+        append(key.toordinal().to_bytes(4, 'big'))
+    elif isinstance(key, tuple):
+        append(_TUPLE)
+        for field in key:
+            _encode(field, append)
+        append(_END)
+    elif key is _TOP:
+        append(_GREATEST)
+    else:
+        raise TypeError("unsupported key type: %s" % type(key).__name__)
+
+
+def _encode_number(numerator, shift, append):
+    # encodes numerator / 2**shift: sign tag, binary exponent and the bits
+    # after the leading 1 bit, the magnitude of negative numbers is inverted
+    if numerator == 0:
+        append(_ZERO)
+        return
+    negative = numerator < 0
+    if negative:
+        numerator = -numerator
+    width = numerator.bit_length() - 1
+    exponent = width - shift
+    fraction = numerator - (1 << width)
+    if fraction:
+        trailing = (fraction & -fraction).bit_length() - 1
+        fraction >>= trailing
+        width -= trailing
+    else:
+        width = 0
+    magnitude = _encode_exponent(exponent) + _encode_fraction(fraction, width)
+    if negative:
+        append(_NEG)
+        append(magnitude.translate(_INVERT))
+    else:
+        append(_POS)
+        append(magnitude)
+
+
+def _encode_exponent(exponent):
+    # header byte 0x80 + length for exponent >= 0, 0x80 - length for
+    # exponent < 0, followed by the big-endian bytes of the exponent
+    if exponent >= 0:
+        size = (exponent.bit_length() + 7) // 8
+        return bytes((0x80 + size,)) + exponent.to_bytes(size, 'big')
+    size = (exponent.bit_length() + 7) // 8
+    return bytes((0x80 - size,)) + ((1 << (8 * size)) - 1 + exponent).to_bytes(size, 'big')
+
+
+def _encode_fraction(fraction, width):
+    # groups of 7 bits, the lowest bit of a byte is set if more bytes follow
+    if width == 0:
+        return b'\x00'
+    padding = -width % 7
+    fraction <<= padding
+    count = (width + padding) // 7
+    groups = bytearray(count)
+    for index in range(count - 1, -1, -1):
+        groups[index] = ((fraction & 0x7f) << 1) | (index < count - 1)
+        fraction >>= 7
+    return bytes(groups)
+
+
+def _encode_string(data, append):
+    # zero bytes are escaped as 00 ff, the string ends with 00 00
+    append(data.replace(b'\x00', b'\x00\xff'))
+    append(b'\x00\x00')
+
+
+def _decode(data, pos):
+    tag = data[pos:pos + 1]
+    if not tag:
+        raise IndexError
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _ZERO:
+        return 0, pos
+    if tag == _POS or tag == _NEG:
+        return _decode_number(data, pos, tag == _NEG)
+    if tag == _POS_INF:
+        return float('inf'), pos
+    if tag == _NEG_INF:
+        return float('-inf'), pos
+    if tag == _BYTES:
+        return _decode_string(data, pos)
+    if tag == _STR:
+        value, pos = _decode_string(data, pos)
+        return value.decode('utf-8', 'surrogatepass'), pos
+    if tag == _DATETIME or tag == _DATETIME_TZ:
+        if len(data) < pos + 8:
+            raise IndexError
+        value = int.from_bytes(data[pos:pos + 8], 'big')
+        if tag == _DATETIME:
+            return datetime.min + timedelta(microseconds=value), pos + 8
+        return _MIN_UTC + timedelta(microseconds=value - _ONE_DAY), pos + 8
+    if tag == _DATE:
+        if len(data) < pos + 4:
+            raise IndexError
+        return date.fromordinal(int.from_bytes(data[pos:pos + 4], 'big')), pos + 4
+    if tag == _TUPLE:
+        fields = []
+        while data[pos:pos + 1] != _END:
+            if pos >= len(data):
+                raise IndexError
+            field, pos = _decode(data, pos)
+            fields.append(field)
+        return tuple(fields), pos + 1
+    raise ValueError("invalid key encoding")
+
+
+def _decode_number(data, pos, negative):
+    def byte(pos):
+        return 255 - data[pos] if negative else data[pos]
+
+    header = byte(pos)
+    pos += 1
+    size = abs(header - 0x80)
+    exponent = 0
+    for _ in range(size):
+        exponent = (exponent << 8) | byte(pos)
+        pos += 1
+    if header < 0x80:
+        exponent -= (1 << (8 * size)) - 1
+    fraction = width = 0
+    while True:
+        group = byte(pos)
+        pos += 1
+        fraction = (fraction << 7) | (group >> 1)
+        width += 7
+        if not group & 1:
+            break
+    if fraction == 0:
+        width = 0
+    numerator = (1 << width) | fraction
+    shift = width - exponent
+    if shift <= 0:
+        value = numerator << -shift
+    elif numerator & ((1 << shift) - 1):  # numerator of a float fits into a double
+        value = ldexp(float(numerator), -shift)
+    else:
+        value = numerator >> shift
+    return (-value if negative else value), pos
+
+
+def _decode_string(data, pos):
+    parts = []
+    while True:
+        end = data.find(b'\x00', pos)
+        if end < 0:
+            raise IndexError
+        parts.append(data[pos:end])
+        if data[end + 1] == 0x00:
+            return b''.join(parts), end + 2
+        if data[end + 1] != 0xff:
+            raise ValueError("invalid key encoding")
+        parts.append(b'\x00')
+        pos = end + 2
+
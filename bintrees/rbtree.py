@@ -41,20 +41,23 @@ __all__ = ['RBTree']
 
 class Node(object):
     """Internal object, represents a tree node."""
-    __slots__ = ['key', 'value', 'red', 'left', 'right']
+    __slots__ = ['key', 'value', 'red', 'left', 'right', 'size', 'orig_key']
 
     def __init__(self, key=None, value=None):
-        self.key = key
+        self.key = key  # key of the tree order
         self.value = value
+        self.orig_key = key  # key given by the user, key is key_function(orig_key)
         self.red = True
         self.left = None
         self.right = None
+        self.size = 1  # count of nodes in this subtree
 
     def free(self):
         self.left = None
         self.right = None
         self.key = None
         self.value = None
+        self.orig_key = None
 
     def __getitem__(self, key):
         """N.__getitem__(key) <==> x[key], where key is 0 (left) or 1 (right)."""
@@ -75,6 +78,14 @@ def is_red(node):
         return False
 
 
+def size(node):
+    return node.size if node is not None else 0
+
+
+def update_size(node):
+    node.size = size(node.left) + size(node.right) + 1
+
+
 def jsw_single(root, direction):
     other_side = 1 - direction
     save = root[other_side]
@@ -82,6 +93,8 @@ def jsw_single(root, direction):
     save[direction] = root
     root.red = True
     save.red = False
+    update_size(root)
+    update_size(save)
     return save
 
 
@@ -91,6 +104,96 @@ def jsw_double(root, direction):
     return jsw_single(root, direction)
 
 
+def rotate(root, direction):
+    """Rotate in direction without changing the colors."""
+    other_side = 1 - direction
+    save = root[other_side]
+    root[other_side] = save[direction]
+    save[direction] = root
+    update_size(root)
+    update_size(save)
+    return save
+
+
+def black_height(node):
+    result = 0
+    while node is not None:
+        if not node.red:
+            result += 1
+        node = node.left
+    return result
+
+
+def join_direction(big, big_bh, mid, small, small_bh, direction):
+    """Join tree big with the tree small of lower black height at side
+    direction, the root of small is black.
+    """
+    other_side = 1 - direction
+    if big_bh == small_bh and not is_red(big):
+        mid[other_side] = big
+        mid[direction] = small
+        mid.red = True
+        update_size(mid)
+        return mid
+    child = join_direction(big[direction], big_bh - (0 if big.red else 1), mid, small, small_bh, direction)
+    big[direction] = child
+    update_size(big)
+    if not big.red and is_red(child) and is_red(child[direction]):
+        # fix red violation
+        child[direction].red = False
+        return rotate(big, other_side)
+    return big
+
+
+def join(left, left_bh, mid, right, right_bh):
+    """Join subtrees left and right with node mid in between, returns the
+    new root and its black height.
+    """
+    if is_red(left):
+        left.red = False
+        left_bh += 1
+    if is_red(right):
+        right.red = False
+        right_bh += 1
+    if left_bh > right_bh:
+        root = join_direction(left, left_bh, mid, right, right_bh, 1)
+        bh = left_bh
+    elif right_bh > left_bh:
+        root = join_direction(right, right_bh, mid, left, left_bh, 0)
+        bh = right_bh
+    else:
+        mid.left = left
+        mid.right = right
+        mid.red = True
+        update_size(mid)
+        root = mid
+        bh = left_bh
+    if root.red:
+        root.red = False
+        bh += 1
+    return root, bh
+
+
+def split(node, bh, index):
+    """Split subtree node with black height bh into the subtrees of the first
+    index nodes in key order and of the other nodes, returns both roots and
+    their black heights.
+    """
+    if node is None:
+        return None, 0, None, 0
+    child_bh = bh - (0 if node.red else 1)
+    left = node.left
+    right = node.right
+    left_size = 0 if left is None else left.size
+    if left_size < index:
+        split_left, split_left_bh, split_right, split_right_bh = split(right, child_bh, index - left_size - 1)
+        split_left, split_left_bh = join(left, child_bh, node, split_left, split_left_bh)
+    else:
+        split_left, split_left_bh, split_right, split_right_bh = split(left, child_bh, index)
+        split_right, split_right_bh = join(split_right, split_right_bh, node, right, child_bh)
+    return split_left, split_left_bh, split_right, split_right_bh
+
+
 class RBTree(ABCTree):
     """
     RBTree implements a balanced binary tree with a dict-like interface.
@@ -120,12 +223,29 @@ class RBTree(ABCTree):
         self._count += 1
         return Node(key, value)
 
-    def insert(self, key, value):
-        """T.insert(key, value) <==> T[key] = value, insert key, value into tree."""
+    def _init_built_node(self, node, height, lowest_level):
+        node.red = lowest_level
+
+    def _join_nodes(self, left, mid, right):
+        """Join subtrees left and right with node mid in between."""
+        return join(left, black_height(left), mid, right, black_height(right))[0]
+
+    def _split_nodes(self, node, index):
+        """Split subtree node into the subtrees of the first index nodes in
+        key order and of the other nodes, returns the roots of both subtrees.
+        """
+        left, _, right, _ = split(node, black_height(node), index)
+        return left, right
+
+    def _insert_node(self, key, value, replace):
+        """Insert key, value into tree, replace the value of an existing key
+        only if replace is True, returns (node of key, True for a new node).
+        """
+        self._version += 1
         if self._root is None:  # Empty tree case
             self._root = self._new_node(key, value)
             self._root.red = False  # make root black
-            return
+            return self._root, True
 
         head = Node()  # False tree root
         grand_parent = None
@@ -133,6 +253,8 @@ class RBTree(ABCTree):
         parent = None  # parent
         direction = 0
         last = 0
+        path = []  # search path, for updating subtree sizes
+        new_node = False
 
         # Set up helpers
         grand_grand_parent.right = self._root
@@ -142,10 +264,12 @@ class RBTree(ABCTree):
             if node is None:  # Insert new node at the bottom
                 node = self._new_node(key, value)
                 parent[direction] = node
+                new_node = True
             elif is_red(node.left) and is_red(node.right):  # Color flip
                 node.red = True
                 node.left.red = False
                 node.right.red = False
+            path.append(node)
 
             # Fix red violation
             if is_red(node) and is_red(parent):
@@ -157,7 +281,8 @@ class RBTree(ABCTree):
 
             # Stop if found
             if key == node.key:
-                node.value = value  # set new value for key
+                if replace and not new_node:
+                    node.value = value  # set new value for key
                 break
 
             last = direction
@@ -169,11 +294,16 @@ class RBTree(ABCTree):
             parent = node
             node = node[direction]
 
+        if new_node:  # rotations moved nodes, but the path nodes are still ancestors
+            for path_node in reversed(path):
+                update_size(path_node)
         self._root = head.right  # Update root
         self._root.red = False  # make root black
+        return node, new_node
 
-    def remove(self, key):
-        """T.remove(key) <==> del T[key], remove item <key> from tree."""
+    def _remove_node(self, key):
+        """Remove item <key> from tree, returns the removed (key, value) pair."""
+        self._version += 1
         if self._root is None:
             raise KeyError(str(key))
         head = Node()  # False tree root
@@ -183,6 +313,7 @@ class RBTree(ABCTree):
         grand_parent = None
         found = None  # Found item
         direction = 1
+        path = []  # search path, for updating subtree sizes
 
         # Search and push a red down
         while node[direction] is not None:
@@ -192,6 +323,7 @@ class RBTree(ABCTree):
             grand_parent = parent
             parent = node
             node = node[direction]
+            path.append(node)
 
             direction = 1 if key > node.key else 0
 
@@ -204,6 +336,7 @@ class RBTree(ABCTree):
                 if is_red(node[1 - direction]):
                     parent[last] = jsw_single(node, direction)
                     parent = parent[last]
+                    path.insert(-1, parent)
                 elif not is_red(node[1 - direction]):
                     sibling = parent[1 - last]
                     if sibling is not None:
@@ -218,6 +351,7 @@ class RBTree(ABCTree):
                                 grand_parent[direction2] = jsw_double(parent, last)
                             elif is_red(sibling[1 - last]):
                                 grand_parent[direction2] = jsw_single(parent, last)
+                            path.insert(-2, grand_parent[direction2])
                             # Ensure correct coloring
                             grand_parent[direction2].red = True
                             node.red = True
@@ -226,9 +360,13 @@ class RBTree(ABCTree):
 
         # Replace and remove if found
         if found is not None:
+            item = found.orig_key, found.value
             found.key = node.key
+            found.orig_key = node.orig_key
             found.value = node.value
             parent[int(parent.right is node)] = node[int(node.left is None)]
+            for parent in reversed(path[:-1]):
+                update_size(parent)
             node.free()
             self._count -= 1
 
@@ -238,3 +376,4 @@ class RBTree(ABCTree):
             self._root.red = False
         if not found:
             raise KeyError(str(key))
+        return item
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# coding:utf-8
+# Author:  mozman
+# Purpose: TreeCursor
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+
+class TreeCursor(object):
+    """Stateful bidirectional cursor over the Python trees.
+
+    The cursor keeps the path from the root to the current node, next() and
+    prev() cost amortized O(1), seek() costs O(log(n)).
+
+    Modifying the tree invalidates the path, the next access re-seeks the
+    key of the current item, O(log(n)).
+    """
+    __slots__ = ['_tree', '_path', '_key', '_version', '_removed']
+
+    def __init__(self, tree, key=None):
+        self._tree = tree
+        self._path = []
+        self._key = None  # tree-order key of the current item, survives removal of its node
+        self._version = tree._version
+        self._removed = False  # the current item was removed, next() and prev() re-seek its key
+        if key is None:
+            self.first()
+        else:
+            self.seek(key)
+
+    def __repr__(self):
+        if self.valid:
+            return "%s(%r: %r)" % (self.__class__.__name__, self.key, self.value)
+        return "%s()" % self.__class__.__name__
+
+    @property
+    def valid(self):
+        """True if the cursor is positioned on an item."""
+        self._sync(0)
+        return len(self._path) > 0
+
+    @property
+    def key(self):
+        """Key of the current item, raises KeyError if the cursor is invalid."""
+        return self._node().orig_key
+
+    @property
+    def value(self):
+        """Value of the current item, raises KeyError if the cursor is invalid."""
+        return self._node().value
+
+    @property
+    def item(self):
+        """(key, value) of the current item, raises KeyError if the cursor is invalid."""
+        node = self._node()
+        return node.orig_key, node.value
+
+    def set_value(self, value):
+        """Replace the value of the current item, raises KeyError if the cursor is invalid."""
+        self._node().value = value
+
+    def first(self):
+        """Move to the item with the smallest key, returns False if tree is empty."""
+        self._reset()
+        path = self._path
+        node = self._tree._root
+        while node is not None:
+            path.append(node)
+            node = node.left
+        return self._positioned()
+
+    def last(self):
+        """Move to the item with the largest key, returns False if tree is empty."""
+        self._reset()
+        path = self._path
+        node = self._tree._root
+        while node is not None:
+            path.append(node)
+            node = node.right
+        return self._positioned()
+
+    def seek(self, key):
+        """Move to the item with the smallest key greater than or equal to
+        key, returns False if there is no such key.
+        """
+        return self._seek(self._tree._sort_key(key))
+
+    def _seek(self, key):
+        self._reset()
+        path = self._path
+        node = self._tree._root
+        depth = 0
+        try:
+            while node is not None:
+                path.append(node)
+                if key == node.key:
+                    return self._positioned()
+                elif key < node.key:
+                    depth = len(path)
+                    node = node.left
+                else:
+                    node = node.right
+        except Exception:  # incomparable key, invalidates the cursor
+            self._reset()
+            self._positioned()
+            raise
+        del path[depth:]
+        return self._positioned()
+
+    def seek_floor(self, key):
+        """Move to the item with the greatest key less than or equal to
+        key, returns False if there is no such key.
+        """
+        return self._seek_floor(self._tree._sort_key(key))
+
+    def _seek_floor(self, key):
+        self._reset()
+        path = self._path
+        node = self._tree._root
+        depth = 0
+        try:
+            while node is not None:
+                path.append(node)
+                if key == node.key:
+                    return self._positioned()
+                elif key < node.key:
+                    node = node.left
+                else:
+                    depth = len(path)
+                    node = node.right
+        except Exception:  # incomparable key, invalidates the cursor
+            self._reset()
+            self._positioned()
+            raise
+        del path[depth:]
+        return self._positioned()
+
+    def next(self):
+        """Move to the next item in ascending key order, returns False and
+        invalidates the cursor if the current item is the last item.
+        """
+        if not self._sync(+1):
+            return len(self._path) > 0
+        return self._step(1)
+
+    def prev(self):
+        """Move to the previous item in ascending key order, returns False
+        and invalidates the cursor if the current item is the first item.
+        """
+        if not self._sync(-1):
+            return len(self._path) > 0
+        return self._step(0)
+
+    def _step(self, direction):
+        path = self._path
+        if not path:
+            return False
+        other = 1 - direction
+        node = path[-1][direction]
+        if node is not None:
+            while node is not None:
+                path.append(node)
+                node = node[other]
+        else:
+            child = path.pop()
+            while path and path[-1][direction] is child:
+                child = path.pop()
+        return self._positioned()
+
+    def _positioned(self):
+        path = self._path
+        if path:
+            self._key = path[-1].key
+            return True
+        self._key = None
+        return False
+
+    def _reset(self):
+        del self._path[:]
+        self._version = self._tree._version
+        self._removed = False
+
+    def _node(self):
+        self._sync(0)
+        if not self._path:
+            raise KeyError("cursor is not positioned on an item")
+        return self._path[-1]
+
+    def _sync(self, direction):
+        """Re-seek the current key if the tree was modified.
+
+        Returns True if the cursor is still positioned on its key, else the
+        cursor is moved to the nearest item in the given direction (+1 next,
+        -1 prev) and False is returned. Direction 0 leaves the cursor without
+        item, but keeps the key of the removed item for next() and prev().
+        """
+        if self._version == self._tree._version and not self._removed:
+            return True
+        if not self._path and not self._removed:
+            self._version = self._tree._version
+            return True
+        key = self._key
+        if direction < 0:
+            self._seek_floor(key)
+        else:
+            self._seek(key)
+        if self._path and self._path[-1].key == key:
+            return True
+        if direction == 0:
+            self._reset()
+            self._key = key
+            self._removed = True
+        return False
@@ -8,6 +8,13 @@
 
 
 class TreeSlice(object):
+    """Read/write view of the items of a tree with start <= key < stop, a
+    bound None means no limit.
+
+    len(), the min and max items and the first item of an iteration are
+    located by the order statistics of the tree in O(log(n)), clear() and
+    pop_min()/pop_max() modify the tree.
+    """
     __slots__ = ['_tree', '_start', '_stop']
 
     def __init__(self, tree, start, stop):
@@ -26,9 +33,11 @@ class TreeSlice(object):
             return False
 
     def _is_in_range(self, key):
-        if self._start is not None and key < self._start:
+        sort_key = self._tree._sort_key
+        key = sort_key(key)
+        if self._start is not None and key < sort_key(self._start):
             return False
-        if self._stop is not None and key >= self._stop:
+        if self._stop is not None and not (key < sort_key(self._stop)):
             return False
         return True
 
@@ -47,7 +56,7 @@ class TreeSlice(object):
             elif self._start is None:
                 return start
             else:
-                return max(start, self._start)
+                return max(start, self._start, key=self._tree._sort_key)
 
         def newstop():
             if stop is None:
@@ -55,17 +64,101 @@ class TreeSlice(object):
             elif self._stop is None:
                 return stop
             else:
-                return min(stop, self._stop)
+                return min(stop, self._stop, key=self._tree._sort_key)
 
         return TreeSlice(self._tree, newstart(), newstop())
 
-    def keys(self):
-        return self._tree.key_slice(self._start, self._stop)
+    def __setitem__(self, key, value):
+        if not self._is_in_range(key):
+            raise KeyError(key)
+        self._tree[key] = value
+
+    def __delitem__(self, key):
+        if not self._is_in_range(key):
+            raise KeyError(key)
+        del self._tree[key]
+
+    def get(self, key, default=None):
+        return self._tree.get(key, default) if self._is_in_range(key) else default
+
+    def __len__(self):
+        lo, hi = self._index_range()
+        return hi - lo
+
+    def _index_range(self):
+        # indices lo <= index < hi of the items in range, O(log(n))
+        tree = self._tree
+        lo = 0 if self._start is None else tree.bisect_left(self._start)
+        hi = len(tree) if self._stop is None else tree.bisect_left(self._stop)
+        return lo, max(lo, hi)
+
+    def keys(self, reverse=False):
+        return self._tree.key_slice(self._start, self._stop, reverse)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __reversed__(self):
+        return iter(self.keys(reverse=True))
+
+    def values(self, reverse=False):
+        return self._tree.value_slice(self._start, self._stop, reverse)
+
+    def items(self, reverse=False):
+        return self._tree.iter_items(self._start, self._stop, reverse)
+
+    def min_item(self):
+        """Get item with min key of the slice, raises ValueError if the slice
+        is empty.
+        """
+        lo, hi = self._index_range()
+        if lo == hi:
+            raise ValueError("TreeSlice is empty")
+        return self._tree.select(lo)
+
+    def max_item(self):
+        """Get item with max key of the slice, raises ValueError if the slice
+        is empty.
+        """
+        lo, hi = self._index_range()
+        if lo == hi:
+            raise ValueError("TreeSlice is empty")
+        return self._tree.select(hi - 1)
+
+    def min_key(self):
+        return self.min_item()[0]
+
+    def max_key(self):
+        return self.max_item()[0]
+
+    def pop(self, key, *args):
+        """S.pop(k[,d]) -> v, remove key k of the slice from the tree and return
+        its value, d if given and k is not in the slice else raises KeyError.
+        """
+        if self._is_in_range(key):
+            return self._tree.pop(key, *args)
+        if args:
+            return args[0]
+        raise KeyError(key)
 
-    __iter__ = keys
+    def pop_min(self):
+        """S.pop_min() -> (k, v), remove the item with the min key of the slice
+        from the tree, raises ValueError if the slice is empty.
+        """
+        key, value = self.min_item()
+        del self._tree[key]
+        return key, value
 
-    def values(self):
-        return self._tree.value_slice(self._start, self._stop)
+    def pop_max(self):
+        """S.pop_max() -> (k, v), remove the item with the max key of the slice
+        from the tree, raises ValueError if the slice is empty.
+        """
+        key, value = self.max_item()
+        del self._tree[key]
+        return key, value
 
-    def items(self):
-        return self._tree.iter_items(self._start, self._stop)
+    def clear(self):
+        """S.clear() -> None, remove all items of the slice from the tree,
+        del T[s:e].
+        """
+        del self._tree[self._start:self._stop]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding:utf-8
+# Author:  mozman
+# Purpose: live views of the keys, values and items of a tree
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+from collections.abc import Iterable, KeysView, ValuesView, ItemsView
+
+
+class _TreeView(object):
+    # the reverse flag of the tree views, the tree is stored as _mapping by
+    # the collections.abc views
+    __slots__ = ()
+
+    def __init__(self, tree, reverse=False):
+        super(_TreeView, self).__init__(tree)
+        self._reverse = bool(reverse)
+
+    @property
+    def mapping(self):
+        """The tree of the view."""
+        return self._mapping
+
+
+class TreeKeysView(_TreeView, KeysView):
+    """Live view of the keys of a tree, returned by T.keys().
+
+    len() is O(1), k in view O(log(n)), every iteration walks the current
+    keys of the tree, in descending order if the view is reversed. The set
+    operations &, |, - and ^ merge the sorted keys and return the keys view
+    of a new tree of the same type, values are taken from the left operand.
+    """
+    __slots__ = ['_reverse']
+
+    def __iter__(self):
+        return iter(self._mapping.key_slice(None, None, reverse=self._reverse))
+
+    def __reversed__(self):
+        return iter(self._mapping.key_slice(None, None, reverse=not self._reverse))
+
+    def _tree_of(self, keys):
+        # operand of set operations as tree, trees compare in their key order
+        tree = self._mapping
+        if isinstance(keys, TreeKeysView):
+            keys = keys._mapping
+        if isinstance(keys, type(tree)) and keys.key == tree.key:
+            return keys
+        return tree.from_keys(keys, key=tree.key)
+
+    def __and__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._mapping.intersection(self._tree_of(other)).keys()
+
+    __rand__ = __and__
+
+    def __or__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._mapping.union(self._tree_of(other)).keys()
+
+    __ror__ = __or__
+
+    def __sub__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._mapping.difference(self._tree_of(other)).keys()
+
+    def __rsub__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._tree_of(other).difference(self._mapping).keys()
+
+    def __xor__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return self._mapping.symmetric_difference(self._tree_of(other)).keys()
+
+    __rxor__ = __xor__
+
+    def isdisjoint(self, other):
+        return self._mapping.is_disjoint(self._tree_of(other))
+
+
+class TreeValuesView(_TreeView, ValuesView):
+    """Live view of the values of a tree in key order, returned by
+    T.values().
+    """
+    __slots__ = ['_reverse']
+
+    def __iter__(self):
+        return iter(self._mapping.value_slice(None, None, reverse=self._reverse))
+
+    def __reversed__(self):
+        return iter(self._mapping.value_slice(None, None, reverse=not self._reverse))
+
+    def __contains__(self, value):
+        for v in self:
+            if v is value or v == value:
+                return True
+        return False
+
+
+class TreeItemsView(_TreeView, ItemsView):
+    """Live view of the (key, value) items of a tree in key order, returned
+    by T.items().
+
+    (k, v) in view is O(log(n)), the set operations of the items are those
+    of collections.abc.ItemsView, which return sets.
+    """
+    __slots__ = ['_reverse']
+
+    def __iter__(self):
+        return iter(self._mapping.iter_items(reverse=self._reverse))
+
+    def __reversed__(self):
+        return iter(self._mapping.iter_items(reverse=not self._reverse))
@@ -20,3 +20,11 @@ for key, _ in t.item_slice(start, None):
     pass
 t1 = time.time()
 print("Iterating using item_slice(): %f sec" % (t1-t0))
+
+
+t0 = time.time()
+cursor = t.cursor(start)
+while cursor.next():
+    pass
+t1 = time.time()
+print("Iterating using cursor(): %f sec" % (t1-t0))
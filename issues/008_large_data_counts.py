@@ -0,0 +1,26 @@
+import sys
+import time
+from bintrees import FastInt64RBTree
+
+# count, rank and select of trees with more than 2**31 items, needs about
+# 90 GB of memory for the default size: python 008_large_data_counts.py [n]
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2 ** 31 + 10
+
+start = time.time()
+tree = FastInt64RBTree()
+tree.reserve(N)
+for key in range(N):
+    tree[key] = None
+    if key % 100000000 == 0:
+        print("inserted {} items, {:.0f}s".format(key, time.time() - start))
+
+assert len(tree) == N
+assert tree.count == N
+assert tree.max_key() == N - 1
+assert tree.rank(N - 1) == N - 1
+assert tree.select(N - 1) == (N - 1, None)
+assert tree.count_range(N - 10, None) == 10
+assert list(tree.key_slice(N - 3, None)) == [N - 3, N - 2, N - 1]
+print("size of tree: {} bytes".format(sys.getsizeof(tree)))
+tree.clear()
+print("finished, {:.0f}s".format(time.time() - start))
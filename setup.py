@@ -11,7 +11,27 @@ from setuptools import Extension
 
 try:
     from Cython.Distutils import build_ext
-    ext_modules = [Extension("bintrees.cython_trees", ["bintrees/ctrees.c", "bintrees/cython_trees.pyx"]),
+    # all extensions share the tree functions and the Cython code, the typed
+    # trees store int64 or float64 keys as C values in the nodes or compare
+    # bytes, str or tuple keys in C
+    depends = ["bintrees/ctrees.c", "bintrees/ctrees.h", "bintrees/ctrees.pxd", "bintrees/cython_trees.pxi"]
+    ext_modules = [Extension("bintrees.cython_trees", ["bintrees/ctrees.c", "bintrees/cython_trees.pyx"],
+                             depends=depends),
+                   Extension("bintrees.cython_int64_trees",
+                             ["bintrees/ctrees_int64.c", "bintrees/cython_int64_trees.pyx"],
+                             define_macros=[("CT_INT64_KEYS", None)], depends=depends),
+                   Extension("bintrees.cython_float64_trees",
+                             ["bintrees/ctrees_float64.c", "bintrees/cython_float64_trees.pyx"],
+                             define_macros=[("CT_FLOAT64_KEYS", None)], depends=depends),
+                   Extension("bintrees.cython_bytes_trees",
+                             ["bintrees/ctrees_bytes.c", "bintrees/cython_bytes_trees.pyx"],
+                             define_macros=[("CT_BYTES_KEYS", None)], depends=depends),
+                   Extension("bintrees.cython_str_trees",
+                             ["bintrees/ctrees_str.c", "bintrees/cython_str_trees.pyx"],
+                             define_macros=[("CT_STR_KEYS", None)], depends=depends),
+                   Extension("bintrees.cython_tuple_trees",
+                             ["bintrees/ctrees_tuple.c", "bintrees/cython_tuple_trees.pyx"],
+                             define_macros=[("CT_TUPLE_KEYS", None)], depends=depends),
                    ]
     commands = {'build_ext': build_ext}
 except ImportError:
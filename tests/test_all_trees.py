@@ -6,15 +6,24 @@
 # Copyright (c) 2010-2017 by Manfred Moitzi
 # License: MIT License
 import sys
+import collections.abc
 PYPY = hasattr(sys, 'pypy_version_info')
 
 import unittest
 import pickle
+import operator
+from datetime import datetime
 from copy import deepcopy
 from random import randint, shuffle
 
 from bintrees import BinaryTree, AVLTree, RBTree, has_fast_tree_support
 from bintrees import FastBinaryTree, FastAVLTree, FastRBTree
+from bintrees.keycodec import encode_key
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 set3 = [34, 67, 89, 123, 3, 7, 9, 2, 0, 999]
 
@@ -37,6 +46,28 @@ def randomkeys(num, maxnum=100000):
     return list(keys)
 
 
+class BrokenKey(object):
+    def __lt__(self, other):
+        raise ValueError('boom')
+
+    __le__ = __gt__ = __ge__ = __lt__
+
+
+class LessThanKey(object):
+    # orders by __lt__ and __eq__ only, like the sort functions of Python
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
 class TestCythonSupport(unittest.TestCase):
     def test_cython_support(self):
         if PYPY:
@@ -879,6 +910,768 @@ class CheckTree(object):
         tree1.foreach(lambda k, v: None)
         self.assertTrue(True)
 
+    def test_104_iter_items_range(self):
+        keys = randomkeys(300, maxnum=1000)
+        shuffle(keys)
+        tree = self.TREE_CLASS.fromkeys(keys)
+        keys.sort()
+        for start, end in [(None, None), (None, 500), (500, None), (250, 750), (-1, 1001), (400, 401), (600, 500)]:
+            expected = [k for k in keys if (start is None or k >= start) and (end is None or k < end)]
+            self.assertEqual(list(tree.key_slice(start, end)), expected)
+            self.assertEqual(list(tree.key_slice(start, end, reverse=True)), list(reversed(expected)))
+
+    def test_105_iter_items_range_bounds_are_keys(self):
+        # values: 1, 2, 3, 4, 8, 9, 10, 11
+        tree = self.TREE_CLASS(self.slicetest_data)
+        self.assertEqual(list(tree.key_slice(2, 9)), [2, 3, 4, 8])
+        self.assertEqual(list(tree.key_slice(2, 9, reverse=True)), [8, 4, 3, 2])
+        self.assertEqual(list(tree.key_slice(5, 8)), [])
+        self.assertEqual(list(tree.key_slice(12, None)), [])
+        self.assertEqual(list(tree.key_slice(None, 1, reverse=True)), [])
+
+    def test_106_cursor_walk(self):
+        keys = randomkeys(200, maxnum=1000)
+        shuffle(keys)
+        tree = self.TREE_CLASS.fromkeys(keys)
+        keys.sort()
+        cursor = tree.cursor()
+        result = []
+        while cursor.valid:
+            result.append(cursor.key)
+            cursor.next()
+        self.assertEqual(result, keys)
+        self.assertTrue(cursor.last())
+        result = [cursor.key]
+        while cursor.prev():
+            result.append(cursor.key)
+        self.assertEqual(result, list(reversed(keys)))
+        self.assertFalse(cursor.valid)
+
+    def test_107_cursor_seek(self):
+        # values: 1, 2, 3, 4, 8, 9, 10, 11
+        tree = self.TREE_CLASS(self.slicetest_data)
+        cursor = tree.cursor(5)
+        self.assertEqual(cursor.item, (8, 8))
+        self.assertTrue(cursor.seek(2))
+        self.assertEqual(cursor.key, 2)
+        self.assertTrue(cursor.seek_floor(7))
+        self.assertEqual(cursor.key, 4)
+        self.assertTrue(cursor.prev())
+        self.assertEqual(cursor.key, 3)
+        self.assertFalse(cursor.seek(12))
+        self.assertFalse(cursor.valid)
+        self.assertRaises(KeyError, getattr, cursor, 'key')
+        self.assertFalse(cursor.seek_floor(0))
+        self.assertFalse(self.TREE_CLASS().cursor().valid)
+
+    def test_108_cursor_set_value(self):
+        tree = self.TREE_CLASS(self.slicetest_data)
+        cursor = tree.cursor(3)
+        cursor.set_value('three')
+        self.assertEqual(cursor.value, 'three')
+        self.assertEqual(tree[3], 'three')
+
+    def test_109_cursor_after_modification(self):
+        # values: 1, 2, 3, 4, 8, 9, 10, 11
+        tree = self.TREE_CLASS(self.slicetest_data)
+        cursor = tree.cursor(3)
+        for key in range(100, 120):
+            tree[key] = key
+        self.assertEqual(cursor.key, 3)
+        self.assertTrue(cursor.next())
+        self.assertEqual(cursor.key, 4)
+        del tree[4]
+        self.assertTrue(cursor.next())  # 4 is gone, moves to its successor
+        self.assertEqual(cursor.key, 8)
+        del tree[8]
+        self.assertTrue(cursor.prev())
+        self.assertEqual(cursor.key, 3)
+        del tree[3]
+        self.assertFalse(cursor.valid)
+        tree.clear()
+        self.assertFalse(cursor.first())
+
+    def test_110_rank_and_select(self):
+        keys = list(set(randomkeys(1000)))
+        shuffle(keys)
+        tree = self.TREE_CLASS()
+        for key in keys:
+            tree[key] = str(key)
+        shuffle(keys)
+        for key in keys[:500]:
+            del tree[key]
+        for key in keys[:100]:  # reinsert some keys
+            tree[key] = str(key)
+        expected = sorted(keys[:100] + keys[500:])
+        self.assertEqual(len(tree), len(expected))
+        for index, key in enumerate(expected):
+            self.assertEqual(tree.rank(key), index)
+            self.assertEqual(tree.select(index), (key, str(key)))
+        self.assertEqual(tree.select(-1), (expected[-1], str(expected[-1])))
+        self.assertRaises(IndexError, tree.select, len(expected))
+        self.assertRaises(IndexError, tree.select, -len(expected) - 1)
+        self.assertRaises(KeyError, tree.rank, -1)
+
+    def test_111_bisect(self):
+        # values: 1, 2, 3, 4, 8, 9, 10, 11
+        tree = self.TREE_CLASS(self.slicetest_data)
+        self.assertEqual(tree.bisect_left(0), 0)
+        self.assertEqual(tree.bisect_left(3), 2)
+        self.assertEqual(tree.bisect_right(3), 3)
+        self.assertEqual(tree.bisect_left(5), 4)
+        self.assertEqual(tree.bisect_right(5), 4)
+        self.assertEqual(tree.bisect_right(11), 8)
+        self.assertEqual(tree.count_range(3, 10), 4)
+        self.assertEqual(tree.count_range(None, 5), 4)
+        self.assertEqual(tree.count_range(9, None), 3)
+        self.assertEqual(tree.count_range(10, 3), 0)
+        self.assertEqual(self.TREE_CLASS().bisect_left(1), 0)
+
+    def test_112_islice(self):
+        # values: 1, 2, 3, 4, 8, 9, 10, 11
+        tree = self.TREE_CLASS(self.slicetest_data)
+        self.assertEqual(list(tree.key_islice(2, 5)), [3, 4, 8])
+        self.assertEqual(list(tree.key_islice(2, 5, reverse=True)), [8, 4, 3])
+        self.assertEqual(list(tree.key_islice(-2, None)), [10, 11])
+        self.assertEqual(list(tree.key_islice(None, 100)), list(tree.keys()))
+        self.assertEqual(list(tree.key_islice(5, 2)), [])
+        self.assertEqual(list(tree.value_islice(0, 1)), [1])
+        self.assertEqual(list(tree.item_islice(7, 8)), [(11, 11)])
+
+    def test_113_from_sorted_items(self):
+        for count in range(20):
+            items = [(key, str(key)) for key in range(0, count * 2, 2)]
+            tree = self.TREE_CLASS.from_sorted_items(items)
+            self.assertEqual(len(tree), count)
+            self.assertEqual(list(tree.items()), items)
+            for index, item in enumerate(items):
+                self.assertEqual(tree.select(index), item)
+            # the tree has to stay balanced and consistent while modified
+            for key in range(count * 2):
+                tree[key] = str(key)
+            for key in range(0, count * 2, 3):
+                del tree[key]
+            expected = [key for key in range(count * 2) if key % 3]
+            self.assertEqual(list(tree.keys()), expected)
+            self.assertEqual([tree.select(i)[0] for i in range(len(tree))], expected)
+
+    def test_114_from_sorted_keys(self):
+        tree = self.TREE_CLASS.from_sorted_keys([1, 2, 3], 'x')
+        self.assertEqual(list(tree.items()), [(1, 'x'), (2, 'x'), (3, 'x')])
+        tree = self.TREE_CLASS.from_sorted_items(dict(self.slicetest_data))
+        self.assertEqual(list(tree.items()), self.slicetest_data)
+
+    def test_115_from_sorted_items_unordered(self):
+        self.assertRaises(ValueError, self.TREE_CLASS.from_sorted_keys, [1, 3, 2])
+        self.assertRaises(ValueError, self.TREE_CLASS.from_sorted_keys, [1, 2, 2])
+
+    def test_116_set_methods_multiple_trees(self):
+        tree1 = self.TREE_CLASS((key, 'a') for key in range(0, 30))
+        tree2 = self.TREE_CLASS((key, 'b') for key in range(10, 40))
+        tree3 = self.TREE_CLASS((key, 'c') for key in range(20, 50, 2))
+        union = tree1.union(tree2, tree3)
+        self.assertEqual(list(union.keys()), list(range(40)) + list(range(40, 50, 2)))
+        self.assertEqual((union[5], union[35], union[42]), ('a', 'b', 'c'))
+        intersection = tree1.intersection(tree2, tree3)
+        self.assertEqual(list(intersection.items()), [(key, 'a') for key in range(20, 30, 2)])
+        difference = tree1.difference(tree2, tree3)
+        self.assertEqual(list(difference.keys()), list(range(10)))
+        self.assertEqual(list((tree2 ^ tree3).keys()), list(range(10, 20)) + list(range(21, 40, 2)) + list(range(40, 50, 2)))
+
+    def test_117_set_methods_small_and_large_tree(self):
+        large = self.TREE_CLASS.from_sorted_keys(range(1000), 'large')
+        small = self.TREE_CLASS.from_keys([-1, 10, 500, 2000], 'small')
+        self.assertEqual(list((large & small).items()), [(10, 'large'), (500, 'large')])
+        self.assertEqual(list((small & large).items()), [(10, 'small'), (500, 'small')])
+        self.assertFalse(small.is_subset(large))
+        del small[-1]
+        del small[2000]
+        self.assertTrue(small.is_subset(large))
+        self.assertTrue(large.is_superset(small))
+        self.assertFalse(large.is_subset(small))
+        self.assertFalse(large.is_disjoint(small))
+        self.assertTrue(large.is_disjoint(self.TREE_CLASS.from_keys([-5, 1005])))
+        self.assertTrue(large.is_disjoint(self.TREE_CLASS()))
+
+    def test_118_set_methods_unhashable_keys(self):
+        tree1 = self.TREE_CLASS.from_keys([[1], [2], [3]])
+        tree2 = self.TREE_CLASS.from_keys([[2], [3], [4]])
+        self.assertEqual(list((tree1 & tree2).keys()), [[2], [3]])
+        self.assertEqual(list((tree1 | tree2).keys()), [[1], [2], [3], [4]])
+        self.assertEqual(list((tree1 - tree2).keys()), [[1]])
+        self.assertEqual(list((tree1 ^ tree2).keys()), [[1], [4]])
+        self.assertFalse(tree1.is_subset(tree2))
+        self.assertFalse(tree1.is_disjoint(tree2))
+
+    def test_119_set_methods_with_mapping(self):
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        self.assertEqual(list(tree.intersection({3: 0, 2: 0, 7: 0}).keys()), [2, 3])
+        self.assertTrue(tree.is_subset({3: 0, 1: 0, 2: 0, 7: 0}))
+
+    def test_120_split(self):
+        keys = list(range(0, 200, 2))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys)
+        left, right = tree.split(101)
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(list(left.keys()), list(range(0, 101, 2)))
+        self.assertEqual(list(right.keys()), list(range(102, 200, 2)))
+        self.assertEqual(left.select(-1), (100, None))
+        self.assertEqual(right.rank(102), 0)
+        left, right = right.split(102)  # split key exists
+        self.assertEqual((len(left), len(right)), (0, 49))
+        self.assertEqual(right.min_key(), 102)
+        left, right = right.split(1000)
+        self.assertEqual((len(left), len(right)), (49, 0))
+
+    def test_121_split_keeps_trees_balanced(self):
+        tree = self.TREE_CLASS.from_keys(range(1000))
+        left, right = tree.split(333)
+        for key in range(0, 333, 3):
+            del left[key]
+        for key in range(333, 1000, 3):
+            del right[key]
+        for key in range(-100, 0):
+            left[key] = key
+        self.assertEqual(list(left.keys()), list(range(-100, 0)) + [key for key in range(333) if key % 3])
+        self.assertEqual(list(right.keys()), [key for key in range(333, 1000) if key % 3])
+
+    def test_122_join(self):
+        tree = self.TREE_CLASS.from_keys(range(10))
+        other = self.TREE_CLASS.from_keys(range(10, 1000))
+        tree.join(other)
+        self.assertEqual(len(other), 0)
+        self.assertEqual(list(tree.keys()), list(range(1000)))
+        self.assertEqual([tree.select(index)[0] for index in range(1000)], list(range(1000)))
+        tree.join(self.TREE_CLASS.from_keys([1000]))
+        self.assertEqual(tree.max_key(), 1000)
+        empty = self.TREE_CLASS()
+        empty.join(tree)
+        self.assertEqual(len(empty), 1001)
+        empty.join(tree)  # join an empty tree
+        self.assertEqual(len(empty), 1001)
+
+    def test_123_join_invalid_keys(self):
+        tree = self.TREE_CLASS.from_keys([1, 5])
+        self.assertRaises(ValueError, tree.join, self.TREE_CLASS.from_keys([5, 6]))
+        self.assertRaises(ValueError, tree.join, tree)
+        self.assertEqual(list(tree.keys()), [1, 5])
+
+    def test_124_join_other_tree_type(self):
+        tree = self.TREE_CLASS.from_keys([1, 2])
+        other = RBTree.from_keys([3, 4]) if self.TREE_CLASS is not RBTree else AVLTree.from_keys([3, 4])
+        tree.join(other)
+        self.assertEqual(list(tree.keys()), [1, 2, 3, 4])
+        self.assertEqual(len(other), 0)
+
+    def test_125_delslice_large_range(self):
+        tree = self.TREE_CLASS.from_keys(range(1000))
+        del tree[100:900]
+        self.assertEqual(list(tree.keys()), list(range(100)) + list(range(900, 1000)))
+        self.assertEqual(tree.rank(900), 100)
+        del tree[50:50]
+        self.assertEqual(len(tree), 200)
+        del tree[:10]
+        del tree[990:]
+        self.assertEqual(list(tree.keys()), list(range(10, 100)) + list(range(900, 990)))
+        tree[500] = 500  # tree is still valid
+        self.assertEqual(tree.rank(500), 90)
+
+    def test_126_setslice(self):
+        # values: 1, 2, 3, 4, 8, 9, 10, 11
+        tree = self.TREE_CLASS(self.slicetest_data)
+        tree[3:10] = [(5, 'a'), (6, 'b')]
+        self.assertEqual(list(tree.items()), [(1, 1), (2, 2), (5, 'a'), (6, 'b'), (10, 10), (11, 11)])
+        tree[:3] = {0: 'c'}
+        self.assertEqual(list(tree.keys()), [0, 5, 6, 10, 11])
+        tree[10:] = []
+        self.assertEqual(list(tree.keys()), [0, 5, 6])
+        tree.replace_range(None, None, [(7, 7)])
+        self.assertEqual(list(tree.items()), [(7, 7)])
+
+    def test_127_setslice_invalid_items(self):
+        tree = self.TREE_CLASS(self.slicetest_data)
+        with self.assertRaises(ValueError):
+            tree[3:10] = [(5, 'a'), (10, 'b')]
+        with self.assertRaises(ValueError):
+            tree[3:10] = [(2, 'a')]
+        with self.assertRaises(ValueError):
+            tree[3:10] = [(6, 'a'), (5, 'b')]
+        self.assertEqual(list(tree.items()), self.slicetest_data)
+
+    def test_128_get_and_contains_without_exceptions(self):
+        tree = self.TREE_CLASS([(1, None), (2, 'two')])
+        self.assertIsNone(tree.get(1, 'default'))
+        self.assertEqual(tree.get(2), 'two')
+        self.assertEqual(tree.get(3, 'default'), 'default')
+        self.assertIsNone(tree.get(3))
+        self.assertTrue(1 in tree)
+        self.assertFalse(3 in tree)
+        self.assertIsNone(tree.set_default(1, 'default'))
+        self.assertEqual(tree.set_default(3, 'three'), 'three')
+        self.assertIsNone(tree.pop(1, 'default'))
+        self.assertEqual(tree.pop(1, 'default'), 'default')
+        self.assertRaises(KeyError, tree.pop, 1)
+        self.assertFalse(self.TREE_CLASS().__contains__(1))
+
+    def test_129_pop_min_max_keep_order_statistics(self):
+        keys = list(range(200))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys, 'x')
+        self.assertEqual(tree.pop_min(), (0, 'x'))
+        self.assertEqual(tree.pop_max(), (199, 'x'))
+        self.assertEqual(tree.pop(100), 'x')
+        self.assertEqual(len(tree), 197)
+        self.assertEqual(tree.select(0), (1, 'x'))
+        self.assertEqual(tree.select(-1), (198, 'x'))
+        self.assertEqual(tree.rank(101), 99)
+        while tree:
+            tree.pop_min()
+        self.assertRaises(ValueError, tree.pop_min)
+        self.assertRaises(ValueError, tree.pop_max)
+
+    def test_130_update_value(self):
+        tree = self.TREE_CLASS()
+        for key in [3, 1, 3, 2, 3, 1]:
+            tree.update_value(key, lambda count: count + 1, 0)
+        self.assertEqual(list(tree.items()), [(1, 2), (2, 1), (3, 3)])
+        self.assertEqual(tree.update_value(4, lambda value: [value], 'x'), ['x'])
+        self.assertEqual(tree[4], ['x'])
+
+    def test_131_update_value_func_raises(self):
+        tree = self.TREE_CLASS([(1, 1)])
+
+        def fail(value):
+            raise ZeroDivisionError()
+
+        self.assertRaises(ZeroDivisionError, tree.update_value, 2, fail, 0)
+        self.assertFalse(2 in tree)
+        self.assertRaises(ZeroDivisionError, tree.update_value, 1, fail)
+        self.assertEqual(list(tree.items()), [(1, 1)])
+
+    def test_132_update_value_func_modifies_tree(self):
+        tree = self.TREE_CLASS([(1, 1)])
+
+        def add_key(value):
+            for key in range(10, 20):
+                tree.insert(key, key)
+            return value + 1
+
+        self.assertEqual(tree.update_value(1, add_key), 2)
+        self.assertEqual(tree[1], 2)
+        self.assertEqual(len(tree), 11)
+
+    def test_133_mapping_protocol(self):
+        tree = self.TREE_CLASS()
+        for key in [5, 3, 8, 1]:
+            tree[key] = str(key)
+        tree[3] = 'three'
+        self.assertEqual(len(tree), 4)
+        self.assertEqual(tree[3], 'three')
+        self.assertRaises(KeyError, tree.__getitem__, 4)
+        self.assertTrue(8 in tree)
+        self.assertFalse(4 in tree)
+        self.assertEqual(list(tree), [1, 3, 5, 8])
+        self.assertEqual(list(reversed(tree)), [8, 5, 3, 1])
+        self.assertEqual(list(tree[3:8]), [3, 5])
+        del tree[5]
+        self.assertRaises(KeyError, tree.__delitem__, 5)
+        tree[2:4] = [(2, 'two')]
+        del tree[:2]
+        self.assertEqual(list(tree.items()), [(2, 'two'), (8, '8')])
+        self.assertTrue(tree)
+        self.assertFalse(self.TREE_CLASS())
+
+    def test_134_builtin_key_types_order(self):
+        key_lists = [
+            [-2 ** 70, -2 ** 40, -1, 0, 1, 2 ** 31, 2 ** 63, 2 ** 100],
+            [float('-inf'), -1.5, -0.0, 1e-300, 2.5, 1e300, float('inf')],
+            ['', 'A', 'a', 'aa', 'ab', '\xe4', '\u20ac', '\U0001f600'],
+            [b'', b'\x00', b'\x00\x00', b'a', b'ab', b'b', b'\xff'],
+            [-1, 0.5, 1, 1.5, 2 ** 64, 2.0 ** 65],  # mixed int and float keys
+        ]
+        for keys in key_lists:
+            shuffled = list(keys)
+            shuffle(shuffled)
+            tree = self.TREE_CLASS.from_keys(shuffled)
+            self.assertEqual(list(tree.keys()), keys)
+            for index, key in enumerate(keys):
+                self.assertTrue(key in tree)
+                self.assertEqual(tree.rank(key), index)
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        self.assertTrue(2.0 in tree)
+        self.assertTrue(True in tree)
+        self.assertFalse(2.5 in tree)
+
+    def test_135_prefix_scans(self):
+        keys = ['', 'a', 'ab', 'abc', 'abd', 'ab\U0010ffff', 'ab\U0010ffffz', 'ac', 'b', '\U0010ffff', '\U0010ffffa']
+        tree = self.TREE_CLASS.from_keys(keys)
+        for prefix in ['', 'a', 'ab', 'abc', 'ab\U0010ffff', 'b', 'x', '\U0010ffff', 'abcd']:
+            expected = sorted(key for key in keys if key.startswith(prefix))
+            self.assertEqual(list(tree.prefix_keys(prefix)), expected)
+            self.assertEqual(list(tree.prefix_keys(prefix, reverse=True)), expected[::-1])
+            self.assertEqual([k for k, v in tree.prefix_items(prefix)], expected)
+            self.assertEqual(tree.prefix_count(prefix), len(expected))
+
+        keys = [b'', b'a', b'a\x00', b'a\xff', b'a\xff\xff', b'b', b'\xff', b'\xff\x01']
+        tree = self.TREE_CLASS.from_keys(keys)
+        for prefix in [b'', b'a', b'a\xff', b'\xff', b'c']:
+            expected = sorted(key for key in keys if key.startswith(prefix))
+            self.assertEqual(list(tree.prefix_keys(prefix)), expected)
+            self.assertEqual(tree.prefix_count(prefix), len(expected))
+        self.assertRaises(TypeError, tree.prefix_count, 1)
+
+    def test_136_tuple_keys(self):
+        keys = [(), (-1,), (0, 'b'), (0, 'b', 1), (0, 'b', 2.5), (1, 'a', 0), (1, 'a', 0, ()), (1, 'a', 0, (1,)),
+                (1, 'b'), (2.5,), (2 ** 70, '')]
+        shuffled = list(keys)
+        shuffle(shuffled)
+        tree = self.TREE_CLASS.from_keys(shuffled)
+        self.assertEqual(list(tree.keys()), keys)
+        for index, key in enumerate(keys):
+            self.assertTrue(key in tree)
+            self.assertEqual(tree.rank(key), index)
+        self.assertTrue((1.0, 'a', 0) in tree)
+        self.assertFalse((1, 'a') in tree)
+
+    def test_137_tuple_prefix_scans(self):
+        tree = self.TREE_CLASS.from_keys((symbol, ts) for symbol in ('AAPL', 'AMZN', 'MSFT') for ts in range(10))
+        tree[('AMZN',)] = None
+        self.assertEqual(list(tree.prefix_keys(('AMZN',))), [('AMZN',)] + [('AMZN', ts) for ts in range(10)])
+        self.assertEqual(list(tree.prefix_keys(('AMZN', 3))), [('AMZN', 3)])
+        self.assertEqual(list(tree.prefix_keys(('AMZN',), reverse=True))[0], ('AMZN', 9))
+        self.assertEqual(tree.prefix_count(('MSFT',)), 10)
+        self.assertEqual(tree.prefix_count(('IBM',)), 0)
+        self.assertEqual(tree.prefix_count(()), len(tree))
+        self.assertEqual([k for k, v in tree.iter_items(('AMZN', 3), ('AMZN', 6))], [('AMZN', ts) for ts in range(3, 6)])
+
+    def test_138_key_function(self):
+        tree = self.TREE_CLASS([('b', 1), ('A', 2), ('c', 3)], key=str.lower)
+        self.assertIs(tree.key, str.lower)
+        tree['B'] = 4  # same entry as 'b', keeps the original key
+        self.assertEqual(list(tree.items()), [('A', 2), ('b', 4), ('c', 3)])
+        self.assertEqual(tree['a'], 2)
+        self.assertTrue('C' in tree)
+        self.assertEqual(tree.rank('B'), 1)
+        self.assertEqual(tree.floor_item('BZ'), ('b', 4))
+        self.assertEqual(tree.succ_item('a'), ('b', 4))
+        self.assertEqual(list(tree['a':'C'].keys()), ['A', 'b'])
+        self.assertTrue('B' in tree['a':'C'])
+        self.assertEqual(tree.set_default('D', 5), 5)
+        self.assertEqual(tree.pop('d'), 5)
+        self.assertEqual(tree.cursor('B').item, ('b', 4))
+        self.assertEqual(tree.get_many(['B', 'x', 'a']), [4, None, 2])
+        self.assertEqual(tree.contains_many(['C', 'd']), [True, False])
+        self.assertEqual(tree.pop_min(), ('A', 2))
+        del tree['C']
+        self.assertEqual(list(tree.items()), [('b', 4)])
+        other = self.TREE_CLASS.from_keys(['x%03d' % i for i in range(100)] + ['B'], 0, key=str.lower)
+        self.assertEqual(list(tree.intersection(other).items()), [('b', 4)])  # probes the keys of T
+        self.assertEqual(list(other.intersection(tree).items()), [('B', 0)])  # keeps the keys of other
+        self.assertEqual(len(tree.difference(other)), 0)
+
+    def test_139_key_function_trees(self):
+        keys = list(range(50))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys, key=operator.neg)
+        self.assertEqual(list(tree.keys()), list(range(49, -1, -1)))
+        self.assertEqual(list(tree.iter_items(10, 5)), [(k, None) for k in range(10, 5, -1)])
+        for copy in (tree.copy(), deepcopy(tree), pickle.loads(pickle.dumps(tree, -1))):
+            self.assertIs(copy.key, operator.neg)
+            self.assertEqual(list(copy.keys()), list(tree.keys()))
+        left, right = tree.split(25)
+        self.assertEqual(list(left.keys()), list(range(49, 25, -1)))
+        self.assertIs(right.key, operator.neg)
+        left.join(right)
+        self.assertEqual(list(left.keys()), list(range(49, -1, -1)))
+        other = self.TREE_CLASS.from_keys(range(40, 60))  # other key order
+        self.assertEqual(list((left & other).keys()), list(range(49, 39, -1)))
+        self.assertEqual(list((left | other).keys()), list(range(59, -1, -1)))
+        tree = self.TREE_CLASS.from_sorted_items([(2, 'a'), (1, 'b')], key=operator.neg)
+        self.assertEqual(list(tree.items()), [(2, 'a'), (1, 'b')])
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([1, 2], key=operator.neg)
+
+    def test_140_key_function_calls(self):
+        calls = []
+
+        def key(k):
+            calls.append(k)
+            return k.lower()
+
+        tree = self.TREE_CLASS.from_keys(['a', 'B', 'c', 'D', 'e'], key=key)
+        del calls[:]
+        tree.get('b')
+        tree['C'] = 1
+        tree.cursor('d').next()
+        self.assertEqual(calls, ['b', 'C', 'd'])  # stored keys are not transformed again
+
+    def test_141_encoded_keys(self):
+        keys = [None, -2 ** 70, -1.5, 0, 3, 2 ** 70, b'a', 'a', 'b', datetime(2020, 1, 1), (), ('a', 1), ('a', 2, 0), ('b',)]
+        shuffled = list(keys)
+        shuffle(shuffled)
+        tree = self.TREE_CLASS.from_keys(shuffled, key=encode_key)
+        self.assertIs(tree.key, encode_key)
+        self.assertEqual(list(tree.keys()), keys)
+        self.assertEqual(tree.rank(('a', 2, 0)), 12)
+        self.assertEqual(list(tree.prefix_keys(('a',))), [('a', 1), ('a', 2, 0)])
+        self.assertEqual(list(tree[0:'a'].keys()), [0, 3, 2 ** 70, b'a'])
+        self.assertEqual(tree.pop_max(), (('b',), None))
+        tree2 = pickle.loads(pickle.dumps(tree, -1))
+        self.assertIs(tree2.key, encode_key)
+        self.assertEqual(list(tree2.keys()), keys[:-1])
+
+    def test_142_reserve(self):
+        tree = self.TREE_CLASS()
+        tree.reserve(100)
+        tree.update((key, key) for key in range(100))
+        tree.reserve(10)  # less than the count of items
+        left, right = tree.split(50)
+        del tree
+        other = self.TREE_CLASS.from_keys(range(-10, 0))
+        other.join(left)
+        del left
+        right.clear()
+        right.reserve(1000)
+        right.update((key, key) for key in range(100, 110))
+        other.join(right)
+        self.assertEqual(list(other.keys()), list(range(-10, 50)) + list(range(100, 110)))
+        self.assertEqual(len(right), 0)
+
+    def test_143_sizeof(self):
+        tree = self.TREE_CLASS()
+        empty = sys.getsizeof(tree)
+        keys = list(range(1000))
+        shuffle(keys)
+        tree.update((key, key) for key in keys)
+        self.assertGreater(sys.getsizeof(tree), empty + 1000 * 8 * 5)  # links, key, value and size
+        tree.clear()
+        self.assertEqual(sys.getsizeof(tree), empty)
+
+    def test_144_sorted_keys_deeper_than_recursion_limit(self):
+        # the binary trees degenerate to a list of 1500 levels
+        tree = self.TREE_CLASS()
+        for key in range(1500):
+            tree[key] = key
+        for order in (-1, 0, +1):
+            visited = []
+            tree.foreach(lambda key, value: visited.append(key), order)
+            self.assertEqual(sorted(visited), list(range(1500)))
+        self.assertEqual(list(tree.copy().keys()), list(range(1500)))
+        tree.clear()
+        self.assertEqual(len(tree), 0)
+
+    def test_145_list_methods(self):
+        tree = self.TREE_CLASS()
+        self.assertEqual(tree.keys_list(), [])
+        self.assertEqual(tree.items_list(reverse=True), [])
+        tree.update(self.default_values1)
+        items = sorted(self.default_values1)
+        self.assertEqual(tree.keys_list(), [key for key, value in items])
+        self.assertEqual(tree.values_list(), [value for key, value in items])
+        self.assertEqual(tree.items_list(), items)
+        self.assertEqual(tree.keys_list(reverse=True), [key for key, value in reversed(items)])
+        self.assertEqual(tree.values_list(reverse=True), [value for key, value in reversed(items)])
+        self.assertEqual(tree.items_list(reverse=True), items[::-1])
+
+    def test_146_iter_chunks(self):
+        tree = self.TREE_CLASS.from_keys(range(10), 'v')
+        chunks = list(tree.iter_chunks(4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+        self.assertEqual([key for chunk in chunks for key, value in chunk], list(range(10)))
+        self.assertEqual(list(tree.iter_chunks(2, 3, 7, reverse=True)), [[(6, 'v'), (5, 'v')], [(4, 'v'), (3, 'v')]])
+        self.assertEqual(list(tree.iter_chunks(3, 7, columns=True)), [([7, 8, 9], ['v', 'v', 'v'])])
+        self.assertEqual(list(tree.iter_chunks(3, 7, 7)), [])
+        self.assertEqual(list(self.TREE_CLASS().iter_chunks(3)), [])
+        with self.assertRaises(ValueError):
+            next(tree.iter_chunks(0))
+
+    def test_147_views(self):
+        tree = self.TREE_CLASS(self.default_values1)
+        keys, values, items = tree.keys(), tree.values(), tree.items()
+        self.assertIsInstance(keys, collections.abc.KeysView)
+        self.assertIsInstance(values, collections.abc.ValuesView)
+        self.assertIsInstance(items, collections.abc.ItemsView)
+        self.assertEqual(len(keys), 6)
+        self.assertIn(12, keys)
+        self.assertNotIn(13, keys)
+        self.assertIn(57, values)
+        self.assertIn((16, 16), items)
+        self.assertNotIn((16, 17), items)
+        self.assertEqual(list(keys), [12, 16, 34, 35, 45, 57])
+        self.assertEqual(list(keys), list(keys))  # iterable more than once
+        self.assertEqual(list(reversed(keys)), [57, 45, 35, 34, 16, 12])
+        self.assertEqual(list(tree.keys(reverse=True)), [57, 45, 35, 34, 16, 12])
+        self.assertEqual(list(reversed(tree.items(reverse=True)))[0], (12, 12))
+        tree[1] = 1  # the views are live
+        self.assertEqual(len(keys), 7)
+        self.assertEqual(list(values)[0], 1)
+        self.assertEqual(keys, {1, 12, 16, 34, 35, 45, 57})
+
+    def test_148_keys_view_set_operations(self):
+        tree = self.TREE_CLASS.from_keys([1, 2, 3, 4], 'a')
+        other = self.TREE_CLASS.from_keys([3, 4, 5], 'b')
+        self.assertEqual(list(tree.keys() & other.keys()), [3, 4])
+        self.assertEqual(list(tree.keys() | [6, 5]), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(list(tree.keys() - other.keys()), [1, 2])
+        self.assertEqual(list(tree.keys() ^ other.keys()), [1, 2, 5])
+        self.assertEqual(list([5, 3] & tree.keys()), [3])
+        self.assertEqual(list({2, 7} - tree.keys()), [7])
+        intersection = tree.keys() & other.keys()
+        self.assertIsInstance(intersection, collections.abc.KeysView)
+        self.assertEqual(list(intersection.mapping.values()), ['a', 'a'])
+        self.assertTrue(tree.keys().isdisjoint([7, 8]))
+        self.assertFalse(tree.keys().isdisjoint(other.keys()))
+        self.assertTrue(tree.keys() > {1, 2})
+
+    def test_149_get_many(self):
+        keys = list(range(0, 600, 3))
+        shuffle(keys)
+        tree = self.TREE_CLASS((key, -key) for key in keys)
+        probes = list(range(-5, 610))
+        expected = [-key if key % 3 == 0 and 0 <= key < 600 else 'x' for key in probes]
+        self.assertEqual(tree.get_many(probes, 'x'), expected)
+        self.assertEqual(tree.get_many(reversed(probes), 'x'), expected[::-1])
+        self.assertEqual(tree.contains_many(tuple(probes)), [value != 'x' for value in expected])
+        shuffle(probes)
+        self.assertEqual(tree.get_many(probes), [tree.get(key) for key in probes])
+        self.assertEqual(tree.get_many([9, 9, 10, 9, 597, 9]), [-9, -9, None, -9, -597, -9])
+        self.assertEqual(tree.contains_many(key for key in [0, 1, 3]), [True, False, True])
+        self.assertEqual(tree.get_many([]), [])
+        self.assertEqual(self.TREE_CLASS().contains_many([1, 2]), [False, False])
+
+    @unittest.skipIf(numpy is None, "NumPy not installed.")
+    def test_150_get_many_numpy(self):
+        tree = self.TREE_CLASS([(1, (1, 1)), (2, 'b'), (3, 'c')])
+        values = tree.get_many(numpy.array([[1, 2], [4, 3]]))
+        self.assertIsInstance(values, numpy.ndarray)
+        self.assertEqual(values.dtype, object)
+        self.assertEqual(values.tolist(), [[(1, 1), 'b'], [None, 'c']])
+        found = tree.contains_many(numpy.arange(5))
+        self.assertEqual(found.dtype, bool)
+        self.assertEqual(found.tolist(), [False, True, True, True, False])
+
+    def test_151_incomparable_keys(self):
+        keys = list(range(0, 100, 2))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys, 'v')
+        with self.assertRaises(TypeError):
+            tree.get('x')
+        with self.assertRaises(TypeError):
+            'x' in tree
+        with self.assertRaises(TypeError):
+            tree.insert('x', 9)
+        with self.assertRaises(TypeError):
+            tree['x'] = 9
+        self.assertEqual(list(tree.items()), [(key, 'v') for key in range(0, 100, 2)])
+        self.assertEqual([tree.rank(key) for key in range(0, 100, 2)], list(range(50)))
+        tree[5] = 'w'
+        self.assertEqual(tree.select(3), (5, 'w'))
+
+    def test_152_incomparable_rank_keys(self):
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        for func in (tree.rank, tree.bisect_left, tree.bisect_right, lambda key: tree.count_range(key, None)):
+            with self.assertRaises(TypeError):
+                func('x')
+
+    def test_153_incomparable_pop_keys(self):
+        keys = list(range(0, 100, 2))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys, 'v')
+        for func in (tree.remove, tree.discard, tree.__delitem__, tree.pop, lambda key: tree.pop(key, 0),
+                     tree.set_default, lambda key: tree.update_value(key, str)):
+            with self.assertRaises(TypeError):
+                func('x')
+        self.assertEqual(list(tree.items()), [(key, 'v') for key in range(0, 100, 2)])
+        self.assertEqual([tree.rank(key) for key in range(0, 100, 2)], list(range(50)))
+        self.assertEqual(tree.pop(4), 'v')
+        self.assertEqual(tree.select(2), (6, 'v'))
+
+    def test_154_cursor_state(self):
+        tree = self.TREE_CLASS.from_keys(range(10))
+        cursor = tree.cursor(5)
+        self.assertIs(cursor.next(), True)
+        self.assertIs(cursor.prev(), True)
+        self.assertIs(cursor.seek(5), True)
+        self.assertIs(cursor.seek_floor(5), True)
+        del tree[5]
+        self.assertFalse(cursor.valid)
+        self.assertFalse(cursor.valid)  # reading valid keeps the position
+        self.assertIs(cursor.next(), True)
+        self.assertEqual(cursor.key, 6)
+        del tree[6]
+        self.assertFalse(cursor.valid)
+        self.assertRaises(KeyError, getattr, cursor, 'key')
+        self.assertIs(cursor.prev(), True)
+        self.assertEqual(cursor.key, 4)
+        with self.assertRaises(TypeError):
+            cursor.seek('x')
+        self.assertFalse(cursor.valid)
+        self.assertIs(cursor.last(), True)
+        self.assertIs(cursor.next(), False)
+        self.assertIs(cursor.first(), True)
+
+    def test_155_set_operations_of_small_trees(self):
+        # probed by finger search, the other trees are merged
+        large = self.TREE_CLASS.from_keys(range(0, 2000, 2), 'l')
+        small = self.TREE_CLASS.from_keys([3, 4, 10, 1998, 2001], 's')
+        self.assertEqual(list(small.intersection(large).items()), [(4, 's'), (10, 's'), (1998, 's')])
+        self.assertEqual(list(large.intersection(small, large).items()), [(4, 'l'), (10, 'l'), (1998, 'l')])
+        self.assertEqual(list(small.difference(large).items()), [(3, 's'), (2001, 's')])
+        self.assertEqual(list(small.difference(large, {3: None}).keys()), [2001])
+        self.assertEqual(len(large.difference(small)), 997)
+        self.assertFalse(small.is_subset(large))
+        self.assertTrue(self.TREE_CLASS.from_keys([4, 10]).is_subset(large))
+        self.assertFalse(large.is_disjoint(small))
+        self.assertTrue(self.TREE_CLASS.from_keys([1, 3, 2001]).is_disjoint(large))
+
+    def test_156_build_sorted_invalid_items(self):
+        tree = self.TREE_CLASS.from_keys([1, 2])
+        for items in ([(1, 'a'), 2], [(1, 'a'), None]):
+            with self.assertRaises(TypeError):
+                tree._build_sorted(items)
+            self.assertEqual(len(tree), 0)
+        tree._build_sorted([(1, 'a'), (2, 'b')])
+        self.assertEqual(list(tree.items()), [(1, 'a'), (2, 'b')])
+
+    def test_157_split_incomparable_key(self):
+        keys = list(range(0, 100, 2))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys)
+        with self.assertRaises(TypeError):
+            tree.split('x')
+        with self.assertRaises(TypeError):
+            del tree[10:'x']
+        self.assertEqual(list(tree.keys()), list(range(0, 100, 2)))
+        self.assertEqual([tree.rank(key) for key in range(0, 100, 2)], list(range(50)))
+        left, right = tree.split(51)
+        self.assertEqual((len(left), len(right)), (26, 24))
+
+    def test_158_comparison_error(self):
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        for func in (tree.get, tree.__contains__, tree.rank, tree.bisect_left, tree.discard,
+                     lambda key: tree.insert(key, 9)):
+            with self.assertRaises(ValueError):
+                func(BrokenKey())
+        self.assertEqual(list(tree.keys()), [1, 2, 3])
+
+    def test_159_range_of_less_than_keys(self):
+        # the sorted build compares by __lt__ only, the insert of BinaryTree by <=
+        tree = self.TREE_CLASS.from_sorted_keys([LessThanKey(key) for key in range(10)])
+        start, end = LessThanKey(3), LessThanKey(6)
+        self.assertEqual([key.value for key in tree.key_slice(start, end)], [3, 4, 5])
+        self.assertEqual([key.value for key in tree.key_slice(start, end, reverse=True)], [5, 4, 3])
+        self.assertEqual([key.value for key in tree.key_slice(None, end)], [0, 1, 2, 3, 4, 5])
+
+    def test_160_slice_of_less_than_keys(self):
+        tree = self.TREE_CLASS.from_sorted_keys([LessThanKey(key) for key in range(10)])
+        treeslice = tree[LessThanKey(3):LessThanKey(6)]
+        self.assertEqual([key.value for key in treeslice.keys()], [3, 4, 5])
+        self.assertTrue(LessThanKey(3) in treeslice)
+        self.assertTrue(LessThanKey(5) in treeslice)
+        self.assertFalse(LessThanKey(6) in treeslice)
+        self.assertFalse(LessThanKey(2) in treeslice)
+
 
 class TestBinaryTree(CheckTree, unittest.TestCase):
     TREE_CLASS = BinaryTree
@@ -68,5 +68,10 @@ class TestTree(unittest.TestCase):
             tree.remove(key)
         self.assertEqual(tree.count, 0)
 
+    def test_native_mapping_slots(self):
+        for name in ('__getitem__', '__setitem__', '__delitem__', '__contains__', '__len__', '__iter__'):
+            self.assertEqual(type(getattr(FastAVLTree, name)).__name__, 'wrapper_descriptor', name)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -9,6 +9,7 @@
 import sys
 PYPY = hasattr(sys, 'pypy_version_info')
 
+import threading
 import unittest
 from random import randint, shuffle
 
@@ -68,5 +69,66 @@ class TestTree(unittest.TestCase):
         for key in keys:
             tree.remove(key)
         self.assertEqual(tree.count, 0)
+
+    def test_native_mapping_slots(self):
+        for name in ('__getitem__', '__setitem__', '__delitem__', '__contains__', '__len__', '__iter__'):
+            self.assertEqual(type(getattr(FastBinaryTree, name)).__name__, 'wrapper_descriptor', name)
+
+    def test_degenerate_tree_traversal(self):
+        # sorted keys build a linked list, deeper than the stack buffer
+        tree = FastBinaryTree()
+        for key in range(1000):
+            tree[key] = key
+        self.assertEqual(list(tree.keys()), list(range(1000)))
+        self.assertEqual(list(tree.keys(reverse=True)), list(range(999, -1, -1)))
+        self.assertEqual(list(tree.key_slice(990, None)), list(range(990, 1000)))
+        visited = []
+        tree.foreach(lambda key, value: visited.append(key), order=+1)  # postorder
+        self.assertEqual(visited, list(range(999, -1, -1)))
+        cursor = tree.cursor(998)
+        self.assertTrue(cursor.next())
+        self.assertEqual(cursor.key, 999)
+        self.assertFalse(cursor.next())
+        self.assertTrue(cursor.last())
+        self.assertTrue(cursor.prev())
+        self.assertEqual(cursor.key, 998)
+
+    def test_get_many_deep_finger(self):
+        # descending keys build a chain of left links, the search path of
+        # the finger search keeps only the upper 128 left turns
+        tree = FastBinaryTree()
+        for key in range(1000, 0, -1):
+            tree[key * 2] = key
+        probes = list(range(2001))
+        self.assertEqual(tree.get_many(probes), [tree.get(key) for key in probes])
+        self.assertEqual(tree.contains_many(probes[::7] + probes[::-5]),
+                         [key in tree for key in probes[::7] + probes[::-5]])
+
+    def test_degenerate_tree_teardown(self):
+        # join() links the joined trees by their left links, a tree of
+        # 100000 levels, a recursive teardown overflows the small stack
+        tree = FastBinaryTree()
+        for key in range(100000):
+            tree.join(FastBinaryTree([(key, key)]))
+        other = FastBinaryTree()
+        for key in range(100000):
+            other.join(FastBinaryTree([(key, key)]))
+
+        def teardown():
+            tree.clear()
+            del other_trees[:]
+
+        other_trees = [other]
+        del other
+        stack_size = threading.stack_size(1 << 20)
+        try:
+            thread = threading.Thread(target=teardown)
+            thread.start()
+            thread.join()
+        finally:
+            threading.stack_size(stack_size)
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(other_trees, [])
+
 if __name__ == '__main__':
     unittest.main()
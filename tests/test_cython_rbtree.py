@@ -10,6 +10,7 @@
 import sys
 PYPY = hasattr(sys, 'pypy_version_info')
 
+import operator
 import unittest
 from random import randint, shuffle
 
@@ -60,6 +61,33 @@ class TestTree(unittest.TestCase):
             tree.remove(key)
         self.assertEqual(tree.count, 0)
 
+    def test_native_mapping_slots(self):
+        for name in ('__getitem__', '__setitem__', '__delitem__', '__contains__', '__len__', '__iter__'):
+            self.assertEqual(type(getattr(FastRBTree, name)).__name__, 'wrapper_descriptor', name)
+
+    def test_native_iterators(self):
+        tree = FastRBTree(self.values)
+        for iterator in (iter(tree), iter(tree.keys()), iter(tree.values(reverse=True)), iter(tree.items()), reversed(tree)):
+            self.assertEqual(type(iterator).__name__, 'TreeIterator')
+            self.assertEqual(operator.length_hint(iterator), 6)
+            next(iterator)
+            self.assertEqual(operator.length_hint(iterator), 5)
+            self.assertEqual(len(list(iterator)), 5)
+            self.assertEqual(operator.length_hint(iterator), 0)
+        self.assertEqual(list(tree.key_slice(2, 8)), [2, 3, 4])
+        self.assertEqual(list(tree.value_slice(2, 8, reverse=True)), [34, 57, 12])
+        self.assertEqual(operator.length_hint(tree.item_slice(2, None)), 5)
+
+    def test_modified_during_iteration(self):
+        tree = FastRBTree(self.values)
+        iterator = iter(tree)
+        self.assertEqual(next(iterator), 1)
+        del tree[9]
+        with self.assertRaises(RuntimeError):
+            next(iterator)
+        with self.assertRaises(StopIteration):
+            next(iterator)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: test trees with typed keys
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+
+import sys
+PYPY = hasattr(sys, 'pypy_version_info')
+
+import unittest
+import pickle
+import tracemalloc
+from random import shuffle
+
+from bintrees.keycodec import encode_key
+
+from .test_all_trees import CheckTree, BrokenKey, LessThanKey
+
+if not PYPY:
+    from bintrees.cython_trees import FastRBTree
+    from bintrees.cython_int64_trees import FastInt64RBTree
+    from bintrees.cython_float64_trees import FastFloat64RBTree
+    from bintrees.cython_bytes_trees import FastBytesRBTree
+    from bintrees.cython_str_trees import FastStrRBTree
+    from bintrees.cython_tuple_trees import FastTupleRBTree
+else:
+    FastRBTree = FastInt64RBTree = FastFloat64RBTree = FastBytesRBTree = FastStrRBTree = FastTupleRBTree = None
+
+
+class CheckTypedTree(CheckTree):
+    def test_097_data_corruption(self):
+        tree = self.TREE_CLASS()
+        insert_keys = [14, 1584, 16, 16, 163, 158, 1648, 1495, 1507, 1641, 1643, 1645, 164, 1642, 1647]
+        for key in insert_keys:
+            tree[key] = "unused_data"
+        self.assertEqual(sorted(set(insert_keys)), list(tree.keys()))
+
+    def test_118_set_methods_unhashable_keys(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_keys([[1], [2], [3]])
+
+    def test_135_prefix_scans(self):
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        with self.assertRaises(TypeError):
+            tree.prefix_count('a')
+
+    def test_136_tuple_keys(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_keys([(1, 2)])
+
+    def test_137_tuple_prefix_scans(self):
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        with self.assertRaises(TypeError):
+            tree.prefix_count((1,))
+
+    def test_138_key_function(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS(key=abs)
+
+    def test_139_key_function_trees(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_sorted_keys([2, 1], key=abs)
+
+    def test_140_key_function_calls(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_keys([1, 2], key=abs)
+
+    def test_141_encoded_keys(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS(key=encode_key)
+
+    def test_158_comparison_error(self):
+        # keys are converted to C numbers, not compared
+        tree = self.TREE_CLASS.from_keys([1, 2, 3])
+        with self.assertRaises(TypeError):
+            tree.insert(BrokenKey(), 9)
+
+    def test_159_range_of_less_than_keys(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_keys([LessThanKey(1)])
+
+    def test_160_slice_of_less_than_keys(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_keys([LessThanKey(1)])
+
+    def test_200_reject_invalid_keys(self):
+        tree = self.TREE_CLASS([(1, 1)])
+        for key in ('a', None, (1, 2), [1]):
+            with self.assertRaises(TypeError):
+                tree[key] = 1
+            with self.assertRaises(TypeError):
+                tree.get(key)
+        self.assertEqual(list(tree.items()), [(1, 1)])
+
+    def test_201_pickle_keeps_class(self):
+        tree = self.TREE_CLASS((key, str(key)) for key in range(-50, 50))
+        tree2 = pickle.loads(pickle.dumps(tree, -1))
+        self.assertIs(tree2.__class__, self.TREE_CLASS)
+        self.assertEqual(list(tree.items()), list(tree2.items()))
+
+    def test_202_split_join_slice(self):
+        keys = list(range(-100, 100))
+        shuffle(keys)
+        tree = self.TREE_CLASS.from_keys(keys)
+        self.assertEqual(list(tree[-3:3].keys()), list(range(-3, 3)))
+        left, right = tree.split(0)
+        self.assertIs(left.__class__, self.TREE_CLASS)
+        self.assertEqual(list(left.keys()), list(range(-100, 0)))
+        self.assertEqual(list(right.keys()), list(range(0, 100)))
+        left.join(right)
+        self.assertEqual(list(left.keys()), list(range(-100, 100)))
+        with self.assertRaises(TypeError):
+            left.split('a')
+        self.assertEqual(len(left), 200)
+
+    def test_203_reserve_and_clear(self):
+        tree = self.TREE_CLASS()
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            tree.reserve(1000)
+            reserved = tracemalloc.get_traced_memory()[0]
+            tree.update((key, None) for key in range(1000))
+            filled = tracemalloc.get_traced_memory()[0]
+            tree.clear()  # releases the slabs
+            cleared = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        self.assertGreaterEqual(reserved - start, 1000 * 32)
+        self.assertLess(filled - reserved, 1000)  # no nodes allocated
+        self.assertLess(cleared - start, 1000)
+
+    def test_204_compact_nodes(self):
+        tree = self.TREE_CLASS()
+        empty = sys.getsizeof(tree)
+        tree.reserve(1000)
+        node_size = 40 if sys.maxsize > 2 ** 32 else 32  # links, key, value, size and color
+        self.assertLessEqual(sys.getsizeof(tree) - empty, 1000 * node_size + 200)
+
+    def test_205_split_frees_pool(self):
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            tree = self.TREE_CLASS.from_keys(range(10000))
+            size = sys.getsizeof(tree)
+            left, right = tree.split(10)  # left moves into a new pool
+            self.assertLess(sys.getsizeof(left), 1000)
+            self.assertLessEqual(sys.getsizeof(left) + sys.getsizeof(right), size + 1000)
+            del tree, right
+            self.assertLess(tracemalloc.get_traced_memory()[0] - start, 1000)
+            left, right = self.TREE_CLASS.from_keys(range(10000)).split(5000)  # both share the pool
+            self.assertLessEqual(abs(sys.getsizeof(left) - sys.getsizeof(right)), 100)
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(list(left.keys()), list(range(5000)))
+
+    def test_206_lookups_of_numbers_outside_of_the_keys(self):
+        # lookups, range bounds and bisect accept any number like FastRBTree
+        calls = [
+            lambda tree, key: key in tree,
+            lambda tree, key: tree.get(key, 'd'),
+            lambda tree, key: tree.pop(key, 'd'),
+            lambda tree, key: tree.get_many([key, 3]),
+            lambda tree, key: tree.bisect_left(key),
+            lambda tree, key: tree.bisect_right(key),
+            lambda tree, key: tree.count_range(key, None),
+            lambda tree, key: tree.count_range(None, key),
+            lambda tree, key: list(tree[key:].keys()),
+            lambda tree, key: list(tree[2:key].keys()),
+            lambda tree, key: tree.floor_key(key),
+            lambda tree, key: tree.ceiling_key(key),
+            lambda tree, key: tree.rank(key),
+            lambda tree, key: tree.succ_key(key),
+        ]
+
+        def result(call, tree, key):
+            try:
+                return call(tree, key)
+            except KeyError:
+                return KeyError
+
+        keys = [-5, -1, 0, 2, 3, 7, 10]
+        tree = self.TREE_CLASS.from_keys(keys, 'v')
+        expected_tree = FastRBTree.from_keys(keys, 'v')
+        for key in (2.0, 2.5, -0.5, 2 ** 70, -2 ** 70, 2 ** 1100, -2 ** 1100, 1e300, -1e300, float('inf'),
+                    -float('inf'), 2 ** 63, -2 ** 63 - 1):
+            for call in calls:
+                self.assertEqual(result(call, tree, key), result(call, expected_tree, key), key)
+        self.assertFalse(float('nan') in tree)
+        self.assertEqual(tree.get(float('nan'), 'd'), 'd')
+        with self.assertRaises(ValueError):
+            tree.bisect_left(float('nan'))
+        self.assertEqual(list(tree.keys()), list(expected_tree.keys()))  # pop(2.0) removed key 2
+
+
+@unittest.skipIf(PYPY, "Cython implementation not supported for pypy.")
+class TestFastInt64RBTree(CheckTypedTree, unittest.TestCase):
+    TREE_CLASS = FastInt64RBTree
+
+    def test_134_builtin_key_types_order(self):
+        keys = [-2 ** 63, -2 ** 40, -1, 0, 1, 2 ** 31, 2 ** 63 - 1]
+        shuffled = list(keys)
+        shuffle(shuffled)
+        tree = self.TREE_CLASS.from_keys(shuffled)
+        self.assertEqual(list(tree.keys()), keys)
+        for index, key in enumerate(keys):
+            self.assertTrue(key in tree)
+            self.assertEqual(tree.rank(key), index)
+        self.assertTrue(True in tree)
+        self.assertIs(type(tree.min_key()), int)
+
+    def test_210_reject_floats(self):
+        tree = self.TREE_CLASS()
+        for key in (2.5, 2.0, float('nan')):
+            with self.assertRaises(TypeError):
+                tree[key] = 1
+        self.assertEqual(len(tree), 0)
+
+    def test_211_overflow(self):
+        tree = self.TREE_CLASS()
+        for key in (2 ** 63, -2 ** 63 - 1, 2 ** 70):
+            with self.assertRaises(OverflowError):
+                tree[key] = 1
+        self.assertEqual(len(tree), 0)
+
+    def test_212_from_sorted_items_checks_order(self):
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([2, 1])
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([1, True])
+
+    def test_213_int64_limits(self):
+        keys = [-2 ** 63, -2 ** 63 + 1, 0, 2 ** 63 - 2, 2 ** 63 - 1]
+        tree = self.TREE_CLASS.from_keys(keys)
+        self.assertEqual(list(tree.keys()), keys)
+        self.assertTrue(-2 ** 63 in tree)
+        self.assertTrue(2 ** 63 - 1 in tree)
+        self.assertFalse(2 ** 63 in tree)
+        self.assertFalse(-2 ** 63 - 1 in tree)
+        self.assertEqual(tree.bisect_left(2 ** 63), 5)
+        self.assertEqual(tree.bisect_right(2 ** 63 - 1), 5)
+        self.assertEqual(tree.bisect_left(-2 ** 63 - 1), 0)
+        self.assertEqual(tree.bisect_right(-2 ** 63), 1)
+        self.assertEqual(tree.floor_key(2 ** 64), 2 ** 63 - 1)
+        self.assertEqual(tree.ceiling_key(-2 ** 64), -2 ** 63)
+        self.assertEqual(tree.floor_key(9.3e18), 2 ** 63 - 1)
+        self.assertEqual(tree.ceiling_key(-9.3e18), -2 ** 63)
+        self.assertEqual(tree.ceiling_key(0.5), 2 ** 63 - 2)
+        with self.assertRaises(KeyError):
+            tree.ceiling_key(2 ** 63)
+        self.assertEqual(list(tree[-2 ** 70:2 ** 70].keys()), keys)
+
+
+@unittest.skipIf(PYPY, "Cython implementation not supported for pypy.")
+class TestFastFloat64RBTree(CheckTypedTree, unittest.TestCase):
+    TREE_CLASS = FastFloat64RBTree
+
+    def test_008a_repr(self):
+        tree = self.TREE_CLASS(self.default_values2)
+        clsname = tree.__class__.__name__
+        reprstr = repr(tree)
+        self.assertEqual(reprstr, '%s({1.0: 16, 2.0: 12, 3.0: 57, 4.0: 34, 8.0: 45, 9.0: 35})' % clsname)
+
+    def test_134_builtin_key_types_order(self):
+        keys = [float('-inf'), -1e300, -1.5, -1.0, 1e-300, 0.5, 1, 2.5, 2 ** 64, 1e300, float('inf')]
+        shuffled = list(keys)
+        shuffle(shuffled)
+        tree = self.TREE_CLASS.from_keys(shuffled)
+        self.assertEqual(list(tree.keys()), keys)
+        for index, key in enumerate(keys):
+            self.assertTrue(key in tree)
+            self.assertEqual(tree.rank(key), index)
+        self.assertFalse(2.25 in tree)
+        self.assertIs(type(tree.max_key()), float)
+
+    def test_210_int_keys_become_floats(self):
+        tree = self.TREE_CLASS([(1, 'a'), (2, 'b')])
+        tree[1.0] = 'c'
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(tree[1], 'c')
+        self.assertEqual([type(key) for key in tree.keys()], [float, float])
+
+    def test_211_reject_nan(self):
+        tree = self.TREE_CLASS([(1., 1)])
+        with self.assertRaises(ValueError):
+            tree[float('nan')] = 1
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([0., float('nan')])
+        self.assertEqual(len(tree), 1)
+
+    def test_212_from_sorted_items_checks_order(self):
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([1, 1.0])
+
+    def test_213_large_int_keys(self):
+        tree = self.TREE_CLASS()
+        tree[2 ** 53] = 1
+        tree[2 ** 60] = 2  # exact float value
+        for key in (2 ** 53 + 1, -2 ** 53 - 1, 2 ** 60 + 1):
+            with self.assertRaises(ValueError):
+                tree[key] = 3
+        with self.assertRaises(OverflowError):
+            tree[2 ** 1100] = 3
+        self.assertEqual(list(tree.items()), [(2.0 ** 53, 1), (2.0 ** 60, 2)])
+        self.assertFalse(2 ** 53 + 1 in tree)
+        self.assertEqual(tree.bisect_left(2 ** 53 + 1), 1)
+        self.assertEqual(tree.bisect_right(2 ** 53 - 1), 0)
+        self.assertEqual(tree.floor_key(2 ** 60 - 1), 2.0 ** 53)
+        self.assertFalse(2 ** 1100 in tree)
+        self.assertEqual(tree.bisect_left(2 ** 1100), 2)
+        tree[float('inf')] = 3
+        self.assertEqual(tree.bisect_left(2 ** 1100), 2)
+        self.assertEqual(tree.ceiling_key(2 ** 1100), float('inf'))
+
+
+class CheckStringTree(object):
+    def test_001_order(self):
+        keys = [self.key(s) for s in self.ordered]
+        shuffled = list(keys)
+        shuffle(shuffled)
+        tree = self.TREE_CLASS.from_keys(shuffled)
+        self.assertEqual(list(tree.keys()), keys)
+        for index, key in enumerate(keys):
+            self.assertTrue(key in tree)
+            self.assertEqual(tree.rank(key), index)
+        for key in keys:
+            del tree[key]
+        self.assertEqual(len(tree), 0)
+
+    def test_002_reject_invalid_keys(self):
+        tree = self.TREE_CLASS([(self.key('a'), 1)])
+        for key in (1, 1.5, None, self.other_key):
+            with self.assertRaises(TypeError):
+                tree[key] = 1
+            with self.assertRaises(TypeError):
+                key in tree
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS.from_sorted_keys([self.key('a'), self.other_key])
+        self.assertEqual(list(tree.keys()), [self.key('a')])
+
+    def test_003_from_sorted_items_checks_order(self):
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([self.key('b'), self.key('a')])
+        with self.assertRaises(ValueError):
+            self.TREE_CLASS.from_sorted_keys([self.key('a'), self.key('a')])
+
+    def test_004_prefix_scans(self):
+        words = ['car', 'card', 'care', 'cart', 'cat', 'dog', 'do', 'c', 'ca']
+        tree = self.TREE_CLASS((self.key(word), len(word)) for word in words)
+        self.assertEqual(list(tree.prefix_keys(self.key('car'))),
+                         [self.key(word) for word in ['car', 'card', 'care', 'cart']])
+        self.assertEqual(list(tree.prefix_items(self.key('do'), reverse=True)),
+                         [(self.key('dog'), 3), (self.key('do'), 2)])
+        self.assertEqual(tree.prefix_count(self.key('ca')), 6)
+        self.assertEqual(tree.prefix_count(self.key('x')), 0)
+        self.assertEqual(tree.prefix_count(self.key('')), len(words))
+
+    def test_005_pickle_split_join(self):
+        keys = [self.key('%04d' % i) for i in range(100)]
+        tree = self.TREE_CLASS.from_keys(keys)
+        tree2 = pickle.loads(pickle.dumps(tree, -1))
+        self.assertIs(tree2.__class__, self.TREE_CLASS)
+        left, right = tree2.split(self.key('0050'))
+        self.assertEqual(list(left.keys()), keys[:50])
+        left.join(right)
+        self.assertEqual(list(left.keys()), keys)
+        self.assertEqual(list(left[self.key('0010'):self.key('0013')].keys()), keys[10:13])
+
+    def test_006_key_functions(self):
+        with self.assertRaises(TypeError):
+            self.TREE_CLASS(key=len)
+        if self.TREE_CLASS is not FastBytesRBTree:
+            with self.assertRaises(TypeError):
+                self.TREE_CLASS(key=encode_key)
+
+
+@unittest.skipIf(PYPY, "Cython implementation not supported for pypy.")
+class TestFastBytesRBTree(CheckStringTree, unittest.TestCase):
+    TREE_CLASS = FastBytesRBTree
+    ordered = ['', '\x00', '\x00\x00', 'A', 'a', 'a\x00', 'ab', 'b', '\x7f', '\xff', '\xff\xff']
+    other_key = 'a'
+
+    @staticmethod
+    def key(s):
+        return s.encode('latin-1')
+
+    def test_100_encoded_keys(self):
+        # stores only the encoded keys and decodes them on output
+        tree = self.TREE_CLASS([(2.0, 'a'), (-0.5, 'b'), ((1, 'x'), 'c')], key=encode_key)
+        self.assertEqual(list(tree.items()), [(-0.5, 'b'), (2, 'a'), ((1, 'x'), 'c')])
+        self.assertIs(type(tree.min_key()), float)
+        self.assertIs(type(tree.select(1)[0]), int)  # integral numbers decode as int
+        self.assertEqual(tree.pop(2), 'a')
+        self.assertEqual(tree.cursor((1,)).item, ((1, 'x'), 'c'))
+        self.assertEqual(tree.pop_max(), ((1, 'x'), 'c'))
+        with self.assertRaises(TypeError):
+            tree[object()] = 1
+        self.assertEqual(list(tree.items()), [(-0.5, 'b')])
+
+
+@unittest.skipIf(PYPY, "Cython implementation not supported for pypy.")
+class TestFastStrRBTree(CheckStringTree, unittest.TestCase):
+    TREE_CLASS = FastStrRBTree
+    ordered = ['', '\x00', 'A', 'a', 'ab', '\xe4', '\u20ac', '\ud800', '\U0001f600', '\U0010ffff']
+    other_key = b'a'
+
+    @staticmethod
+    def key(s):
+        return s
+
+
+
+@unittest.skipIf(PYPY, "Cython implementation not supported for pypy.")
+class TestFastTupleRBTree(CheckStringTree, unittest.TestCase):
+    # tuples of chars are ordered like the strings
+    TREE_CLASS = FastTupleRBTree
+    ordered = TestFastStrRBTree.ordered
+    other_key = 'a'
+
+    @staticmethod
+    def key(s):
+        return tuple(s)
+
+    def test_100_fields(self):
+        keys = [(-1, 'b'), (0, 'a', 1), (0, 'a', 1.5), (0, 'b'), (1, b'a'), (1, b'b', ()), (1, b'b', (1,))]
+        shuffled = list(keys)
+        shuffle(shuffled)
+        tree = self.TREE_CLASS.from_keys(shuffled)
+        self.assertEqual(list(tree.keys()), keys)
+        self.assertEqual([k for k, v in tree.iter_items((0, 'a'), (0, 'c'))], keys[1:4])
+        self.assertEqual(list(tree.prefix_keys((1, b'b'))), keys[5:])
+
+    def test_101_incomparable_fields(self):
+        tree = self.TREE_CLASS.from_keys([(1, 'a'), (2, 'b'), (3, 'c')])
+        for func in (tree.get, tree.__contains__, tree.get_value, lambda key: tree.insert(key, 9)):
+            with self.assertRaises(TypeError):
+                func(('x',))
+        self.assertEqual(list(tree.keys()), [(1, 'a'), (2, 'b'), (3, 'c')])
+        with self.assertRaises(TypeError):
+            tree._build_sorted([((1, 'a'), 1), ((1, 2), 2)])
+        self.assertEqual(len(tree), 0)
+
+    def test_102_field_comparison_error(self):
+        tree = self.TREE_CLASS.from_keys([(1, 'a'), (2, 'b'), (3, 'c')])
+        for func in (tree.get, tree.__contains__, tree.bisect_left, lambda key: tree.insert(key, 9)):
+            with self.assertRaises(ValueError):
+                func((2, BrokenKey()))
+        self.assertEqual(list(tree.keys()), [(1, 'a'), (2, 'b'), (3, 'c')])
+
+
+if __name__ == '__main__':
+    unittest.main()
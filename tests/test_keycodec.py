@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#coding:utf-8
+# Author:  mozman
+# Purpose: test order-preserving key encoding
+# Created: 18.10.2026
+# Copyright (c) 2010-2026 by Manfred Moitzi
+# License: MIT License
+
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from random import shuffle
+
+from bintrees.keycodec import encode_key, decode_key
+
+
+class TestKeyCodec(unittest.TestCase):
+    def check_order(self, keys):
+        shuffled = list(keys)
+        shuffle(shuffled)
+        self.assertEqual(sorted(shuffled, key=encode_key), keys)
+        for key in keys:
+            self.assertEqual(decode_key(encode_key(key)), key)
+
+    def test_numbers(self):
+        self.check_order([float('-inf'), -2 ** 100 - 1, -2 ** 100, -1e20, -3, -2.5, -2, -1, -0.75, -0.5, -5e-324, 0,
+                          5e-324, 1e-300, 0.5, 0.75, 1, 1.5, 2, 2 ** 53 + 1, 1e20, 2 ** 100, 2 ** 100 + 1, 1e308,
+                          float('inf')])
+
+    def test_equal_numbers_share_encoding(self):
+        self.assertEqual(encode_key(2), encode_key(2.0))
+        self.assertEqual(encode_key(True), encode_key(1))
+        self.assertEqual(encode_key(0.0), encode_key(-0.0))
+        self.assertIs(type(decode_key(encode_key(2.0))), int)
+        self.assertIs(type(decode_key(encode_key(2.5))), float)
+
+    def test_strings(self):
+        self.check_order(['', '\x00', '\x00\x00', '\x00a', 'A', 'a', 'a\x00', 'ab', '\xe4', '€', '\ud800',
+                          '\U0001f600'])
+        self.check_order([b'', b'\x00', b'\x00\x00', b'\x00\xff', b'\x01', b'a', b'a\x00', b'\xff', b'\xff\x00'])
+
+    def test_datetimes(self):
+        self.check_order([date(1, 1, 1), date(2020, 2, 29), date(9999, 12, 31)])
+        self.check_order([datetime.min, datetime(2020, 1, 1), datetime(2020, 1, 1, 0, 0, 0, 1), datetime.max])
+        aware = [datetime(2020, 1, 1, 12, tzinfo=timezone(timedelta(hours=3))), datetime(2020, 1, 1, 10, tzinfo=timezone.utc)]
+        self.check_order(aware)
+        self.assertEqual(decode_key(encode_key(aware[0])).tzinfo, timezone.utc)
+
+    def test_tuples(self):
+        self.check_order([(), (None,), (-1, 'b'), (0,), (0, None), (0, -1), (0, 'a'), (0, 'a', ()), (0, 'a', (1,)),
+                          (0, 'ab'), ((),), ((0,),)])
+
+    def test_type_order(self):
+        self.check_order([None, -1, 2.5, b'b', 'a', date(2020, 1, 1), datetime(2020, 1, 1),
+                          datetime(2020, 1, 1, tzinfo=timezone.utc), ()])
+
+    def test_invalid_keys(self):
+        with self.assertRaises(ValueError):
+            encode_key(float('nan'))
+        with self.assertRaises(TypeError):
+            encode_key([1])
+        with self.assertRaises(TypeError):
+            encode_key((1, object()))
+        for data in (b'', b'\x02', b'\x13', b'\x28a', b'\x40\x05', encode_key(1) + b'\x00'):
+            with self.assertRaises(ValueError):
+                decode_key(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,12 +8,14 @@
 
 import unittest
 
-from bintrees import RBTree
+from bintrees import RBTree, FastRBTree
 
 
 class TestTreeSlice(unittest.TestCase):
+    TREE_CLASS = RBTree
+
     def setUp(self):
-        self.tree = RBTree({1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f'})
+        self.tree = self.TREE_CLASS({1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f'})
 
     def test_in_slice_object(self):
         treeslice = self.tree[2:6]
@@ -95,7 +97,59 @@ class TestTreeSlice(unittest.TestCase):
 
     def test_repr(self):
         result = repr(self.tree[2:4])
-        self.assertEqual("RBTree({2: 'b', 3: 'c'})", result)
+        self.assertEqual("%s({2: 'b', 3: 'c'})" % self.TREE_CLASS.__name__, result)
+
+    def test_len(self):
+        self.assertEqual(len(self.tree[2:6]), 4)
+        self.assertEqual(len(self.tree[2.5:]), 4)
+        self.assertEqual(len(self.tree[:0]), 0)
+        self.assertEqual(len(self.tree[5:2]), 0)
+        self.assertEqual(len(self.tree[:]), 6)
+        self.assertFalse(self.tree[7:])
+
+    def test_min_max(self):
+        treeslice = self.tree[1.5:5]
+        self.assertEqual(treeslice.min_item(), (2, 'b'))
+        self.assertEqual(treeslice.max_item(), (4, 'd'))
+        self.assertEqual(treeslice.min_key(), 2)
+        self.assertEqual(treeslice.max_key(), 4)
+        self.assertEqual(self.tree[:].max_key(), 6)
+        self.assertRaises(ValueError, self.tree[4:4].min_item)
+        self.assertRaises(ValueError, self.tree[7:].max_item)
+
+    def test_reverse_iteration(self):
+        treeslice = self.tree[2:6]
+        self.assertEqual(list(reversed(treeslice)), [5, 4, 3, 2])
+        self.assertEqual(list(treeslice.values(reverse=True)), ['e', 'd', 'c', 'b'])
+        self.assertEqual(list(treeslice.items(reverse=True))[0], (5, 'e'))
+
+    def test_set_and_delete_items(self):
+        treeslice = self.tree[2:6]
+        treeslice[3] = 'x'
+        self.assertEqual(self.tree[3], 'x')
+        del treeslice[4]
+        self.assertNotIn(4, self.tree)
+        self.assertRaises(KeyError, treeslice.__setitem__, 6, 'y')
+        self.assertRaises(KeyError, treeslice.__delitem__, 1)
+        self.assertEqual(treeslice.get(1, 'z'), 'z')
+        self.assertEqual(treeslice.get(2), 'b')
+
+    def test_pop(self):
+        treeslice = self.tree[2:6]
+        self.assertEqual(treeslice.pop(3), 'c')
+        self.assertEqual(treeslice.pop(1, None), None)
+        self.assertRaises(KeyError, treeslice.pop, 1)
+        self.assertEqual(treeslice.pop_min(), (2, 'b'))
+        self.assertEqual(treeslice.pop_max(), (5, 'e'))
+        self.assertEqual(list(self.tree), [1, 4, 6])
+
+    def test_clear(self):
+        self.tree[2:5].clear()
+        self.assertEqual(list(self.tree), [1, 5, 6])
+
+
+class TestFastTreeSlice(TestTreeSlice):
+    TREE_CLASS = FastRBTree
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file